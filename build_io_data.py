@@ -1,19 +1,24 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
 import math
 import re
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Iterator
+
+import json_io
+import storage
+from columnar_io import export_columnar
+from context_retrieval import RetrievalConfig, make_context_builder
+from sampling import BudgetedSampler, length_bucket
 
 CASE_DIR_RE = re.compile(r"^case\d+$")
 
 def _read_text_file(path: Path) -> str:
     """安全读取文本文件，不存在则返回空字符串。"""
     try:
-        if path.exists():
-            return path.read_text(encoding="utf-8")
+        if storage.exists(path):
+            return storage.read_text(path)
     except Exception as e:
         print(f"[WARN] 读取失败: {path} ({e})")
     return ""
@@ -24,8 +29,8 @@ def _gather_case_dirs(root_dir: Path) -> List[Tuple[str, Path]]:
         print(f"[WARN] 根目录不存在: {root_dir}")
         return []
     case_dirs: List[Tuple[str, Path]] = []
-    for p in sorted(root_dir.iterdir()):
-        if p.is_dir() and CASE_DIR_RE.match(p.name):
+    for p in storage.iter_case_dirs(root_dir):
+        if CASE_DIR_RE.match(p.name):
             case_dirs.append((p.name, p))
     if not case_dirs:
         print(f"[WARN] 未发现任何 case* 子目录于: {root_dir}")
@@ -33,7 +38,27 @@ def _gather_case_dirs(root_dir: Path) -> List[Tuple[str, Path]]:
         print(f"[INFO] 共找到 {len(case_dirs)} 个用例目录")
     return case_dirs
 
-def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> List[Dict]:
+def _is_sample_fragment(elem: str) -> bool:
+    """len(elem) < 8 或 elem 以 "\\n#" 开头（标题片段）时不产样本。"""
+    return len(elem) >= 8 and not elem.startswith("\n#")
+
+def _iter_candidates(file_path: Path) -> Iterator[Tuple[int, int]]:
+    """流式产出可生成样本的元素 (下标, 长度)，不读取 intent/outline，也不构造 context。"""
+    try:
+        data = json_io.load_file(file_path)
+    except Exception as e:
+        print(f"[WARN] 读取失败，已跳过: {file_path} ({e})")
+        return
+    if not isinstance(data, list):
+        return
+    for idx, elem in enumerate(data):
+        if isinstance(elem, str) and _is_sample_fragment(elem):
+            yield idx, len(elem)
+
+def process_one_file(file_path: Path, file_label: str, ratios: List[float],
+                     picks: Optional[Dict[int, List[float]]] = None,
+                     context_mode: str = "full", retrieval_cfg: Optional[RetrievalConfig] = None,
+                     start_idx: int = 0) -> List[Dict]:
     """
     读取单个 split_xxx.json，按给定比例生成 (context, hint, output) 对。
     - 同一文件内 history 逐条累加
@@ -41,6 +66,10 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
     - 读取同级目录下的 user_intent.md 与 outline.md，填入每条样本的字段
     - 新增字段 "file"=file_label（如 "case0"）
     - 过滤规则：len(elem) < 8 或 elem 以 "\\n#" 开头时跳过（但仍累加到 history）
+    - picks 非空时只为其中的 {元素下标: [ratio, ...]} 生成样本（抽样模式）
+    - context_mode="retrieval" 时 context 改为检索式紧凑上下文（见 context_retrieval.py），
+      不再是完整的 history
+    - start_idx>0 时下标更小的元素只计入 history、不产样本（增量重建时复用其旧样本）
     """
     dir_path = file_path.parent
     user_intent = _read_text_file(dir_path / "user_intent.md")
@@ -52,8 +81,7 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
 
     # 读取 JSON 数据
     try:
-        with file_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json_io.load_file(file_path)
     except Exception as e:
         print(f"[WARN] 读取失败，已跳过: {file_path} ({e})")
         return []
@@ -63,24 +91,37 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
         return []
 
     results: List[Dict] = []
-    history = ""
+    history_parts: List[str] = []
+    retriever = make_context_builder(context_mode, retrieval_cfg)
 
-    for elem in data:
+    for idx, elem in enumerate(data):
         if not isinstance(elem, str):
             continue
 
-        is_heading_fragment = elem.startswith("\n#")
-        if len(elem) < 8 or is_heading_fragment:
+        if not _is_sample_fragment(elem):
             # 保持你当前策略：短元素/标题片段不产样本，但纳入 history
-            history += elem
+            history_parts.append(elem)
+            if retriever is not None:
+                retriever.advance(elem)
+            continue
+
+        if idx < start_idx:
+            elem_ratios = []
+        else:
+            elem_ratios = ratios if picks is None else picks.get(idx, [])
+        if not elem_ratios:
+            history_parts.append(elem)
+            if retriever is not None:
+                retriever.advance(elem)
             continue
 
         # 对每个切割比例生成一条样本
+        history = "".join(history_parts) if retriever is None else ""
         items_for_elem = []
-        for r in ratios:
+        for r in elem_ratios:
             prefix_len = math.ceil(len(elem) * r)
             prefix = elem[:prefix_len]
-            input_text = history  # context 不包含本 elem
+            input_text = history if retriever is None else retriever.build()  # context 不包含本 elem
 
             items_for_elem.append({
                 "context": input_text,
@@ -95,15 +136,46 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
         results.extend(items_for_elem)
 
         # 在本 elem 处理完所有 ratio 之后再更新历史
-        history += elem
+        if retriever is None:
+            history_parts = [history, elem]
+        else:
+            retriever.advance(elem)
 
     return results
 
+def _select_picks(case_dirs: List[Tuple[str, Path]], filename: str, ratios: List[float],
+                  budget: Optional[int], per_case_cap: Optional[int], seed: int) -> Dict[str, Dict[int, List[float]]]:
+    """
+    流式分层抽样：只遍历候选描述 (元素下标, ratio)，按 (ratio, 长度桶) 分层抽取，
+    返回 {case_name: {元素下标: [ratio, ...]}}，未选中的候选不会构造 context。
+    """
+    sampler = BudgetedSampler(budget=budget, per_case_cap=per_case_cap, seed=seed)
+    for case_name, case_path in case_dirs:
+        fp = case_path / filename
+        if not storage.exists(fp):
+            continue
+        for idx, length in _iter_candidates(fp):
+            for r in ratios:
+                sampler.offer(case_name, (r, length_bucket(length)), (idx, r))
+
+    picks: Dict[str, Dict[int, List[float]]] = {}
+    selected = sampler.finish()
+    for case_name, (idx, r) in selected:
+        picks.setdefault(case_name, {}).setdefault(idx, []).append(r)
+    print(f"[INFO] 抽样：候选 {sampler.offered} 条，选中 {len(selected)} 条")
+    return picks
+
 def _build_for_filename(
     root_dir: Path,
     output_file: str,
     ratios: List[float],
-    filename: str
+    filename: str,
+    budget: Optional[int] = None,
+    per_case_cap: Optional[int] = None,
+    seed: int = 0,
+    columnar_format: Optional[str] = None,
+    context_mode: str = "full",
+    retrieval_cfg: Optional[RetrievalConfig] = None
 ):
     """
     针对指定 filename（如 split_sentence.json 或 split_clause.json）
@@ -112,23 +184,45 @@ def _build_for_filename(
     all_results: List[Dict] = []
     case_dirs = _gather_case_dirs(root_dir)
 
+    # 设定了样本预算/单 case 上限时先抽样，只为选中的候选生成样本
+    sampled = budget is not None or per_case_cap is not None
+    picks = _select_picks(case_dirs, filename, ratios, budget, per_case_cap, seed) if sampled else {}
+
     for case_name, case_path in case_dirs:
         fp = case_path / filename
-        if not fp.exists():
+        if not storage.exists(fp):
             print(f"[WARN] 缺少目标文件: {fp}")
             continue
 
+        if sampled and case_name not in picks:
+            continue
+
         print(f"[INFO] 处理 {case_name} -> {filename}")
-        results = process_one_file(fp, case_name, ratios)
+        results = process_one_file(fp, case_name, ratios, picks=picks.get(case_name) if sampled else None,
+                                   context_mode=context_mode, retrieval_cfg=retrieval_cfg)
         all_results.extend(results)
 
     # 保存合并结果
-    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(all_results, f, ensure_ascii=False, indent=2)
+    json_io.dump_file(all_results, output_file)
+    json_io.save_settings(output_file, {
+        "filename": filename,
+        "ratios": list(ratios),
+        "budget": budget,
+        "per_case_cap": per_case_cap,
+        "seed": seed,
+        "context_mode": context_mode,
+        "retrieval": list(retrieval_cfg or RetrievalConfig()) if context_mode == "retrieval" else None,
+        "columnar_format": columnar_format,
+    })
 
     print(f"[DONE] ({filename}) 共生成样本 {len(all_results)} 条，已保存到: {output_file}")
 
+    # 可选：额外导出列式格式（字典编码 intent/outline/file，便于按列扫描/过滤）
+    # 显式要求了列式格式，导出失败（如缺少 pyarrow/numpy）时直接报错，不静默跳过
+    if columnar_format:
+        col_path = export_columnar(all_results, output_file, fmt=columnar_format)
+        print(f"[DONE] ({filename}) 列式导出已保存到: {col_path}")
+
 def main():
     # ===== 配置根目录（按需修改） =====
     root_dir = Path("./")  # 👉 改成你的根目录路径
@@ -137,13 +231,31 @@ def main():
     # ratios = [0.1, 0.3, 0.5]
     ratios = [0.0, 0.3]
 
+    # ===== 抽样配置（均为 None 时生成全部样本） =====
+    sample_budget = None   # 样本总数上限，如 10000
+    per_case_cap = None    # 单个 case 样本上限，如 200
+    sample_seed = 0
+
+    # ===== 列式导出（None 不导出；"auto" / "parquet" / "arrow" / "npy"） =====
+    columnar_format = None
+
+    # ===== context 模式："full" 为完整前文；"retrieval" 为 当前章节 + BM25 检索的历史段落 =====
+    context_mode = "full"
+    retrieval_cfg = RetrievalConfig(top_k=3, max_chars=2000)
+
     # —— 1) 处理按句号/分号切片的文件 —— #
     sentence_output = "all_cases_io_sentence.json"
     _build_for_filename(
         root_dir=root_dir,
         output_file=sentence_output,
         ratios=ratios,
-        filename="split_sentence.json"
+        filename="split_sentence.json",
+        budget=sample_budget,
+        per_case_cap=per_case_cap,
+        seed=sample_seed,
+        columnar_format=columnar_format,
+        context_mode=context_mode,
+        retrieval_cfg=retrieval_cfg
     )
 
     # —— 2) 处理按逗号/从句切片的文件 —— #
@@ -152,7 +264,13 @@ def main():
         root_dir=root_dir,
         output_file=clause_output,
         ratios=ratios,
-        filename="split_clause.json"
+        filename="split_clause.json",
+        budget=sample_budget,
+        per_case_cap=per_case_cap,
+        seed=sample_seed,
+        columnar_format=columnar_format,
+        context_mode=context_mode,
+        retrieval_cfg=retrieval_cfg
     )
 
 if __name__ == "__main__":
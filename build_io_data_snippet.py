@@ -1,19 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
 import math
 import re
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator
+
+import json_io
+import storage
+from columnar_io import export_columnar
+from context_retrieval import RetrievalConfig, make_context_builder
+from sampling import BudgetedSampler, length_bucket
+from splitters import SNIPPET_OUTPUT_NAME
+from tag_spans import TagSpanIndex
 
 CASE_DIR_RE = re.compile(r"^case\d+$")
 
 def _read_text_file(path: Path) -> str:
     """安全读取文本文件，不存在则返回空字符串。"""
     try:
-        if path.exists():
-            return path.read_text(encoding="utf-8")
+        if storage.exists(path):
+            return storage.read_text(path)
     except Exception as e:
         print(f"[WARN] 读取失败: {path} ({e})")
     return ""
@@ -24,8 +31,8 @@ def _gather_case_dirs(root_dir: Path) -> List[Tuple[str, Path]]:
         print(f"[WARN] 根目录不存在: {root_dir}")
         return []
     case_dirs: List[Tuple[str, Path]] = []
-    for p in sorted(root_dir.iterdir()):
-        if p.is_dir() and CASE_DIR_RE.match(p.name):
+    for p in storage.iter_case_dirs(root_dir):
+        if CASE_DIR_RE.match(p.name):
             case_dirs.append((p.name, p))
     if not case_dirs:
         print(f"[WARN] 未发现任何 case* 子目录于: {root_dir}")
@@ -33,11 +40,9 @@ def _gather_case_dirs(root_dir: Path) -> List[Tuple[str, Path]]:
         print(f"[INFO] 共找到 {len(case_dirs)} 个用例目录")
     return case_dirs
 
-def _find_history_from_markdown(md_text: str, snippet: str) -> Optional[str]:
+def _find_offset_in_markdown(md_text: str, snippet: str) -> Optional[int]:
     """
-    在 md_text 中查找 snippet 的首次出现。
-    命中则返回其前面的内容（作为 history/context）。
-    若未命中，返回 None。
+    在 md_text 中查找 snippet 的首次出现，返回起始下标；未命中返回 None。
     - 先做精确匹配；若失败，再做“空白宽松”的正则匹配（将 snippet 中连续空白折叠为 \s+）。
     """
     if not snippet:
@@ -46,7 +51,7 @@ def _find_history_from_markdown(md_text: str, snippet: str) -> Optional[str]:
     # 优先精确匹配
     idx = md_text.find(snippet)
     if idx != -1:
-        return md_text[:idx]
+        return idx
 
     # 宽松匹配：忽略空白差异
     # 将 snippet 中的连续空白折叠为 \s+，其余字符转义
@@ -54,13 +59,49 @@ def _find_history_from_markdown(md_text: str, snippet: str) -> Optional[str]:
     try:
         m = re.search(snippet_norm, md_text, flags=re.DOTALL)
         if m:
-            return md_text[:m.start()]
+            return m.start()
     except re.error as e:
         print(f"[WARN] 正则匹配失败（将退回放弃该样本）: {e}")
 
     return None
 
-def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> List[Dict]:
+def _find_history_from_markdown(md_text: str, snippet: str) -> Optional[str]:
+    """
+    在 md_text 中查找 snippet 的首次出现。
+    命中则返回其前面的内容（作为 history/context）。
+    若未命中，返回 None。
+    """
+    idx = _find_offset_in_markdown(md_text, snippet)
+    return None if idx is None else md_text[:idx]
+
+def _is_sample_fragment(elem: str) -> bool:
+    """len(elem) < 8 或 elem 以 "\\n#" 开头（标题片段）时不产样本。"""
+    return len(elem) >= 8 and not elem.startswith("\n#")
+
+def _iter_candidates(file_path: Path) -> Iterator[Tuple[int, int]]:
+    """
+    流式产出可生成样本的元素 (下标, 长度)：需能在 full_content.md 中定位，
+    只做定位不切取 context，也不读取 intent/outline。
+    """
+    md_text = _read_text_file(file_path.parent / "full_content.md")
+    if not md_text:
+        return
+    try:
+        data = json_io.load_file(file_path)
+    except Exception as e:
+        print(f"[WARN] 读取失败，已跳过: {file_path} ({e})")
+        return
+    if not isinstance(data, list):
+        return
+    for idx, elem in enumerate(data):
+        if isinstance(elem, str) and _is_sample_fragment(elem) \
+                and _find_offset_in_markdown(md_text, elem) is not None:
+            yield idx, len(elem)
+
+def process_one_file(file_path: Path, file_label: str, ratios: List[float],
+                     picks: Optional[Dict[int, List[float]]] = None,
+                     with_tags: bool = False, context_mode: str = "full",
+                     retrieval_cfg: Optional[RetrievalConfig] = None) -> List[Dict]:
     """
     读取单个 split_snippet.json，按给定比例生成 (context, hint, output) 对。
     - 不再使用逐条累加的 history；改为：对每个元素到 full_content.md 中首次匹配，
@@ -69,6 +110,11 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
     - 读取同级目录下的 user_intent.md 与 outline.md，填入每条样本的字段。
     - 新增字段 "file"=file_label（如 "case0"）。
     - 过滤规则：len(elem) < 8 或 elem 以 "\\n#" 开头时跳过（但仍会去尝试匹配以便日志定位）。
+    - picks 非空时只为其中的 {元素下标: [ratio, ...]} 生成样本（抽样模式）。
+    - with_tags=True 时查 tag_spans.json（见 tag_spans.py），为样本附加 "tag_spans"：
+      output 中被 <tag> 标注的 [起, 止) 区间（相对 output 开头）。
+    - context_mode="retrieval" 时 context 改为检索式紧凑上下文（见 context_retrieval.py）：
+      游标沿 full_content.md 推进到匹配位置，索引随之增量更新。
     """
     dir_path = file_path.parent
     user_intent = _read_text_file(dir_path / "user_intent.md")
@@ -82,10 +128,13 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
     if not md_text:
         print(f"[WARN] 未找到或读取失败: {dir_path/'full_content.md'}（该目录将无法生成样本）")
 
+    tag_index = TagSpanIndex.load(dir_path) if with_tags else None
+    if with_tags and tag_index is None:
+        print(f"[WARN] 未找到 {dir_path/'tag_spans.json'}，样本将不含 tag_spans（可先运行 tag_spans.py）")
+
     # 读取 JSON 数据
     try:
-        with file_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json_io.load_file(file_path)
     except Exception as e:
         print(f"[WARN] 读取失败，已跳过: {file_path} ({e})")
         return []
@@ -95,13 +144,13 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
         return []
 
     results: List[Dict] = []
+    retriever = make_context_builder(context_mode, retrieval_cfg)
 
-    for elem in data:
+    for idx, elem in enumerate(data):
         if not isinstance(elem, str):
             continue
 
-        is_heading_fragment = elem.startswith("\n#")
-        if len(elem) < 8 or is_heading_fragment:
+        if not _is_sample_fragment(elem):
             # 与之前逻辑一致：这类元素不产样本。
             # 这里 history 不再累加，由 markdown 定位，仍尝试匹配仅用于日志定位/调试。
             if md_text:
@@ -110,22 +159,31 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
                     print(f"[INFO] 跳过（未找到或过短/标题片段）且未匹配到：{file_path} -> 片段开头: {repr(elem[:20])}")
             continue
 
+        elem_ratios = ratios if picks is None else picks.get(idx, [])
+        if not elem_ratios:
+            continue
+
         if not md_text:
             # 没有 full_content.md，无法生成该元素的样本
             print(f"[WARN] 缺少 full_content.md，跳过样本：{file_path} -> {repr(elem[:20])}")
             continue
 
-        history = _find_history_from_markdown(md_text, elem)
-        if history is None:
+        offset = _find_offset_in_markdown(md_text, elem)
+        if offset is None:
             print(f"[WARN] 在 markdown 中未匹配到该片段（将跳过）：{file_path} -> 片段开头: {repr(elem[:50])}")
             continue
+        if retriever is None:
+            history = md_text[:offset]
+        else:
+            retriever.seek(md_text, offset)
+            history = retriever.build()
 
         # 对每个切割比例生成样本
-        for r in ratios:
+        for r in elem_ratios:
             prefix_len = math.ceil(len(elem) * r)
             prefix = elem[:prefix_len]
 
-            results.append({
+            sample = {
                 "context": history,      # 由 markdown 首次匹配位置之前的内容构成
                 "hint": prefix,
                 "output": elem,
@@ -133,15 +191,47 @@ def process_one_file(file_path: Path, file_label: str, ratios: List[float]) -> L
                 "user_intent": user_intent,
                 "outline": outline,
                 "file": file_label,
-            })
+            }
+            if tag_index is not None:
+                sample["tag_spans"] = tag_index.relative_spans(offset, offset + len(elem))
+            results.append(sample)
 
     return results
 
+def _select_picks(case_dirs: List[Tuple[str, Path]], filename: str, ratios: List[float],
+                  budget: Optional[int], per_case_cap: Optional[int], seed: int) -> Dict[str, Dict[int, List[float]]]:
+    """
+    流式分层抽样：只遍历候选描述 (元素下标, ratio)，按 (ratio, 长度桶) 分层抽取，
+    返回 {case_name: {元素下标: [ratio, ...]}}，未选中的候选不会构造 context。
+    """
+    sampler = BudgetedSampler(budget=budget, per_case_cap=per_case_cap, seed=seed)
+    for case_name, case_path in case_dirs:
+        fp = case_path / filename
+        if not storage.exists(fp):
+            continue
+        for idx, length in _iter_candidates(fp):
+            for r in ratios:
+                sampler.offer(case_name, (r, length_bucket(length)), (idx, r))
+
+    picks: Dict[str, Dict[int, List[float]]] = {}
+    selected = sampler.finish()
+    for case_name, (idx, r) in selected:
+        picks.setdefault(case_name, {}).setdefault(idx, []).append(r)
+    print(f"[INFO] 抽样：候选 {sampler.offered} 条，选中 {len(selected)} 条")
+    return picks
+
 def _build_for_filename(
     root_dir: Path,
     output_file: str,
     ratios: List[float],
-    filename: str
+    filename: str,
+    budget: Optional[int] = None,
+    per_case_cap: Optional[int] = None,
+    seed: int = 0,
+    columnar_format: Optional[str] = None,
+    context_mode: str = "full",
+    retrieval_cfg: Optional[RetrievalConfig] = None,
+    with_tags: bool = False
 ):
     """
     针对指定 filename（此处应为 split_snippet.json）
@@ -150,23 +240,46 @@ def _build_for_filename(
     all_results: List[Dict] = []
     case_dirs = _gather_case_dirs(root_dir)
 
+    # 设定了样本预算/单 case 上限时先抽样，只为选中的候选生成样本
+    sampled = budget is not None or per_case_cap is not None
+    picks = _select_picks(case_dirs, filename, ratios, budget, per_case_cap, seed) if sampled else {}
+
     for case_name, case_path in case_dirs:
         fp = case_path / filename
-        if not fp.exists():
+        if not storage.exists(fp):
             print(f"[WARN] 缺少目标文件: {fp}")
             continue
 
+        if sampled and case_name not in picks:
+            continue
+
         print(f"[INFO] 处理 {case_name} -> {filename}")
-        results = process_one_file(fp, case_name, ratios)
+        results = process_one_file(fp, case_name, ratios, picks=picks.get(case_name) if sampled else None,
+                                   with_tags=with_tags, context_mode=context_mode, retrieval_cfg=retrieval_cfg)
         all_results.extend(results)
 
     # 保存合并结果
-    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(all_results, f, ensure_ascii=False, indent=2)
+    json_io.dump_file(all_results, output_file)
+    json_io.save_settings(output_file, {
+        "filename": filename,
+        "ratios": list(ratios),
+        "budget": budget,
+        "per_case_cap": per_case_cap,
+        "seed": seed,
+        "context_mode": context_mode,
+        "retrieval": list(retrieval_cfg or RetrievalConfig()) if context_mode == "retrieval" else None,
+        "columnar_format": columnar_format,
+        "with_tags": with_tags,
+    })
 
     print(f"[DONE] ({filename}) 共生成样本 {len(all_results)} 条，已保存到: {output_file}")
 
+    # 可选：额外导出列式格式（字典编码 intent/outline/file，便于按列扫描/过滤）
+    # 显式要求了列式格式，导出失败（如缺少 pyarrow/numpy）时直接报错，不静默跳过
+    if columnar_format:
+        col_path = export_columnar(all_results, output_file, fmt=columnar_format)
+        print(f"[DONE] ({filename}) 列式导出已保存到: {col_path}")
+
 def main():
     # ===== 配置根目录（按需修改） =====
     root_dir = Path("./")  # 👉 改成你的根目录路径
@@ -174,13 +287,35 @@ def main():
     # ===== 比例配置 =====
     ratios = [0.0, 0.3]
 
+    # ===== 抽样配置（均为 None 时生成全部样本） =====
+    sample_budget = None   # 样本总数上限，如 10000
+    per_case_cap = None    # 单个 case 样本上限，如 200
+    sample_seed = 0
+
+    # ===== 列式导出（None 不导出；"auto" / "parquet" / "arrow" / "npy"） =====
+    columnar_format = None
+
+    # ===== 是否附加 tag 标注区间（需先运行 tag_spans.py 生成 tag_spans.json） =====
+    with_tags = False
+
+    # ===== context 模式："full" 为完整前文；"retrieval" 为 当前章节 + BM25 检索的历史段落 =====
+    context_mode = "full"
+    retrieval_cfg = RetrievalConfig(top_k=3, max_chars=2000)
+
     # —— 处理按 snippet 切片的文件 —— #
     snippet_output = "all_cases_io_snippet.json"
     _build_for_filename(
         root_dir=root_dir,
         output_file=snippet_output,
         ratios=ratios,
-        filename="split_snippet.json"
+        filename=SNIPPET_OUTPUT_NAME,
+        budget=sample_budget,
+        per_case_cap=per_case_cap,
+        seed=sample_seed,
+        columnar_format=columnar_format,
+        with_tags=with_tags,
+        context_mode=context_mode,
+        retrieval_cfg=retrieval_cfg
     )
 
 if __name__ == "__main__":
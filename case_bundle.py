@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+单文件 case 打包格式：把一个 case 目录下的所有产物打包为 caseN.bundle，
+在对象存储 / 网络文件系统上一次打开即可随机读取任意成员。
+
+文件布局：
+    magic      8 字节   b"CASEBNDL"
+    header_len 4 字节   小端 uint32
+    header     JSON     {"version": 1, "members": {成员名: [偏移, 长度], ...}}
+    data       各成员内容依次拼接（偏移相对 data 起点，内容为解压后的原始字节）
+
+读取：storage 层在 caseN/<成员名> 不存在时自动回退到 caseN.bundle 中的同名成员，
+因此各阶段脚本无需改动即可直接读取打包后的 case；写出仍写为散文件，且散文件优先于包内成员。
+
+命令行：
+    python case_bundle.py pack   --root ./ [--remove]     # caseN/ -> caseN.bundle
+    python case_bundle.py unpack --root ./ [--remove]     # caseN.bundle -> caseN/
+"""
+
+import argparse
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import json_io
+import storage
+
+MAGIC = b"CASEBNDL"
+VERSION = 1
+BUNDLE_SUFFIX = storage.BUNDLE_SUFFIX
+_HEADER_LEN = struct.Struct("<I")
+
+
+class CaseBundle:
+    """只读打开一个 bundle：构造时读取头部索引，之后按成员随机读取（线程安全）。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        self._lock = threading.Lock()
+        try:
+            head = self._pread(len(MAGIC) + _HEADER_LEN.size, 0)
+            if head[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"不是 case bundle 文件：{self.path}")
+            (header_len,) = _HEADER_LEN.unpack(head[len(MAGIC):])
+            header = json_io.loads(self._pread(header_len, len(head)))
+            if header.get("version") != VERSION:
+                raise ValueError(f"不支持的 bundle 版本：{header.get('version')}（{self.path}）")
+            self._data_start = len(head) + header_len
+            self.members: Dict[str, Tuple[int, int]] = {k: tuple(v) for k, v in header["members"].items()}
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _pread(self, length: int, offset: int) -> bytes:
+        if hasattr(os, "pread"):
+            return os.pread(self._fd, length, offset)
+        with self._lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, length)
+
+    def names(self) -> List[str]:
+        return list(self.members)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.members
+
+    def read(self, name: str) -> bytes:
+        offset, length = self.members[name]
+        return self._pread(length, self._data_start + offset)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "CaseBundle":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_bundle(path: Path, members: Dict[str, bytes]) -> None:
+    """将 {成员名: 内容} 写为 bundle（先写临时文件再替换）。"""
+    index: Dict[str, List[int]] = {}
+    offset = 0
+    for name, data in members.items():
+        index[name] = [offset, len(data)]
+        offset += len(data)
+    header = json_io.dumps_bytes({"version": VERSION, "members": index}, compact=True)
+
+    tmp = Path(f"{path}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LEN.pack(len(header)))
+        f.write(header)
+        for data in members.values():
+            f.write(data)
+    os.replace(tmp, path)
+
+
+def pack_case(case_dir: Path, remove: bool = False) -> Optional[Path]:
+    """
+    打包一个 case：散文件与已有 bundle 中的成员合并（散文件优先），写为 caseN.bundle。
+    只打包目录下第一层的文件；remove=True 时打包成功后只删除已打包的散文件，
+    子目录等未打包的内容保留，目录为空时才一并删除。
+    """
+    members: Dict[str, bytes] = {}
+    names = set(storage.list_bundle_members(case_dir))
+    packed_files: List[Path] = []
+    if case_dir.is_dir():
+        packed_files = [p for p in case_dir.iterdir() if p.is_file() and not p.name.endswith(".tmp")]
+        names |= {storage.logical_path(p).name for p in packed_files}
+    for name in sorted(names):
+        members[name] = storage.read_bytes(case_dir / name)
+    if not members:
+        print(f"[SKIP] {case_dir} 下没有可打包的文件")
+        return None
+
+    out_path = storage.bundle_path(case_dir)
+    storage.close_bundles()
+    write_bundle(out_path, members)
+    if remove and case_dir.is_dir():
+        for p in packed_files:
+            p.unlink()
+        left = sorted(p.name for p in case_dir.iterdir())
+        if left:
+            print(f"[WARN] {case_dir} 中未打包的内容已保留：{', '.join(left)}")
+        else:
+            case_dir.rmdir()
+    print(f"[OK] 已打包：{out_path}（{len(members)} 个成员）")
+    return out_path
+
+
+def unpack_case(case_dir: Path, remove: bool = False) -> None:
+    """解包 caseN.bundle 为散文件（不覆盖已存在的散文件）。"""
+    bundle = storage.bundle_path(case_dir)
+    if not bundle.is_file():
+        print(f"[SKIP] 找不到 bundle：{bundle}")
+        return
+    case_dir.mkdir(parents=True, exist_ok=True)
+    with CaseBundle(bundle) as b:
+        for name in b.names():
+            target = case_dir / name
+            if storage.resolve(target) is None:
+                target.write_bytes(b.read(name))
+    storage.close_bundles()
+    if remove:
+        bundle.unlink()
+    print(f"[OK] 已解包：{bundle} -> {case_dir}")
+
+
+def process_root(root: Path, cmd: str, remove: bool = False) -> None:
+    """对 root 下所有 caseN 目录 / bundle 执行 pack 或 unpack（其他目录如 .git 一律不碰）。"""
+    for case_dir in storage.iter_case_dirs(root):
+        if not storage.CASE_DIR_RE.match(case_dir.name):
+            continue
+        if cmd == "pack":
+            pack_case(case_dir, remove=remove)
+        else:
+            unpack_case(case_dir, remove=remove)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="case 目录与单文件 bundle 之间的打包 / 解包")
+    parser.add_argument("cmd", choices=["pack", "unpack"], help="pack：目录 -> bundle；unpack：bundle -> 目录")
+    parser.add_argument("--root", default="./", help="数据集根目录")
+    parser.add_argument("--remove", action="store_true", help="成功后删除源（pack 删目录，unpack 删 bundle）")
+    args = parser.parse_args()
+
+    root = Path(args.root).expanduser().resolve()
+    process_root(root, args.cmd, remove=args.remove)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+训练样本的列式导出 / 读取：
+- user_intent / outline / file 在同一 case 内逐条重复，按字典编码存储（codes + 去重后的取值）
+- context / hint / output 按偏移量编码（offsets + 拼接后的 UTF-8 字节）
+- ratio 存为 float64 列
+- tag_spans（build_io_data_snippet --with-tags 附加的 [起, 止] 区间列表）按偏移量编码
+  （每行区间数的 offsets + 拼接后的 int64 (N, 2) 数组）；样本不含该字段时不写出此列
+- 格式：
+    parquet / arrow：安装 pyarrow 时可用（Parquet 文件或 Arrow IPC 文件）
+    npy：NumPy 回退格式，一个目录，每列若干 .npy 文件 + meta.json，读取时 mmap 按需加载
+  fmt="auto" 时优先 parquet，否则 npy
+- 读取时只加载用到的列；过滤条件先在 codes / 数值列上计算，未涉及的列完全不读
+
+用法示例：
+    export_columnar(samples, "all_cases_io_sentence.parquet")
+    cols = read_columns("all_cases_io_sentence.cols", columns=["output"], filters={"ratio": 0.3})
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import json_io
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = None
+
+PathLike = Union[str, Path]
+
+DICT_FIELDS = ("user_intent", "outline", "file")
+STRING_FIELDS = ("context", "hint", "output")
+FLOAT_FIELDS = ("ratio",)
+SPAN_FIELDS = ("tag_spans",)
+ALL_FIELDS = STRING_FIELDS + FLOAT_FIELDS + DICT_FIELDS + SPAN_FIELDS
+
+_META_NAME = "meta.json"
+_FORMAT_VERSION = 1
+_SUFFIXES = {"parquet": ".parquet", "arrow": ".arrow", "npy": ".cols"}
+
+
+def _resolve_format(fmt: str) -> str:
+    if fmt == "auto":
+        if pa is not None:
+            return "parquet"
+        if np is not None:
+            return "npy"
+        raise RuntimeError("列式导出需要安装 pyarrow 或 numpy")
+    if fmt in ("parquet", "arrow") and pa is None:
+        raise RuntimeError(f"{fmt} 格式需要安装 pyarrow")
+    if fmt == "npy" and np is None:
+        raise RuntimeError("npy 格式需要安装 numpy")
+    if fmt not in ("parquet", "arrow", "npy"):
+        raise ValueError(f"未知列式格式：{fmt}")
+    return fmt
+
+
+def _detect_format(path: Path) -> str:
+    if path.is_dir():
+        return "npy"
+    return "arrow" if path.suffix in (".arrow", ".feather", ".ipc") else "parquet"
+
+
+# ========= 写出 =========
+def export_columnar(samples: List[Dict[str, Any]], path: PathLike, fmt: str = "auto") -> Path:
+    """
+    将样本列表导出为列式格式，返回实际写出的路径。
+    path 以 .json 结尾时（如直接传入 all_cases_io_*.json）自动替换为对应格式的后缀。
+    样本含 ALL_FIELDS 之外的字段时抛出 ValueError。
+    """
+    path = Path(path)
+    fmt = _resolve_format(fmt)
+    unknown = set().union(*samples) - set(ALL_FIELDS) if samples else set()
+    if unknown:
+        # 不静默丢弃：新增字段需先在本模块中定义编码方式
+        raise ValueError(f"列式导出不支持的字段：{', '.join(sorted(unknown))}")
+    if path.suffix == ".json":
+        path = path.with_suffix(_SUFFIXES[fmt])
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fields = _present_fields(samples)
+    if fmt in ("parquet", "arrow"):
+        arrays = {}
+        for name in fields:
+            values = [s.get(name) for s in samples]
+            if name in SPAN_FIELDS:
+                arrays[name] = pa.array([v or [] for v in values], type=pa.list_(pa.list_(pa.int64())))
+            elif name in DICT_FIELDS:
+                arrays[name] = pa.array(values, type=pa.string()).dictionary_encode()
+            elif name in FLOAT_FIELDS:
+                arrays[name] = pa.array(values, type=pa.float64())
+            else:
+                arrays[name] = pa.array(values, type=pa.string())
+        table = pa.table(arrays)
+        if fmt == "parquet":
+            pq.write_table(table, path, use_dictionary=list(DICT_FIELDS))
+        else:
+            feather.write_feather(table, path)
+        return path
+
+    _write_npy_dir(samples, path, fields)
+    return path
+
+
+def _present_fields(samples: List[Dict[str, Any]]) -> List[str]:
+    # 可选列（tag_spans）只在有样本带该字段时写出
+    return [name for name in ALL_FIELDS if name not in SPAN_FIELDS or any(name in s for s in samples)]
+
+
+def _encode_strings(values: Iterable[str]):
+    encoded = [(v or "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum(np.asarray([len(b) for b in encoded], dtype=np.int64))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+def _encode_spans(values: List[Optional[List[List[int]]]]):
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    if values:
+        offsets[1:] = np.cumsum(np.asarray([len(v or ()) for v in values], dtype=np.int64))
+    flat = [x for v in values for pair in (v or ()) for x in pair]
+    return offsets, np.asarray(flat, dtype=np.int64).reshape(-1, 2)
+
+
+def _write_npy_dir(samples: List[Dict[str, Any]], path: Path, fields: List[str]) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    columns: Dict[str, str] = {}
+    for name in fields:
+        values = [s.get(name) for s in samples]
+        if name in SPAN_FIELDS:
+            offsets, data = _encode_spans(values)
+            np.save(path / f"{name}.offsets.npy", offsets)
+            np.save(path / f"{name}.data.npy", data)
+            columns[name] = "spans"
+        elif name in DICT_FIELDS:
+            dictionary: Dict[str, int] = {}
+            codes = np.fromiter((dictionary.setdefault(v or "", len(dictionary)) for v in values),
+                                dtype=np.int32, count=len(values))
+            offsets, data = _encode_strings(dictionary)
+            np.save(path / f"{name}.codes.npy", codes)
+            np.save(path / f"{name}.dict.offsets.npy", offsets)
+            np.save(path / f"{name}.dict.data.npy", data)
+            columns[name] = "dict"
+        elif name in FLOAT_FIELDS:
+            np.save(path / f"{name}.npy", np.asarray(values, dtype=np.float64))
+            columns[name] = "float64"
+        else:
+            offsets, data = _encode_strings(values)
+            np.save(path / f"{name}.offsets.npy", offsets)
+            np.save(path / f"{name}.data.npy", data)
+            columns[name] = "str"
+    json_io.dump_file({"version": _FORMAT_VERSION, "rows": len(samples), "columns": columns},
+                      path / _META_NAME)
+
+
+# ========= 读取 =========
+class NpyColumnarTable:
+    """npy 目录格式的只读视图：所有数组以 mmap 方式按需加载。"""
+
+    def __init__(self, path: PathLike):
+        if np is None:
+            raise RuntimeError("读取 npy 列式目录需要安装 numpy")
+        self.path = Path(path)
+        meta = json_io.load_file(self.path / _META_NAME)
+        self.rows: int = meta["rows"]
+        self.columns: Dict[str, str] = meta["columns"]
+
+    def _load(self, name: str):
+        return np.load(self.path / name, mmap_mode="r")
+
+    def dictionary(self, name: str) -> List[str]:
+        """字典编码列的取值表（下标即 code）。"""
+        offsets = self._load(f"{name}.dict.offsets.npy")
+        data = self._load(f"{name}.dict.data.npy")
+        return [bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def codes(self, name: str):
+        return self._load(f"{name}.codes.npy")
+
+    def numbers(self, name: str):
+        return self._load(f"{name}.npy")
+
+    def byte_lengths(self, name: str):
+        """字符串列每行的 UTF-8 字节长度，只读 offsets，不解码内容。"""
+        return np.diff(self._load(f"{name}.offsets.npy"))
+
+    def mask(self, filters: Dict[str, Any]):
+        """等值过滤（取值可为单值或集合），返回布尔行掩码。"""
+        mask = np.ones(self.rows, dtype=bool)
+        for name, wanted in filters.items():
+            wanted = set(wanted) if isinstance(wanted, (set, list, tuple, frozenset)) else {wanted}
+            kind = self.columns[name]
+            if kind == "dict":
+                hit = [i for i, v in enumerate(self.dictionary(name)) if v in wanted]
+                mask &= np.isin(self.codes(name), hit)
+            elif kind == "float64":
+                mask &= np.isin(self.numbers(name), list(wanted))
+            elif kind == "spans":
+                raise ValueError(f"不支持按区间列过滤：{name}")
+            else:
+                mask &= np.asarray([v in wanted for v in self.strings(name)], dtype=bool)
+        return mask
+
+    def strings(self, name: str, rows=None) -> List[str]:
+        """解码字符串列；rows 为行下标序列时只解码这些行。"""
+        offsets = self._load(f"{name}.offsets.npy")
+        data = self._load(f"{name}.data.npy")
+        rows = range(self.rows) if rows is None else rows
+        return [bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in rows]
+
+    def spans(self, name: str, rows=None) -> List[List[List[int]]]:
+        """解码区间列：每行为 [[起, 止], ...]。"""
+        offsets = self._load(f"{name}.offsets.npy")
+        data = self._load(f"{name}.data.npy")
+        rows = range(self.rows) if rows is None else rows
+        return [data[offsets[i]:offsets[i + 1]].tolist() for i in rows]
+
+    def column(self, name: str, rows=None) -> List[Any]:
+        kind = self.columns[name]
+        if kind == "spans":
+            return self.spans(name, rows)
+        if kind == "dict":
+            values = self.dictionary(name)
+            codes = self.codes(name)
+            codes = codes if rows is None else codes[rows]
+            return [values[c] for c in codes]
+        if kind == "float64":
+            nums = self.numbers(name)
+            return (nums if rows is None else nums[rows]).tolist()
+        return self.strings(name, rows)
+
+
+def read_columns(path: PathLike, columns: Optional[List[str]] = None,
+                 filters: Optional[Dict[str, Any]] = None) -> Dict[str, List[Any]]:
+    """
+    读取列式导出，返回 {列名: 取值列表}。
+    - columns：只读取这些列（默认为文件中实际写出的全部列）
+    - filters：{列名: 取值或取值集合} 的等值过滤，过滤列本身不必出现在 columns 中
+    """
+    path = Path(path)
+    fmt = _detect_format(path)
+
+    if fmt in ("parquet", "arrow"):
+        if pa is None:
+            raise RuntimeError(f"读取 {fmt} 需要安装 pyarrow")
+        if not columns:
+            schema = pq.read_schema(path) if fmt == "parquet" else feather.read_table(path, memory_map=True).schema
+            columns = [name for name in ALL_FIELDS if name in schema.names]
+        columns = list(columns)
+        pa_filters = None
+        if filters:
+            pa_filters = [(k, "in", list(v)) if isinstance(v, (set, list, tuple, frozenset)) else (k, "=", v)
+                          for k, v in filters.items()]
+        if fmt == "parquet":
+            table = pq.read_table(path, columns=columns, filters=pa_filters)
+        else:
+            needed = list(dict.fromkeys(columns + list(filters or {})))
+            table = feather.read_table(path, columns=needed, memory_map=True)
+            if pa_filters:
+                import pyarrow.compute as pc
+                cond = None
+                for k, op, v in pa_filters:
+                    c = pc.is_in(table[k], value_set=pa.array(v)) if op == "in" else pc.equal(table[k], v)
+                    cond = c if cond is None else pc.and_(cond, c)
+                table = table.filter(cond)
+            table = table.select(columns)
+        return {name: table[name].to_pylist() for name in columns}
+
+    table = NpyColumnarTable(path)
+    columns = list(columns or table.columns)
+    rows = np.flatnonzero(table.mask(filters)) if filters else None
+    return {name: table.column(name, rows) for name in columns}
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+检索式紧凑 context：替代“样本之前的全部文档前缀”，使 context 长度不再随样本位置线性增长。
+
+- IncrementalBM25：可增量追加段落的 BM25 索引（中文按字二元组切词，英文/数字按词），
+  IDF 在查询时按当前文档数计算，因此每次追加无需重建
+- RetrievalContext：随游标推进逐段读入文档
+    - 识别 Markdown 标题行，维护当前章节的标题路径
+    - 遇到新标题时，把已结束章节切成段落（不超过 passage_chars）追加进索引
+    - build() 组装 context：检索到的 top-k 历史段落（按文中顺序，以 GAP_MARK 分隔）
+      + 当前章节的上级标题 + 当前章节已写部分；总长不超过 max_chars
+      （当前章节优先保留，超长时保留末尾；剩余额度再分给检索段落）
+- 完整大纲仍在样本的 "outline" 字段中，这里只放当前章节的标题路径
+
+用法（builder 中）：
+    ctx = RetrievalContext(**RetrievalConfig()._asdict())
+    for elem in fragments:
+        sample_context = ctx.build()
+        ctx.advance(elem)
+"""
+
+import heapq
+import math
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+CONTEXT_MODES = ("full", "retrieval")
+
+# 检索段落之间、检索段落与当前章节之间的分隔
+GAP_MARK = "\n……\n"
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+|[㐀-䶿一-鿿豈-﫿]+")
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+_HEADING_LINE_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t]*#*[ \t]*\n", re.M)
+
+
+class RetrievalConfig(NamedTuple):
+    top_k: int = 3              # 最多检索的历史段落数
+    max_chars: int = 2000       # context 总长上限（字符）
+    passage_chars: int = 300    # 建索引时单个段落的长度上限
+    query_chars: int = 300      # 用当前章节末尾多少字符作为查询
+
+
+def tokenize(text: str) -> List[str]:
+    """中文连续片段切为字二元组（单字片段保留单字），英文/数字按词并转小写。"""
+    tokens: List[str] = []
+    for run in _TOKEN_RE.findall(text):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+class IncrementalBM25:
+    """只追加的 BM25 索引：倒排表 + 文档长度，查询时现算 IDF。"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lens: List[int] = []
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lens)
+
+    def add(self, text: str) -> int:
+        """追加一个段落，返回其文档编号。"""
+        doc_id = len(self.doc_lens)
+        tf: Dict[str, int] = {}
+        tokens = tokenize(text)
+        for t in tokens:
+            tf[t] = tf.get(t, 0) + 1
+        for t, c in tf.items():
+            self.postings.setdefault(t, []).append((doc_id, c))
+        self.doc_lens.append(len(tokens))
+        self.total_len += len(tokens)
+        return doc_id
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """返回得分最高的 k 个 (文档编号, 得分)，得分为 0 的不返回。"""
+        n = len(self.doc_lens)
+        if n == 0 or k <= 0:
+            return []
+        avg_len = self.total_len / n or 1.0
+        scores: Dict[int, float] = {}
+        for t in set(tokenize(query)):
+            plist = self.postings.get(t)
+            if not plist:
+                continue
+            df = len(plist)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for doc_id, c in plist:
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lens[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * c * (self.k1 + 1.0) / (c + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+
+
+def _split_passages(text: str, limit: int) -> List[str]:
+    """按行把章节文本打包成不超过 limit 的段落（单行超长时硬切）。"""
+    passages: List[str] = []
+    buf = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if buf.strip():
+                passages.append(buf)
+            buf = ""
+            passages.append(line[:limit])
+            line = line[limit:]
+        if len(buf) + len(line) > limit and buf.strip():
+            passages.append(buf)
+            buf = ""
+        buf += line
+    if buf.strip():
+        passages.append(buf)
+    return [p for p in passages if p.strip()]
+
+
+class RetrievalContext:
+    """随文档游标推进的检索式 context 构造器（同一实例只服务于一篇文档）。"""
+
+    def __init__(self, top_k: int = 3, max_chars: int = 2000, passage_chars: int = 300, query_chars: int = 300):
+        self.top_k = top_k
+        self.max_chars = max_chars
+        self.passage_chars = passage_chars
+        self.query_chars = query_chars
+        self.reset()
+
+    def reset(self) -> None:
+        self.index = IncrementalBM25()
+        self.passages: List[str] = []
+        self.headings: List[Tuple[int, str]] = []   # 当前章节的标题路径 [(级别, 标题行)]
+        self.current = ""                          # 当前章节已读入的文本（含本章标题行）
+        self.consumed = 0                          # 已读入的总字符数（供 seek 使用）
+        self._scan_from = 0                        # current 中尚未检查标题的位置
+
+    # ----- 推进游标 -----
+    def advance(self, text: str) -> None:
+        """读入紧接在已读内容之后的一段文本。"""
+        if not text:
+            return
+        self.consumed += len(text)
+        self.current += text
+        while True:
+            m = _HEADING_LINE_RE.search(self.current, self._scan_from)
+            if m is None:
+                # 末尾未完整的行下次再检查（标题行可能跨越两段文本）
+                nl = self.current.rfind("\n")
+                self._scan_from = max(self._scan_from, nl + 1)
+                return
+            self._close_section(m.start())
+            level = len(m.group(1))
+            while self.headings and self.headings[-1][0] >= level:
+                self.headings.pop()
+            self.headings.append((level, self.current[:m.end() - m.start()]))
+            self._scan_from = m.end() - m.start()
+
+    def seek(self, doc: str, offset: int) -> None:
+        """把游标移到 doc[offset]；向后移动时从头重放（调用方需保证始终是同一篇 doc）。"""
+        if offset < self.consumed:
+            self.reset()
+        self.advance(doc[self.consumed:offset])
+
+    def _close_section(self, end: int) -> None:
+        """current[:end] 属于已结束的章节：切段落入索引，current 从 end 开始。"""
+        for passage in _split_passages(self.current[:end], self.passage_chars):
+            if not _HEADING_LINE_RE.sub("", passage + "\n").strip():
+                continue  # 只有标题行的段落（如空章节）不入索引，标题路径已单独给出
+            self.index.add(passage)
+            self.passages.append(passage)
+        self.current = self.current[end:]
+
+    # ----- 组装 context -----
+    def _query(self) -> str:
+        titles = " ".join(line for _, line in self.headings)
+        return titles + " " + self.current[-self.query_chars:]
+
+    def build(self) -> str:
+        """按当前游标位置组装 context。"""
+        parents = "".join(line for _, line in self.headings[:-1])
+        current = self.current
+        room = self.max_chars - len(parents)
+        if room <= 0:
+            return (parents + current)[-self.max_chars:]
+        if len(current) >= room:
+            return parents + current[len(current) - room:]
+
+        room -= len(current)
+        picked: List[int] = []
+        for doc_id, _ in self.index.search(self._query(), self.top_k):
+            cost = len(self.passages[doc_id]) + len(GAP_MARK)
+            if cost <= room:
+                picked.append(doc_id)
+                room -= cost
+        if not picked:
+            return parents + current
+        retrieved = GAP_MARK.join(self.passages[i].strip("\n") for i in sorted(picked))
+        return retrieved + GAP_MARK + parents + current
+
+
+def make_context_builder(context_mode: str, cfg: Optional[RetrievalConfig] = None) -> Optional[RetrievalContext]:
+    """context_mode 为 "full" 时返回 None（沿用完整前缀），"retrieval" 时返回新的构造器。"""
+    if context_mode not in CONTEXT_MODES:
+        raise ValueError(f"未知的 context_mode：{context_mode}（可选：{', '.join(CONTEXT_MODES)}）")
+    if context_mode == "full":
+        return None
+    return RetrievalContext(**(cfg or RetrievalConfig())._asdict())
@@ -17,13 +17,17 @@
 """
 
 import argparse
-import json
+import bisect
 import os
 import re
 import sys
 import unicodedata
 from typing import List, Dict, Any, Tuple, Optional
 
+import json_io
+import storage
+from tag_spans import CLOSE_TAG, scan_tags
+
 HEADING_RE = re.compile(r'^(#{1,6})\s*(.*?)\s*#*\s*$', re.M)
 
 def normalize_title(s: str) -> str:
@@ -148,19 +152,23 @@ def parse_outline(outline_md: str) -> List[OutlineNode]:
     if not matches:
         return []
 
+    # 一次线性扫描取出全部已闭合的 <tag>，各标题块内按位置二分查找
+    closed_spans = [sp for sp in scan_tags(outline_md)[1] if sp.closed]
+    open_positions = [sp.open_pos for sp in closed_spans]
+
     nodes: List[Tuple[int, str, str]] = []
     for idx, m in enumerate(matches):
         hashes, title = m.group(1), m.group(2)
         level = min(len(hashes), 3)
         start = m.end()
         end = matches[idx + 1].start() if idx + 1 < len(matches) else len(outline_md)
-        block = outline_md[start:end]
 
-        if level == 1:
-            tag_text = ""
-        else:
-            tag_m = re.search(r'<tag>(.*?)</tag>', block, flags=re.DOTALL)
-            tag_text = tag_m.group(1).strip() if tag_m else ""
+        tag_text = ""
+        if level != 1:
+            k = bisect.bisect_left(open_positions, start)
+            if k < len(closed_spans) and closed_spans[k].inner_end + len(CLOSE_TAG) <= end:
+                sp = closed_spans[k]
+                tag_text = outline_md[sp.inner_start:sp.inner_end].strip()
 
         nodes.append((level, title.strip(), tag_text))
 
@@ -207,20 +215,17 @@ def attach_content_from_original(outline_roots: List[OutlineNode],
     else:
         return {"title": "ROOT", "tag": "", "content": "", "children": [node_to_dict(r, []) for r in outline_roots]}
 
-def build_structure(outline_path: str, original_path: str, output_path: Optional[str] = None) -> Dict[str, Any]:
-    with open(outline_path, 'r', encoding='utf-8') as f:
-        outline_md = f.read()
-    with open(original_path, 'r', encoding='utf-8') as f:
-        original_md = f.read()
+def build_structure(outline_path: str, original_path: str, output_path: Optional[str] = None,
+                    compact: Optional[bool] = None) -> Dict[str, Any]:
+    outline_md = storage.read_text(outline_path)
+    original_md = storage.read_text(original_path)
 
     outline_roots = parse_outline(outline_md)
     original_map = build_original_path_map(original_md)
     result = attach_content_from_original(outline_roots, original_map)
 
     if output_path:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        json_io.dump_file(result, output_path, compact=compact)
     return result
 
 # -----------------------------
@@ -244,7 +249,8 @@ def is_case_dir(name: str) -> Optional[int]:
 def process_root(root_dir: str,
                  outline_name: str = "outline.md",
                  original_name: str = "full_content.md",
-                 output_name: str = "section_content.json") -> None:
+                 output_name: str = "section_content.json",
+                 compact: Optional[bool] = None) -> None:
     """
     遍历 root_dir：
       root_dir/
@@ -261,11 +267,10 @@ def process_root(root_dir: str,
 
     # 收集所有形如 case<number> 的目录，并按数字排序
     case_entries = []
-    for name in os.listdir(root_dir):
-        case_idx = is_case_dir(name)
-        path = os.path.join(root_dir, name)
-        if case_idx is not None and os.path.isdir(path):
-            case_entries.append((case_idx, name))
+    for path in storage.iter_case_dirs(root_dir):
+        case_idx = is_case_dir(path.name)
+        if case_idx is not None:
+            case_entries.append((case_idx, path.name))
 
     if not case_entries:
         print(f"[WARN] 根目录下未发现任何 case* 目录：{root_dir}", file=sys.stderr)
@@ -279,15 +284,15 @@ def process_root(root_dir: str,
         original_path = os.path.join(case_dir, original_name)
         output_path = os.path.join(case_dir, output_name)
 
-        if not os.path.isfile(outline_path):
+        if not storage.exists(outline_path):
             print(f"[WARN] 缺少大纲：{outline_path}，已跳过。", file=sys.stderr)
             continue
-        if not os.path.isfile(original_path):
+        if not storage.exists(original_path):
             print(f"[WARN] 缺少原文：{original_path}，已跳过。", file=sys.stderr)
             continue
 
         try:
-            build_structure(outline_path, original_path, output_path)
+            build_structure(outline_path, original_path, output_path, compact=compact)
             print(f"[OK] 已生成：{output_path}")
         except Exception as e:
             print(f"[ERROR] 处理失败：{case_dir}（{e}）", file=sys.stderr)
@@ -298,9 +303,10 @@ def main():
     parser.add_argument("--outline-name", default="outline.md", help="大纲文件名（默认：outline.md）")
     parser.add_argument("--original-name", default="full_content.md", help="原文文件名（默认：full_content.md）")
     parser.add_argument("--output-name", default="section_content.json", help="输出 JSON 文件名（默认：section_content.json）")
+    parser.add_argument("--compact", action="store_true", default=None, help="输出紧凑 JSON（默认缩进 2，可用 JSON_COMPACT=1 设置）")
 
     args = parser.parse_args()
-    process_root(args.root, args.outline_name, args.original_name, args.output_name)
+    process_root(args.root, args.outline_name, args.original_name, args.output_name, compact=args.compact)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+对冲请求（hedged requests）：压低 split_with_gpt 的长尾延迟。
+
+- 从最近的调用中学习延迟分布（滑动窗口），请求耗时超过第 percentile 分位时
+  再发一份相同的请求，先返回且有效的结果胜出，另一份被取消（丢弃结果）
+- 额外开销上限：对冲次数不超过已发请求数的 max_extra 比例（如 0.1 即最多多花 10%）
+- 样本不足 min_samples 时不对冲（分位数不可靠）
+- 统计：请求数、对冲触发次数、对冲胜出次数、节省的秒数
+  （节省 = 落败请求实际完成耗时 - 胜出耗时；落败请求若未完成或失败则不计入）
+
+同步 HTTP 请求无法中途打断：“取消”是指尚未开始的请求不再发送，已在途的请求结果被丢弃。
+call 可通过 cancel.add_callback 登记取消时要执行的清理（如提前归还并发名额），
+落败请求的线程仍要等到请求结束，调用方应为请求设置超时；
+线程池按调用方的并发上限设置（max_workers），留出落败请求占用线程的余量。
+
+用法：
+    policy = HedgePolicy(percentile=0.95, max_extra=0.1, max_workers=2 * max_inflight)
+    result = policy.run(lambda cancel: call_api(), valid=lambda r: r is not None)
+    print(policy.stats.summary())
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_PERCENTILE = 0.95
+DEFAULT_MAX_EXTRA = 0.1
+DEFAULT_WINDOW = 200
+DEFAULT_MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """最近 window 次完成调用的耗时（秒），用于估计分位数。"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[idx]
+
+
+class CancelToken:
+    """取消标记：set() 后 is_set() 为真，并依次执行登记的回调（set 之后登记的回调立即执行）。"""
+
+    def __init__(self):
+        self._set = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def is_set(self) -> bool:
+        return self._set
+
+    def set(self) -> None:
+        with self._lock:
+            if self._set:
+                return
+            self._set = True
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn()
+
+    def add_callback(self, fn: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._set:
+                self._callbacks.append(fn)
+                return
+        fn()
+
+
+class HedgeStats:
+    def __init__(self):
+        self.requests = 0         # 主请求数
+        self.hedges = 0           # 触发的对冲次数
+        self.hedge_wins = 0       # 对冲请求胜出次数
+        self.skipped_budget = 0   # 超过阈值但因额外开销上限未对冲的次数
+        self.saved_seconds = 0.0  # 对冲胜出后，相对落败请求实际耗时节省的秒数
+        self._lock = threading.Lock()
+
+    def add(self, **deltas) -> None:
+        with self._lock:
+            for k, v in deltas.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def summary(self) -> str:
+        rate = self.hedges / self.requests if self.requests else 0.0
+        return (f"请求 {self.requests} 次，对冲 {self.hedges} 次（{rate:.1%}），对冲胜出 {self.hedge_wins} 次，"
+                f"因开销上限跳过 {self.skipped_budget} 次，节省约 {self.saved_seconds:.1f}s")
+
+
+class HedgePolicy:
+    """
+    按学习到的延迟分位数触发对冲。线程安全，可在多个并发调用间共享（共享延迟窗口与开销预算）。
+    主请求与对冲请求都在内部线程池中执行，max_workers 应按调用方的并发上限设置。
+    """
+
+    def __init__(self, percentile: float = DEFAULT_PERCENTILE, max_extra: float = DEFAULT_MAX_EXTRA,
+                 window: int = DEFAULT_WINDOW, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 min_delay: float = 0.5, max_workers: int = 16):
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latency = LatencyTracker(window)
+        self.stats = HedgeStats()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def hedge_delay(self) -> Optional[float]:
+        """当前的对冲触发延迟；样本不足时返回 None（不对冲）。"""
+        if len(self.latency) < self.min_samples:
+            return None
+        p = self.latency.percentile(self.percentile)
+        return None if p is None else max(self.min_delay, p)
+
+    def _within_budget(self) -> bool:
+        return self.stats.hedges + 1 <= self.max_extra * max(1, self.stats.requests)
+
+    def _launch(self, call: Callable[[CancelToken], T], cancel: CancelToken) -> Future:
+        started = time.monotonic()
+
+        def attempt():
+            result = call(cancel)
+            return result, time.monotonic() - started
+
+        return self._pool.submit(attempt)
+
+    def run(self, call: Callable[[CancelToken], T], valid: Callable[[T], bool] = lambda r: True) -> T:
+        """
+        执行 call（参数为取消标记，call 可在长耗时步骤间检查它或登记取消回调），必要时发出一次对冲。
+        - 未对冲时原样返回主请求的结果（有效性交给调用方的重试逻辑）
+        - 已对冲时先完成且 valid 的结果胜出；两者都无效则返回最后完成的结果，都抛错则抛出最后的异常
+        """
+        self.stats.add(requests=1)
+        start = time.monotonic()
+        cancels: List[CancelToken] = [CancelToken()]
+        futures: List[Future] = [self._launch(call, cancels[0])]
+
+        delay = self.hedge_delay()
+        if delay is not None:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                if self._within_budget():
+                    self.stats.add(hedges=1)
+                    cancels.append(CancelToken())
+                    futures.append(self._launch(call, cancels[1]))
+                else:
+                    self.stats.add(skipped_budget=1)
+
+        pending = set(futures)
+        last_result = last_error = None
+        has_result = False
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    result, seconds = fut.result()
+                except Exception as e:  # 单个请求失败：等另一份
+                    last_error = e
+                    continue
+                self.latency.record(seconds)
+                last_result, has_result = result, True
+                if len(futures) == 1 or valid(result):
+                    self._settle(fut, futures, cancels, time.monotonic() - start)
+                    return result
+
+        if has_result:
+            return last_result
+        raise last_error
+
+    def _settle(self, winner: Future, futures: List[Future], cancels: List[CancelToken], won_at: float) -> None:
+        """取消落败请求；落败请求之后若正常完成，用其实际耗时计算节省的秒数。"""
+        if len(futures) == 1:
+            return
+        if winner is futures[1]:
+            self.stats.add(hedge_wins=1)
+        for fut, cancel in zip(futures, cancels):
+            if fut is winner:
+                continue
+            cancel.set()
+            if fut.cancel():
+                continue
+
+            def on_done(f: Future, loser_is_primary: bool = fut is futures[0]):
+                if f.cancelled() or f.exception() is not None:
+                    return
+                _, seconds = f.result()
+                self.latency.record(seconds)
+                if loser_is_primary:
+                    # 主请求从 start 起算；对冲胜出时刻同样从 start 起算
+                    self.stats.add(saved_seconds=max(0.0, seconds - won_at))
+
+            fut.add_done_callback(on_done)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基于 diff 的增量重切：文档小改动后只重切改动所在区域，未改动的片段原样保留（偏移随之平移）。
+
+- 快照：每次切片完成后把输入另存为快照，下次与之做行级 diff
+    - 规则切片（split_sentence.json / split_clause.json）：full_content.md
+    - LLM 切片（split_snippet 的输出）：section_content.json
+  快照存放在根目录下的 .snapshots/<case 名>/ 中，不进入 case 目录，
+  因此不会被 case_bundle 打包，也不会被监听/遍历 case 文件的代码当作 case 产物
+- diff_resplit：把旧片段定位到旧文档，完全落在未改动区域的片段直接复用；
+  触及改动的片段及其前后各一个相邻片段标记为脏，两个干净片段之间的区域交给后端重切
+  （相邻片段一并重切，保证规则切分的边界与全量重切一致）
+- LLM 切片按章节内容拼接成一篇文档做 diff，重切区域按章节边界拆开后再调用后端，
+  因此只有改动所在的章节片段会发请求
+- 没有快照时（首次运行）退回全量切片；init_snapshots 可把当前输入登记为快照
+  （假定现有输出与当前输入一致，watch_cases 启动时会调用）
+
+用法：
+    python incremental.py --root ./                  # 增量重切规则切片
+    python incremental.py --root ./ --with-llm       # 同时增量重切 LLM 切片
+    python incremental.py --root ./ --init           # 仅为当前输入登记快照
+"""
+
+import argparse
+import bisect
+import difflib
+import re
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import json_io
+import split_sentence
+import storage
+from splitters import DEFAULT_BACKEND, SNIPPET_OUTPUT_NAME, SplitterPolicy, available_backends, create_splitter
+
+CASE_DIR_RE = re.compile(r"^case\d+$")
+
+RULE_SOURCE = "full_content.md"
+RULE_OUTPUTS = (("sentence", "split_sentence.json"), ("clause", "split_clause.json"))
+LLM_SOURCE = "section_content.json"
+
+# 章节内容拼接时使用的分隔（独占一行的 NUL，不会出现在正文中，也不属于空白字符）
+SECTION_SEP = "\n\x00\n"
+
+# 快照目录（位于数据集根目录下，与 case 目录并列）
+SNAPSHOT_DIR = ".snapshots"
+
+Span = Optional[Tuple[int, int]]
+
+
+class DiffResult(NamedTuple):
+    fragments: List[str]
+    first_changed: int   # 新片段列表中第一个非复用片段的下标（无改动时等于片段数）
+    reused: int          # 复用的旧片段数
+    regions: int         # 重切的区域数
+    resplit_chars: int   # 重切区域的总字符数
+
+
+def snapshot_path(path: Path) -> Path:
+    """root/case3/full_content.md -> root/.snapshots/case3/full_content.md"""
+    case_dir = path.parent
+    return case_dir.parent / SNAPSHOT_DIR / case_dir.name / path.name
+
+
+# ========= 片段定位与 diff =========
+def locate_fragments(text: str, fragments: List[str]) -> List[Span]:
+    """
+    按顺序在 text 中定位各片段，返回 [(起, 止)]；找不到的片段为 None。
+    先精确查找，失败再做忽略空白差异的匹配（片段可能被 strip 或被模型改动了空白）。
+    """
+    spans: List[Span] = []
+    cursor = 0
+    for frag in fragments:
+        idx = text.find(frag, cursor)
+        if idx != -1:
+            spans.append((idx, idx + len(frag)))
+            cursor = idx + len(frag)
+            continue
+        tokens = frag.split()
+        m = re.compile(r"\s+".join(re.escape(t) for t in tokens)).search(text, cursor) if tokens else None
+        if m is None:
+            spans.append(None)
+            continue
+        spans.append((m.start(), m.end()))
+        cursor = m.end()
+    return spans
+
+
+def _line_opcodes(old: str, new: str) -> List[Tuple[str, int, int, int, int]]:
+    """行级 diff，返回以字符偏移表示的 opcodes。"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    old_pos = [0]
+    for line in old_lines:
+        old_pos.append(old_pos[-1] + len(line))
+    new_pos = [0]
+    for line in new_lines:
+        new_pos.append(new_pos[-1] + len(line))
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [(tag, old_pos[i1], old_pos[i2], new_pos[j1], new_pos[j2])
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()]
+
+
+def diff_resplit(old_text: str, new_text: str, old_fragments: List[str],
+                 split_region: Callable[[str], List[str]], barrier: Optional[str] = None) -> DiffResult:
+    """
+    由旧文档 / 旧片段 / 新文档得到新片段：干净片段复用，其余区域调用 split_region 重切。
+    barrier 非空时，脏区域的扩展（间隙、相邻片段）不跨越旧文档中的 barrier（如章节分隔）。
+    """
+    spans = locate_fragments(old_text, old_fragments)
+    walls: List[int] = []
+    if barrier:
+        pos = old_text.find(barrier)
+        while pos != -1:
+            walls.append(pos)
+            pos = old_text.find(barrier, pos + len(barrier))
+
+    def walled(a: int, b: int) -> bool:
+        # [a, b) 之间是否有 barrier
+        i = bisect.bisect_left(walls, a)
+        return i < len(walls) and walls[i] < b
+
+    opcodes = _line_opcodes(old_text, new_text)
+    changes = [(i1, i2) for tag, i1, i2, _, _ in opcodes if tag != "equal"]
+    equal = [(i1, i2, j1 - i1) for tag, i1, i2, j1, _ in opcodes if tag == "equal"]
+
+    # 1) 完全落在同一个未改动块内、且与前后间隙中的改动都不相接的片段为干净片段
+    #    （间隙中插入无句末标点的文字也会改变相邻片段的边界）
+    located = [span for span in spans if span is not None]
+    clean = [False] * len(old_fragments)
+    shift = [0] * len(old_fragments)
+    j = 0
+    for k, span in enumerate(spans):
+        if span is None:
+            continue
+        s, e = span
+        gap_start = located[j - 1][1] if j > 0 else 0
+        gap_end = located[j + 1][0] if j + 1 < len(located) else len(old_text)
+        j += 1
+        if walled(gap_start, s):
+            gap_start = walls[bisect.bisect_left(walls, s) - 1]
+        if walled(e, gap_end):
+            gap_end = walls[bisect.bisect_left(walls, e)]
+        if any(a <= gap_end and b >= gap_start for a, b in changes):
+            continue
+        for i1, i2, delta in equal:
+            if i1 <= s and e <= i2:
+                clean[k] = True
+                shift[k] = delta
+                break
+
+    # 2) 脏片段的前后相邻片段也一并重切（不跨越 barrier）
+    dirty = [not c for c in clean]
+    for k in range(len(clean)):
+        if not dirty[k] or spans[k] is None:
+            continue
+        if k > 0 and spans[k - 1] is not None and not walled(spans[k - 1][1], spans[k][0]):
+            clean[k - 1] = False
+        if k + 1 < len(clean) and spans[k + 1] is not None and not walled(spans[k][1], spans[k + 1][0]):
+            clean[k + 1] = False
+
+    # 3) 依次拼出新片段：两个干净片段之间的区域有改动时重切
+    result: List[str] = []
+    first_changed: Optional[int] = None
+    reused = regions = resplit_chars = 0
+    prev_old = prev_new = 0
+    pending = False
+
+    def flush(old_end: int, new_end: int):
+        nonlocal first_changed, regions, resplit_chars
+        gap_new = new_text[prev_new:new_end]
+        if pending or gap_new != old_text[prev_old:old_end]:
+            if first_changed is None:
+                first_changed = len(result)
+            regions += 1
+            resplit_chars += len(gap_new)
+            if gap_new.strip():
+                result.extend(split_region(gap_new))
+
+    for k, frag in enumerate(old_fragments):
+        if not clean[k]:
+            pending = True
+            continue
+        s, e = spans[k]
+        flush(s, s + shift[k])
+        result.append(frag)
+        reused += 1
+        prev_old, prev_new = e, e + shift[k]
+        pending = False
+    flush(len(old_text), len(new_text))
+
+    return DiffResult(result, len(result) if first_changed is None else first_changed,
+                      reused, regions, resplit_chars)
+
+
+def _report(case_dir: Path, name: str, res: DiffResult) -> None:
+    if res.regions == 0:
+        print(f"[SKIP] {case_dir.name}/{name}：内容未变化")
+    else:
+        print(f"[OK] {case_dir.name}/{name}：复用 {res.reused} 片，重切 {res.regions} 处（{res.resplit_chars} 字符），"
+              f"共 {len(res.fragments)} 片")
+
+
+# ========= 规则切片 =========
+def _rule_text(text: str) -> str:
+    # 与 split_markdown_to_lists 的预处理一致：截断 Reference、统一换行
+    text = split_sentence._cut_before_reference(text)
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def resplit_rule_case(case_dir: Path) -> None:
+    """增量重切 split_sentence.json / split_clause.json；无快照或缺少旧输出时全量切片。"""
+    src = case_dir / RULE_SOURCE
+    snap = snapshot_path(src)
+    if not storage.exists(src):
+        print(f"[SKIP] {case_dir} 下未找到 {RULE_SOURCE}")
+        return
+    new_text = storage.read_text(src)
+    outputs_ready = all(storage.exists(case_dir / name) for _, name in RULE_OUTPUTS)
+    if not storage.exists(snap) or not outputs_ready:
+        split_sentence.process_one_case_dir(case_dir)
+        storage.write_text(snap, new_text)
+        return
+
+    old_text = _rule_text(storage.read_text(snap))
+    for level, name in RULE_OUTPUTS:
+        splitter = create_splitter(level)
+        res = diff_resplit(old_text, _rule_text(new_text), json_io.load_file(case_dir / name), splitter.split)
+        if res.regions:
+            json_io.dump_file(res.fragments, case_dir / name)
+        _report(case_dir, name, res)
+    storage.write_text(snap, new_text)
+
+
+# ========= LLM 切片 =========
+def _section_doc(path: Path) -> str:
+    from split_snippet import extract_contents
+
+    return SECTION_SEP.join(extract_contents(json_io.load_file(path)))
+
+
+def resplit_snippet_case(case_dir: Path, policy: Optional[SplitterPolicy] = None,
+                         model: str = "gpt-4o", compact: Optional[bool] = None) -> None:
+    """增量重切 split_snippet 的输出：只对改动所在区域调用后端（默认 llm）。"""
+    import split_snippet
+
+    if policy is None:
+        policy = SplitterPolicy(DEFAULT_BACKEND, model=model)
+    src = case_dir / LLM_SOURCE
+    snap = snapshot_path(src)
+    out = case_dir / SNIPPET_OUTPUT_NAME
+    if not storage.exists(src):
+        print(f"[SKIP] 找不到输入文件：{src}")
+        return
+    if not storage.exists(snap) or not storage.exists(out):
+        split_snippet.process_case_dir(case_dir, model=model, compact=compact, policy=policy)
+        storage.write_bytes(snap, storage.read_bytes(src))
+        return
+
+    def split_region(region: str) -> List[str]:
+        slices: List[str] = []
+        for part in region.split(SECTION_SEP):
+            if part.strip():
+                slices.extend(policy.pick(case_dir.name, part).split(part))
+        return slices
+
+    res = diff_resplit(_section_doc(snap), _section_doc(src), json_io.load_file(out), split_region,
+                       barrier=SECTION_SEP)
+    if res.regions:
+        json_io.dump_file(res.fragments, out, compact=compact)
+    _report(case_dir, out.name, res)
+    storage.write_bytes(snap, storage.read_bytes(src))
+
+
+# ========= 快照登记 =========
+def init_snapshots(case_dir: Path, with_llm: bool = False, overwrite: bool = False) -> None:
+    """把当前输入登记为快照（假定现有切片输出与之一致）。"""
+    pairs = [(case_dir / RULE_SOURCE, case_dir / RULE_OUTPUTS[0][1])]
+    if with_llm:
+        pairs.append((case_dir / LLM_SOURCE, case_dir / SNIPPET_OUTPUT_NAME))
+    for src, out in pairs:
+        snap = snapshot_path(src)
+        if storage.exists(src) and storage.exists(out) and (overwrite or not storage.exists(snap)):
+            storage.write_bytes(snap, storage.read_bytes(src))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比上次快照，只重切文档中改动过的区域")
+    parser.add_argument("--root", default="./", help="数据集根目录")
+    parser.add_argument("--with-llm", action="store_true", help="同时增量重切 section_content.json 对应的 LLM 切片")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=available_backends(),
+                        help=f"--with-llm 时重切所用的后端（默认：{DEFAULT_BACKEND}）")
+    parser.add_argument("--model", default="gpt-4o", help="LLM 后端使用的模型（默认：gpt-4o）")
+    parser.add_argument("--init", action="store_true", help="只把当前输入登记为快照，不切片")
+    args = parser.parse_args()
+
+    root = Path(args.root).expanduser().resolve()
+    policy = SplitterPolicy(args.backend, model=args.model)
+    for case_dir in storage.iter_case_dirs(root):
+        if not CASE_DIR_RE.match(case_dir.name):
+            continue
+        if args.init:
+            init_snapshots(case_dir, with_llm=args.with_llm, overwrite=True)
+            continue
+        resplit_rule_case(case_dir)
+        if args.with_llm:
+            resplit_snippet_case(case_dir, policy=policy, model=args.model)
+    if args.init:
+        print("[DONE] 快照已登记。")
+
+
+if __name__ == "__main__":
+    main()
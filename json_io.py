@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+流水线统一的 JSON 序列化层，所有脚本读写 section_content.json / split_*.json /
+all_cases_io_*.json 都经由本模块，而不是直接调用标准库 json。
+
+- 后端：优先使用已安装的 orjson，其次 msgspec，否则回退到标准库 json
+  可用环境变量 JSON_BACKEND=auto|orjson|msgspec|json 强制指定
+- 输出：默认与原先一致（UTF-8 原文、indent=2）；compact=True 或环境变量
+  JSON_COMPACT=1 时输出紧凑格式（无缩进、无多余空格）
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+import storage
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # 可选依赖
+    msgspec = None
+
+# 与标准库保持一致，调用方可统一捕获
+JSONDecodeError = json.JSONDecodeError
+
+PathLike = Union[str, Path]
+
+
+def _select_backend() -> str:
+    wanted = os.environ.get("JSON_BACKEND", "auto").strip().lower()
+    available = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+    if wanted in available:
+        if available[wanted]:
+            return wanted
+        print(f"[WARN] JSON_BACKEND={wanted} 未安装，改用自动选择")
+    for name in ("orjson", "msgspec", "json"):
+        if available[name]:
+            return name
+    return "json"
+
+
+BACKEND = _select_backend()
+
+
+def _default_compact() -> bool:
+    return os.environ.get("JSON_COMPACT", "").strip().lower() in ("1", "true", "yes")
+
+
+# ========= 编解码 =========
+def dumps_bytes(obj: Any, compact: Optional[bool] = None) -> bytes:
+    """序列化为 UTF-8 字节串（非 ASCII 字符原样输出）。"""
+    if compact is None:
+        compact = _default_compact()
+
+    if BACKEND == "orjson":
+        return orjson.dumps(obj, option=0 if compact else orjson.OPT_INDENT_2)
+    if BACKEND == "msgspec":
+        raw = msgspec.json.encode(obj)
+        return raw if compact else msgspec.json.format(raw, indent=2)
+
+    if compact:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    else:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    return text.encode("utf-8")
+
+
+def dumps(obj: Any, compact: Optional[bool] = None) -> str:
+    """序列化为字符串。"""
+    return dumps_bytes(obj, compact=compact).decode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """反序列化；任何后端的解析错误都以 JSONDecodeError 抛出。"""
+    if BACKEND == "orjson":
+        return orjson.loads(data)  # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类
+    if BACKEND == "msgspec":
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            doc = data if isinstance(data, str) else data.decode("utf-8", "replace")
+            raise JSONDecodeError(str(e), doc, 0) from e
+
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def load_file(path: PathLike) -> Any:
+    """读取 JSON 文件（经由 storage，自动识别 .gz / .zst 变体并流式解压）。"""
+    return loads(storage.read_bytes(path))
+
+
+_WRITE_BATCH = 1 << 20
+
+
+def _iter_encoded(obj: Any, compact: Optional[bool]) -> Iterator[bytes]:
+    """
+    分段编码：顶层为非空列表时逐条编码元素，输出与 dumps_bytes 逐字节一致，
+    不需要在内存中拼出整份 JSON（all_cases_io_*.json 可达数百 MB）。
+    """
+    if compact is None:
+        compact = _default_compact()
+    if not isinstance(obj, list) or not obj:
+        yield dumps_bytes(obj, compact=compact)
+        return
+    head, sep, tail, indent = (b"[", b",", b"]", None) if compact else (b"[\n  ", b",\n  ", b"\n]", b"\n  ")
+    buf = [head]
+    size = 0
+    for i, item in enumerate(obj):
+        if i:
+            buf.append(sep)
+        raw = dumps_bytes(item, compact=compact)
+        # 字符串中的换行已被转义，原始换行只出现在缩进结构中
+        buf.append(raw.replace(b"\n", indent) if indent else raw)
+        size += len(raw)
+        if size >= _WRITE_BATCH:
+            yield b"".join(buf)
+            buf, size = [], 0
+    buf.append(tail)
+    yield b"".join(buf)
+
+
+def dump_file(obj: Any, path: PathLike, compact: Optional[bool] = None, codec: Optional[str] = None) -> None:
+    """写出 JSON 文件（经由 storage 流式压缩写出，codec 为 None 时按 STORAGE_CODEC 决定是否压缩）。"""
+    with storage.open_write(path, codec=codec) as f:
+        for chunk in _iter_encoded(obj, compact):
+            f.write(chunk)
+
+
+# ========= 汇总输出的构建配置记录 =========
+def settings_path(output_file: PathLike) -> Path:
+    """汇总输出对应的构建配置记录（隐藏文件，不匹配 all_cases_io_*.json）。"""
+    p = Path(output_file)
+    return p.with_name(f".{p.name}.build")
+
+
+def save_settings(output_file: PathLike, settings: Dict[str, Any]) -> None:
+    """记录生成汇总输出时的配置，watch_cases 据此判断旧样本能否复用、按同样配置局部重建。"""
+    dump_file(settings, settings_path(output_file), compact=True, codec="none")
+
+
+def load_settings(output_file: PathLike) -> Optional[Dict[str, Any]]:
+    """读取构建配置记录；不存在或已损坏时返回 None。"""
+    path = settings_path(output_file)
+    try:
+        data = load_file(path) if storage.exists(path) else None
+    except JSONDecodeError:
+        data = None
+    return data if isinstance(data, dict) else None
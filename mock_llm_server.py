@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地模拟 LLM 接口：兼容 OpenAI 的 POST /v1/chat/completions（含 stream=True 的 SSE），
+用于在不联网、不花钱的情况下测试 split_snippet 的并发、对冲与重试逻辑。
+
+- 回复：把提示词中 "### Content:" 之后的原文按空行切段，以 JSON 数组返回（总能还原原文）
+- 延迟：正常请求耗时约 --latency 秒（±30% 抖动），以 --tail-prob 的概率变为 --tail-latency 秒的长尾
+- 故障注入：--rate-limit-prob 概率返回 429（带 Retry-After: --retry-after），
+  --error-prob 概率返回 500，--garbage-prob 概率返回无法解析的内容
+- GET /stats 返回累计请求数、各类注入次数
+
+用法：
+    python mock_llm_server.py --port 8799 --latency 0.3 --tail-prob 0.05 --tail-latency 5
+    OPENAI_BASE_URL=http://127.0.0.1:8799/v1 OPENAI_API_KEY=mock python split_snippet.py --hedge
+"""
+
+import argparse
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import json_io
+
+DEFAULT_PORT = 8799
+
+_CONTENT_MARK = "### Content:"
+
+
+class MockConfig:
+    def __init__(self, latency: float = 0.3, tail_prob: float = 0.0, tail_latency: float = 5.0,
+                 rate_limit_prob: float = 0.0, retry_after: float = 1.0, error_prob: float = 0.0,
+                 garbage_prob: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.tail_prob = tail_prob
+        self.tail_latency = tail_latency
+        self.rate_limit_prob = rate_limit_prob
+        self.retry_after = retry_after
+        self.error_prob = error_prob
+        self.garbage_prob = garbage_prob
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, int] = {"requests": 0, "tail": 0, "rate_limited": 0, "errors": 0, "garbage": 0}
+        self.lock = threading.Lock()
+
+    def draw(self) -> Dict[str, float]:
+        """为一次请求抽取 (延迟, 注入类型)。"""
+        with self.lock:
+            self.stats["requests"] += 1
+            r = self.rng.random()
+            if r < self.rate_limit_prob:
+                self.stats["rate_limited"] += 1
+                return {"kind": "429", "delay": 0.0}
+            r -= self.rate_limit_prob
+            if r < self.error_prob:
+                self.stats["errors"] += 1
+                return {"kind": "500", "delay": self.latency}
+            r -= self.error_prob
+            tail = self.rng.random() < self.tail_prob
+            if tail:
+                self.stats["tail"] += 1
+            delay = self.tail_latency if tail else self.latency * self.rng.uniform(0.7, 1.3)
+            if self.rng.random() < self.garbage_prob:
+                self.stats["garbage"] += 1
+                return {"kind": "garbage", "delay": delay}
+            return {"kind": "ok", "delay": delay}
+
+
+def split_paragraphs(content: str) -> List[str]:
+    return [p for p in re.split(r"(?<=\n\n)", content) if p]
+
+
+def _extract_content(messages: List[Dict]) -> str:
+    text = messages[-1].get("content", "") if messages else ""
+    idx = text.find(_CONTENT_MARK)
+    if idx == -1:
+        return text
+    body = text[idx + len(_CONTENT_MARK):]
+    return body[1:] if body.startswith("\n") else body
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    config: MockConfig = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send_json(self, code: int, obj, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json_io.dumps_bytes(obj, compact=True)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.config.lock:
+                return self._send_json(200, dict(self.config.stats))
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            req = json_io.loads(self.rfile.read(length))
+        except json_io.JSONDecodeError:
+            return self._send_json(400, {"error": {"message": "invalid json"}})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "not found"}})
+
+        plan = self.config.draw()
+        time.sleep(plan["delay"])
+        if plan["kind"] == "429":
+            return self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_error"}},
+                                   headers={"Retry-After": f"{self.config.retry_after:g}"})
+        if plan["kind"] == "500":
+            return self._send_json(500, {"error": {"message": "mock server error", "type": "server_error"}})
+
+        content = _extract_content(req.get("messages", []))
+        if plan["kind"] == "garbage":
+            answer = "抱歉，我无法完成这个请求。"
+        else:
+            answer = json_io.dumps(split_paragraphs(content), compact=True)
+
+        model = req.get("model", "mock")
+        rid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        if req.get("stream"):
+            return self._stream(rid, model, answer)
+        self._send_json(200, {
+            "id": rid, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(content), "completion_tokens": len(answer),
+                      "total_tokens": len(content) + len(answer)},
+        })
+
+    def _stream(self, rid: str, model: str, answer: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        step = 16
+        try:
+            for i in range(0, len(answer), step):
+                chunk = {"id": rid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [{"index": 0, "delta": {"content": answer[i:i + step]}, "finish_reason": None}]}
+                self.wfile.write(b"data: " + json_io.dumps_bytes(chunk, compact=True) + b"\n\n")
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端提前关闭流（如对冲落败或输出偏离原文）
+        self.close_connection = True
+
+
+def make_server(config: MockConfig, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type("MockHandler", (_MockHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 OpenAI chat completions 接口（可注入延迟与故障）")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认：127.0.0.1）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"监听端口（默认：{DEFAULT_PORT}）")
+    parser.add_argument("--latency", type=float, default=0.3, help="正常请求耗时秒数（默认：0.3）")
+    parser.add_argument("--tail-prob", type=float, default=0.0, help="长尾请求概率（默认：0）")
+    parser.add_argument("--tail-latency", type=float, default=5.0, help="长尾请求耗时秒数（默认：5）")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="返回 429 的概率（默认：0）")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After 秒数（默认：1）")
+    parser.add_argument("--error-prob", type=float, default=0.0, help="返回 500 的概率（默认：0）")
+    parser.add_argument("--garbage-prob", type=float, default=0.0, help="返回无法解析内容的概率（默认：0）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, tail_prob=args.tail_prob, tail_latency=args.tail_latency,
+                        rate_limit_prob=args.rate_limit_prob, retry_after=args.retry_after,
+                        error_prob=args.error_prob, garbage_prob=args.garbage_prob, seed=args.seed)
+    server = make_server(config, args.host, args.port)
+    print(f"[START] 模拟接口：http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"[DONE] 已停止。统计：{config.stats}")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
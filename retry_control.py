@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM 请求的共享重试控制：所有 worker 共用一个 RetryController。
+
+- 退避：指数退避 + 抖动（base * 2^(attempt-1)，取其 [1/2, 1] 之间的随机值，不超过 max_sleep）；
+  响应带 Retry-After / retry-after-ms 时以服务端给出的时间为准（再加少量抖动，错开同时恢复的 worker）
+- 并发：AIMD 限流——每次成功加性增长（+1/limit），收到 429 时乘性减半（cooldown 内只减一次）
+- 熔断：连续 failure_threshold 次服务端故障（5xx / 超时 / 连接失败）后熔断，
+  所有 worker 暂停 cooldown 秒，之后只放一个探测请求；探测成功恢复，失败继续熔断。
+  故障持续（自首次熔断起）超过 max_wait 秒后，等待中的与新来的请求直接抛出 CircuitOpenError，
+  由调用方决定放弃；探测照常进行，接口恢复后自动解除
+- 不可重试：400/401/403/404/422 等客户端错误重试无意义，is_retryable 返回 False
+- 429 与客户端错误说明服务端仍在响应，不计入熔断
+- 其他异常（本地解析错误、缺少依赖、流式生成器被提前关闭等）与接口健康无关：
+  既不计成功也不计失败，只归还并发名额；若该请求是半开探测，则放行下一个探测
+- 放弃：call() 产出的 Slot 可提前 abandon（如对冲落败的请求）：立即归还名额，
+  之后该请求的结果不再计入限流与熔断
+
+本模块不依赖 openai，按异常的 status_code 与类名识别错误类型。
+
+用法：
+    controller = get_controller()
+    with controller.call():
+        resp = client.chat.completions.create(...)
+    ...
+    time.sleep(controller.backoff(attempt, retry_after_of(e)))
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional
+
+RATE_LIMIT = "rate_limit"
+CLIENT_ERROR = "client"
+SERVER_ERROR = "server"
+OTHER = "other"
+
+_RETRYABLE_4XX = (408, 409, 429)
+_CONNECTION_ERROR_NAMES = ("APIConnectionError", "APITimeoutError")
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断持续时间超过等待上限。"""
+
+
+def classify(exc: BaseException) -> str:
+    status = getattr(exc, "status_code", None)
+    if status == 429:
+        return RATE_LIMIT
+    if isinstance(status, int) and 400 <= status < 500:
+        return CLIENT_ERROR if status not in _RETRYABLE_4XX else SERVER_ERROR
+    if isinstance(status, int) and status >= 500:
+        return SERVER_ERROR
+    if isinstance(exc, (TimeoutError, ConnectionError)) or \
+            any(c.__name__ in _CONNECTION_ERROR_NAMES for c in type(exc).__mro__):
+        return SERVER_ERROR
+    return OTHER
+
+
+def is_retryable(exc: BaseException) -> bool:
+    return classify(exc) != CLIENT_ERROR
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """从异常携带的响应头中读取 Retry-After（秒）；没有则返回 None。"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    get = headers.get
+    ms = get("retry-after-ms") or get("Retry-After-Ms")
+    if ms:
+        try:
+            return max(0.0, float(ms) / 1000.0)
+        except ValueError:
+            pass
+    value = get("retry-after") or get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AIMDLimiter:
+    """加性增、乘性减的并发上限。"""
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 32,
+                 decrease_factor: float = 0.5, cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= max(self.minimum, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_rate_limit(self) -> None:
+        with self._cond:
+            now = time.monotonic()
+            # 同一波 429 往往同时到达，cooldown 内只减一次
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+                self._last_decrease = now
+
+
+class CircuitBreaker:
+    """closed -> open（暂停所有 worker）-> half_open（单个探测）-> closed / open。"""
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0, max_wait: Optional[float] = 600.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._outage_start = 0.0
+        self._probe_in_flight = False
+        self._cond = threading.Condition()
+
+    def before_call(self) -> bool:
+        """熔断期间阻塞；半开时只放行一个探测请求。返回本次请求是否为探测。"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self.state == "closed":
+                    return False
+                if self.state == "open" and now >= self._opened_at + self.cooldown:
+                    self.state = "half_open"
+                    self._probe_in_flight = False
+                if self.state == "half_open" and not self._probe_in_flight:
+                    self._probe_in_flight = True
+                    return True
+                deadline = None if self.max_wait is None else self._outage_start + self.max_wait
+                if deadline is not None and now >= deadline:
+                    raise CircuitOpenError(f"接口持续不可用，熔断已超过 {self.max_wait:g}s")
+                wait_s = self._opened_at + self.cooldown - now if self.state == "open" else self.cooldown
+                if deadline is not None:
+                    wait_s = min(wait_s, deadline - now)
+                self._cond.wait(timeout=max(0.01, wait_s))
+
+    def record_success(self) -> None:
+        with self._cond:
+            self.failures = 0
+            if self.state != "closed":
+                print("[INFO] 接口已恢复，解除熔断")
+                self.state = "closed"
+                self._probe_in_flight = False
+                self._cond.notify_all()
+
+    def record_neutral(self, probe: bool) -> None:
+        """结果不反映接口健康：不改变计数与状态；探测请求未得出结论时让出探测名额。"""
+        with self._cond:
+            if probe and self.state == "half_open":
+                self._probe_in_flight = False
+                self._cond.notify_all()
+
+    def record_failure(self) -> None:
+        with self._cond:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                if self.state == "closed":
+                    self.trips += 1
+                    self._outage_start = time.monotonic()
+                    print(f"[WARN] 连续 {self.failures} 次接口故障，熔断 {self.cooldown:g}s（暂停所有请求）")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self._cond.notify_all()
+
+
+class Slot:
+    """call() 占用的一个并发名额；归还与结果记账只发生一次（正常结束或 abandon 先到者为准）。"""
+
+    def __init__(self, limiter: AIMDLimiter, breaker: CircuitBreaker, probe: bool):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.probe = probe
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _close(self) -> bool:
+        with self._lock:
+            if self._closed:
+                return False
+            self._closed = True
+            return True
+
+    def abandon(self) -> None:
+        """不再等待该请求：立即归还名额，结果按与接口无关处理（探测则让出探测名额）。"""
+        if self._close():
+            self.breaker.record_neutral(self.probe)
+            self.limiter.release()
+
+
+class RetryController:
+    """退避 + AIMD 并发 + 熔断的组合，供所有 worker 共享。"""
+
+    def __init__(self, base_sleep: float = 2.0, max_sleep: float = 60.0,
+                 limiter: Optional[AIMDLimiter] = None, breaker: Optional[CircuitBreaker] = None,
+                 seed: Optional[int] = None):
+        self.base_sleep = base_sleep
+        self.max_sleep = max_sleep
+        self.limiter = limiter or AIMDLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None, base: Optional[float] = None) -> float:
+        """第 attempt 次失败后应等待的秒数；base 缺省时用 base_sleep。"""
+        base = self.base_sleep if base is None else base
+        with self._rng_lock:
+            if retry_after is not None:
+                return min(self.max_sleep, retry_after) + self._rng.uniform(0.0, base * 0.5)
+            cap = min(self.max_sleep, base * (2 ** max(0, attempt - 1)))
+            return self._rng.uniform(cap / 2.0, cap)
+
+    @contextmanager
+    def call(self) -> Iterator[Slot]:
+        """
+        包住一次请求：熔断检查、占用并发名额，并按结果更新限流与熔断状态。
+        与接口无关的异常（OTHER）只归还名额后原样抛出，不计入限流与熔断。
+        产出的 Slot 被 abandon 后，请求的结果不再记账。
+        """
+        probe = self.breaker.before_call()
+        self.limiter.acquire()
+        slot = Slot(self.limiter, self.breaker, probe)
+        try:
+            yield slot
+        except BaseException as e:
+            if slot._close():
+                self._record(classify(e), probe)
+            raise
+        else:
+            if slot._close():
+                self._record(None, probe)
+
+    def _record(self, kind: Optional[str], probe: bool) -> None:
+        """按结果（kind 为 None 表示成功）更新限流与熔断，并归还名额。"""
+        try:
+            if kind is None:
+                self.limiter.on_success()
+                self.breaker.record_success()
+            elif kind == RATE_LIMIT:
+                self.limiter.on_rate_limit()
+                self.breaker.record_success()
+            elif kind == SERVER_ERROR:
+                self.breaker.record_failure()
+            elif kind == CLIENT_ERROR:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_neutral(probe)
+        finally:
+            self.limiter.release()
+
+    def summary(self) -> str:
+        return (f"并发上限 {self.limiter.limit:.1f}，熔断状态 {self.breaker.state}，"
+                f"累计熔断 {self.breaker.trips} 次")
+
+
+_default: Optional[RetryController] = None
+_default_lock = threading.Lock()
+
+
+def configure(max_inflight: int = 32, failure_threshold: int = 5, cooldown: float = 30.0,
+              max_wait: Optional[float] = 600.0, **opts) -> RetryController:
+    """替换进程内共享的默认控制器（CLI 启动时调用）。"""
+    global _default
+    controller = RetryController(
+        limiter=AIMDLimiter(initial=min(8, max_inflight), maximum=max_inflight),
+        breaker=CircuitBreaker(failure_threshold=failure_threshold, cooldown=cooldown, max_wait=max_wait),
+        **opts,
+    )
+    with _default_lock:
+        _default = controller
+    return controller
+
+
+def get_controller() -> RetryController:
+    """进程内共享的默认控制器（首次调用时创建）。"""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = RetryController()
+    return _default
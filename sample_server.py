@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地样本服务：一次性加载 all_cases_io_*.json，供同机多个训练 loader 进程共享同一份内存。
+- 传输：localhost HTTP（--port）或 Unix socket（--unix）
+- 接口（GET，返回 JSON）：
+    /info                                         数据集列表、样本数、case 列表
+    /range?dataset=&start=&stop=                  按下标区间取样本
+    /samples?dataset=&ids=1,5,9                   按下标批量取样本
+    /case?dataset=&file=case0                     取某个 case 的全部样本
+    /batch?dataset=&size=&index=&seed=&epoch=     按 (seed, epoch) 打乱后取第 index 个 batch
+- 编码后的响应按请求做 LRU 缓存，重复请求直接返回缓存字节
+
+用法示例：
+    python sample_server.py --data all_cases_io_sentence.json --data all_cases_io_clause.json --port 8765
+    python sample_server.py --data all_cases_io_snippet.json --unix /tmp/samples.sock
+客户端：
+    from sample_server import SampleClient
+    client = SampleClient("http://127.0.0.1:8765")      # 或 SampleClient(unix_path="/tmp/samples.sock")
+    batch = client.batch("all_cases_io_sentence", size=32, index=0, seed=0, epoch=0)
+"""
+
+import argparse
+import http.client
+import os
+import random
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import json_io
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 256
+PERM_CACHE_SIZE = 4       # 保留的 (数据集, seed, epoch) 打乱顺序个数，每个占 O(样本数) 内存
+
+
+class SampleStore:
+    """内存中的样本集合：{数据集名: 样本列表}，并按 file 字段建立 case 索引。"""
+
+    def __init__(self):
+        self.datasets: Dict[str, List[Dict]] = {}
+        self.case_index: Dict[str, Dict[str, List[int]]] = {}
+        self._perm_cache: "OrderedDict[Tuple[str, int, int], List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path: Path, name: Optional[str] = None) -> str:
+        name = name or path.stem
+        data = json_io.load_file(path)
+        if not isinstance(data, list):
+            raise ValueError(f"样本文件不是 JSON 数组：{path}")
+        index: Dict[str, List[int]] = {}
+        for i, sample in enumerate(data):
+            index.setdefault(sample.get("file", ""), []).append(i)
+        self.datasets[name] = data
+        self.case_index[name] = index
+        print(f"[OK] 已加载 {name}：{len(data)} 条样本，{len(index)} 个 case（{path}）")
+        return name
+
+    def resolve(self, name: Optional[str]) -> str:
+        if name:
+            if name not in self.datasets:
+                raise KeyError(f"未知数据集：{name}")
+            return name
+        if len(self.datasets) == 1:
+            return next(iter(self.datasets))
+        raise KeyError("存在多个数据集，请指定 dataset 参数")
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            name: {"size": len(data), "cases": sorted(self.case_index[name])}
+            for name, data in self.datasets.items()
+        }
+
+    def range(self, name: str, start: int, stop: int) -> List[Dict]:
+        if start < 0 or stop < 0:
+            raise ValueError(f"下标不能为负：start={start}, stop={stop}")
+        return self.datasets[name][start:stop]
+
+    def samples(self, name: str, ids: List[int]) -> List[Dict]:
+        data = self.datasets[name]
+        # 负下标在 Python 中会从末尾取值，必须显式拒绝
+        bad = [i for i in ids if i < 0 or i >= len(data)]
+        if bad:
+            raise IndexError(f"样本下标越界：{bad[:10]}（共 {len(data)} 条）")
+        return [data[i] for i in ids]
+
+    def case(self, name: str, file_label: str) -> List[Dict]:
+        data = self.datasets[name]
+        return [data[i] for i in self.case_index[name].get(file_label, [])]
+
+    def batch(self, name: str, size: int, index: int, seed: int, epoch: int) -> List[Dict]:
+        if size <= 0:
+            raise ValueError(f"batch 大小必须为正：size={size}")
+        if index < 0:
+            raise ValueError(f"batch 序号不能为负：index={index}")
+        key = (name, seed, epoch)
+        with self._lock:
+            perm = self._perm_cache.get(key)
+            if perm is None:
+                perm = list(range(len(self.datasets[name])))
+                random.Random(f"{seed}:{epoch}").shuffle(perm)
+                self._perm_cache[key] = perm
+                while len(self._perm_cache) > PERM_CACHE_SIZE:
+                    self._perm_cache.popitem(last=False)
+            else:
+                self._perm_cache.move_to_end(key)
+        return self.samples(name, perm[index * size:(index + 1) * size])
+
+
+class _ResponseCache:
+    """线程安全的 LRU 缓存：请求路径 -> 已编码的响应字节。"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: str, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = body
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+class _SampleHandler(BaseHTTPRequestHandler):
+    store: SampleStore = None
+    cache: _ResponseCache = None
+
+    def address_string(self) -> str:
+        # Unix socket 下 client_address 为空串
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self):
+        # /info 含实时统计，不走缓存
+        cacheable = not self.path.startswith("/info")
+        cached = self.cache.get(self.path) if cacheable else None
+        if cached is not None:
+            return self._send(200, cached)
+        try:
+            body = json_io.dumps_bytes(self._dispatch(), compact=True)
+        except KeyError as e:
+            return self._send(404, json_io.dumps_bytes({"error": str(e)}, compact=True))
+        except (ValueError, IndexError) as e:
+            return self._send(400, json_io.dumps_bytes({"error": str(e)}, compact=True))
+        if cacheable:
+            self.cache.put(self.path, body)
+        self._send(200, body)
+
+    def _dispatch(self) -> Any:
+        url = urlsplit(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        store = self.store
+        if url.path == "/info":
+            return {"datasets": store.info(), "cache": {"hits": self.cache.hits, "misses": self.cache.misses}}
+
+        name = store.resolve(q.get("dataset"))
+        if url.path == "/range":
+            return store.range(name, int(q.get("start", 0)), int(q.get("stop", 0)))
+        if url.path == "/samples":
+            ids = [int(i) for i in q.get("ids", "").split(",") if i.strip()]
+            return store.samples(name, ids)
+        if url.path == "/case":
+            return store.case(name, q.get("file", ""))
+        if url.path == "/batch":
+            return store.batch(name, int(q.get("size", 32)), int(q.get("index", 0)),
+                               int(q.get("seed", 0)), int(q.get("epoch", 0)))
+        raise KeyError(f"未知接口：{url.path}")
+
+    def _send(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(store: SampleStore, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                unix_path: Optional[str] = None, cache_size: int = DEFAULT_CACHE_SIZE):
+    """构造服务端（未启动），调用方负责 serve_forever() / shutdown()。"""
+    handler = type("SampleHandler", (_SampleHandler,), {"store": store, "cache": _ResponseCache(cache_size)})
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        return _UnixHTTPServer(unix_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# ========= 客户端 =========
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, unix_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = unix_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class SampleClient:
+    """样本服务客户端（每个 loader 进程各持有一个，连接复用）。"""
+
+    def __init__(self, url: str = f"http://127.0.0.1:{DEFAULT_PORT}", unix_path: Optional[str] = None,
+                 timeout: float = 30.0):
+        self.unix_path = unix_path
+        self.timeout = timeout
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname or "127.0.0.1", parts.port or DEFAULT_PORT
+        self._local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.unix_path:
+                conn = _UnixHTTPConnection(self.unix_path, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _get(self, path: str, **params) -> Any:
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        conn = self._conn()
+        try:
+            conn.request("GET", f"{path}?{query}" if query else path)
+            resp = conn.getresponse()
+            body = resp.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        data = json_io.loads(body)
+        if resp.status != 200:
+            raise RuntimeError(f"样本服务返回 {resp.status}: {data.get('error')}")
+        return data
+
+    def info(self) -> Dict[str, Any]:
+        return self._get("/info")
+
+    def range(self, start: int, stop: int, dataset: Optional[str] = None) -> List[Dict]:
+        return self._get("/range", dataset=dataset, start=start, stop=stop)
+
+    def samples(self, ids: List[int], dataset: Optional[str] = None) -> List[Dict]:
+        return self._get("/samples", dataset=dataset, ids=",".join(str(i) for i in ids))
+
+    def case(self, file_label: str, dataset: Optional[str] = None) -> List[Dict]:
+        return self._get("/case", dataset=dataset, file=file_label)
+
+    def batch(self, dataset: Optional[str] = None, size: int = 32, index: int = 0,
+              seed: int = 0, epoch: int = 0) -> List[Dict]:
+        return self._get("/batch", dataset=dataset, size=size, index=index, seed=seed, epoch=epoch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地样本服务：多个训练 loader 共享一份已加载的 all_cases_io_*.json")
+    parser.add_argument("--data", action="append", required=True, help="样本文件路径，可多次指定")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认：127.0.0.1）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"监听端口（默认：{DEFAULT_PORT}）")
+    parser.add_argument("--unix", default=None, help="改用 Unix socket 监听的路径")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help=f"响应 LRU 缓存条数，0 表示关闭（默认：{DEFAULT_CACHE_SIZE}）")
+    args = parser.parse_args()
+
+    store = SampleStore()
+    for p in args.data:
+        store.load(Path(p).expanduser().resolve())
+
+    server = make_server(store, host=args.host, port=args.port, unix_path=args.unix, cache_size=args.cache_size)
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"[START] 样本服务已启动：{where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+        print("[DONE] 样本服务已停止。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按预算流式抽样训练样本：
+- 候选样本以轻量描述（如 (元素下标, ratio)）流式提交，不需要先生成完整样本
+- 分层：按 (ratio, 片段长度桶) 分层，各层独立做蓄水池抽样（Algorithm R）
+- 两级上限：
+    - per_case_cap：单个 case 最多保留的样本数（case 内按层等比例分配）
+    - budget：全体样本总数上限（跨 case 按层等比例分配）
+- 内存只与 分层数 × budget 有关，与语料规模无关
+- 固定 seed 时结果可复现，返回顺序与提交顺序一致
+"""
+
+import random
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# 片段长度分桶边界（字符数）：[0,32) [32,128) [128,512) [512,∞)
+LENGTH_BUCKETS: Sequence[int] = (32, 128, 512)
+
+
+def length_bucket(length: int, edges: Sequence[int] = LENGTH_BUCKETS) -> int:
+    """返回 length 所在的长度桶编号。"""
+    for i, edge in enumerate(edges):
+        if length < edge:
+            return i
+    return len(edges)
+
+
+def _allocate(counts: Dict[Hashable, int], capacities: Dict[Hashable, int], total: int) -> Dict[Hashable, int]:
+    """
+    按各层出现次数等比例分配 total 个名额（最大余数法），
+    单层不超过其容量，多余名额继续分给仍有余量的层。
+    """
+    alloc = {k: 0 for k in counts}
+    remaining = min(total, sum(capacities.values()))
+    while remaining > 0:
+        open_keys = [k for k in counts if alloc[k] < capacities[k]]
+        weight = sum(counts[k] for k in open_keys)
+        if not open_keys or weight <= 0:
+            break
+        shares = {k: remaining * counts[k] / weight for k in open_keys}
+        granted = 0
+        for k in open_keys:
+            take = min(int(shares[k]), capacities[k] - alloc[k])
+            alloc[k] += take
+            granted += take
+        # 余数按小数部分从大到小逐个补齐
+        left = remaining - granted
+        for k in sorted(open_keys, key=lambda k: shares[k] - int(shares[k]), reverse=True):
+            if left <= 0:
+                break
+            if alloc[k] < capacities[k]:
+                alloc[k] += 1
+                left -= 1
+        if left == remaining:
+            break
+        remaining = left
+    return alloc
+
+
+class _StratifiedReservoir:
+    """每层一个容量为 capacity 的蓄水池，并记录每层见过的候选数。"""
+
+    def __init__(self, capacity: int, rng: random.Random):
+        self.capacity = capacity
+        self.rng = rng
+        self.pools: Dict[Hashable, List[Any]] = {}
+        self.seen: Dict[Hashable, int] = {}
+
+    def offer(self, stratum: Hashable, entry: Any) -> None:
+        pool = self.pools.setdefault(stratum, [])
+        n = self.seen.get(stratum, 0) + 1
+        self.seen[stratum] = n
+        if len(pool) < self.capacity:
+            pool.append(entry)
+        else:
+            j = self.rng.randrange(n)
+            if j < self.capacity:
+                pool[j] = entry
+
+    def take(self, total: int) -> List[Tuple[Hashable, Any]]:
+        """按层等比例取出 total 条（蓄水池本身是均匀样本，再均匀取子集仍均匀）。"""
+        capacities = {k: len(p) for k, p in self.pools.items()}
+        alloc = _allocate(self.seen, capacities, total)
+        chosen: List[Tuple[Hashable, Any]] = []
+        for k, pool in self.pools.items():
+            n = alloc.get(k, 0)
+            picked = pool if n >= len(pool) else self.rng.sample(pool, n)
+            chosen.extend((k, e) for e in picked)
+        return chosen
+
+    def clear(self) -> None:
+        self.pools.clear()
+        self.seen.clear()
+
+
+class BudgetedSampler:
+    """
+    流式分层抽样器。用法：
+        sampler = BudgetedSampler(budget=10000, per_case_cap=200, seed=0)
+        for case, stratum, item in candidates:
+            sampler.offer(case, stratum, item)
+        selected = sampler.finish()   # [(case, item), ...]，保持提交顺序
+    同一 case 的候选需连续提交。budget 与 per_case_cap 都为 None 时不做抽样。
+    """
+
+    def __init__(self, budget: Optional[int] = None, per_case_cap: Optional[int] = None, seed: int = 0):
+        self.budget = budget
+        self.per_case_cap = per_case_cap
+        self.rng = random.Random(seed)
+        self._seq = 0
+        self._case: Optional[str] = None
+        self._case_pool = _StratifiedReservoir(per_case_cap, self.rng) if per_case_cap is not None else None
+        self._global_pool = _StratifiedReservoir(budget, self.rng) if budget is not None else None
+        self._passthrough: List[Tuple[int, str, Any]] = []
+        self.offered = 0
+
+    def offer(self, case: str, stratum: Hashable, item: Any) -> None:
+        if case != self._case:
+            self._flush_case()
+            self._case = case
+        self.offered += 1
+        self._seq += 1
+        entry = (self._seq, case, item)
+        if self._case_pool is not None:
+            self._case_pool.offer(stratum, entry)
+        else:
+            self._push_global(stratum, entry)
+
+    def _push_global(self, stratum: Hashable, entry: Tuple[int, str, Any]) -> None:
+        if self._global_pool is not None:
+            self._global_pool.offer(stratum, entry)
+        else:
+            self._passthrough.append(entry)
+
+    def _flush_case(self) -> None:
+        if self._case_pool is None or self._case is None:
+            return
+        # case 内按提交顺序送入全局池，保证全局蓄水池的随机性与顺序无关
+        for stratum, entry in sorted(self._case_pool.take(self.per_case_cap), key=lambda x: x[1][0]):
+            self._push_global(stratum, entry)
+        self._case_pool.clear()
+
+    def finish(self) -> List[Tuple[str, Any]]:
+        self._flush_case()
+        self._case = None
+        if self._global_pool is not None:
+            entries = [e for _, e in self._global_pool.take(self.budget)]
+        else:
+            entries = self._passthrough
+        entries.sort(key=lambda e: e[0])
+        return [(case, item) for _, case, item in entries]
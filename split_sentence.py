@@ -2,9 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import re
-import json
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import json_io
+import storage
+from splitters import SplitterPolicy
 
 SENT_PUNCT = r'(?<=[。？！；])'          # 句子级：仅中文句末标点（保留分隔符）
 clause_PUNCT = r'(?<=[，。？！；])'       # 逗号级：中文逗号 + 句末标点（保留分隔符）
@@ -72,42 +75,39 @@ def split_markdown_to_lists(text: str) -> Tuple[List[str], List[str]]:
 def process_one_case_dir(case_dir: Path,
                          md_name: str = "full_content.md",
                          sent_json_name: str = "split_sentence.json",
-                         clause_json_name: str = "split_clause.json") -> None:
+                         clause_json_name: str = "split_clause.json",
+                         policies: Optional[Dict[str, SplitterPolicy]] = None) -> None:
     """
     在单个 case 目录中执行分片，并写入两个 JSON 文件。
+    切片经由 splitters 注册表：policies 按输出级别（"sentence" / "clause"）给出后端选择，
+    缺省时使用同名的规则后端（与 split_markdown_to_lists 的结果一致）。
     """
     md_path = case_dir / md_name
-    if not md_path.exists():
+    if not storage.exists(md_path):
         print(f"[SKIP] {case_dir} 下未找到 {md_name}")
         return
 
     try:
-        text = md_path.read_text(encoding="utf-8")
+        text = storage.read_text(md_path)
     except Exception as e:
         print(f"[WARN] 读取失败：{md_path} ({e})")
         return
 
-    slices_sent, slices_clause = split_markdown_to_lists(text)
-
-    (case_dir / sent_json_name).write_text(
-        json.dumps(slices_sent, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
-    print(f"[OK] 句子级切片写入：{case_dir / sent_json_name}")
-
-    (case_dir / clause_json_name).write_text(
-        json.dumps(slices_clause, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
-    print(f"[OK] 逗号级切片写入：{case_dir / clause_json_name}")
+    policies = policies or {}
+    for level, json_name, label in (("sentence", sent_json_name, "句子级"), ("clause", clause_json_name, "逗号级")):
+        policy = policies.get(level) or SplitterPolicy(level)
+        splitter = policy.pick(case_dir.name, text)
+        json_io.dump_file(splitter.split(text), case_dir / json_name)
+        print(f"[OK] {label}切片写入：{case_dir / json_name}（{splitter.name}）")
 
 def process_root(root_dir: str,
                  case_pattern: str = r"^case\d+$",
                  md_name: str = "full_content.md",
                  sent_json_name: str = "split_sentence.json",
-                 clause_json_name: str = "split_clause.json") -> None:
+                 clause_json_name: str = "split_clause.json",
+                 policies: Optional[Dict[str, SplitterPolicy]] = None) -> None:
     """
-    批量处理根目录下所有符合 case_pattern 的子目录。
+    批量处理根目录下所有符合 case_pattern 的子目录（后端选择见 process_one_case_dir）。
     """
     root = Path(root_dir)
     if not root.exists():
@@ -115,7 +115,7 @@ def process_root(root_dir: str,
         return
 
     regex = re.compile(case_pattern)
-    case_dirs = sorted([p for p in root.iterdir() if p.is_dir() and regex.match(p.name)])
+    case_dirs = [p for p in storage.iter_case_dirs(root) if regex.match(p.name)]
 
     if not case_dirs:
         print(f"[INFO] 在 {root} 下未找到匹配 {case_pattern} 的子目录")
@@ -123,7 +123,7 @@ def process_root(root_dir: str,
 
     print(f"[INFO] 将处理 {len(case_dirs)} 个目录：{', '.join(p.name for p in case_dirs)}")
     for d in case_dirs:
-        process_one_case_dir(d, md_name, sent_json_name, clause_json_name)
+        process_one_case_dir(d, md_name, sent_json_name, clause_json_name, policies=policies)
 
 # ===== 示例调用 =====
 if __name__ == "__main__":
@@ -3,16 +3,31 @@
 
 import os
 import re
-import json
 import time
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
-from openai import OpenAI, APIError, RateLimitError
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import json_io
+import storage
+from hedging import HedgePolicy
+from retry_control import CircuitOpenError, RetryController, get_controller, is_retryable, retry_after_of
+from retry_control import configure as configure_retry
+from splitters import (DEFAULT_BACKEND, DEFAULT_CACHE_DIR, SNIPPET_OUTPUT_NAME, SplitterPolicy, available_backends,
+                       parse_backend_map)
 
 # ========= 可按需修改的默认文件名 =========
 INPUT_JSON_NAME = "section_content.json"
-OUTPUT_JSON_NAME = "split_snippet_test.json"
+OUTPUT_JSON_NAME = SNIPPET_OUTPUT_NAME   # 输出名与 incremental / watch_cases 共用，见 splitters.SNIPPET_OUTPUT_NAME
+
+# ========= 超长段落预切块 =========
+MAX_CHUNK_TOKENS = 1500   # 单次送入 GPT 的估算 token 上限
+CHUNK_WORKERS = 4         # 块级并发数
+
+# ========= 请求超时 =========
+REQUEST_TIMEOUT = 120.0   # 单次请求超时秒数（超时按接口异常处理并重试）
 
 # ========= 代理（如不需要可注释掉）=========
 # os.environ.setdefault("http_proxy", "http://172.17.0.1:7890")
@@ -20,11 +35,67 @@ OUTPUT_JSON_NAME = "split_snippet_test.json"
 # os.environ.setdefault("HTTP_PROXY", "http://172.17.0.1:7890")
 # os.environ.setdefault("HTTPS_PROXY", "http://172.17.0.1:7890")
 
-# ========= OpenAI 客户端 =========
-client = OpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),
-    base_url=os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"),
-)
+# ========= OpenAI 客户端（首次调用时才导入 openai 并创建）=========
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                # 重试统一交给 retry_control，关闭 SDK 自带的重试，避免重试次数叠加、熔断计数失真
+                _client = OpenAI(
+                    api_key=os.environ.get("OPENAI_API_KEY"),
+                    base_url=os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+                    max_retries=0,
+                )
+    return _client
+
+
+_api_error_types: Optional[Tuple[type, ...]] = None
+
+
+def _api_errors() -> Tuple[type, ...]:
+    """
+    接口异常类型 (RateLimitError, APIError)；仅在已发起请求后的 except 中求值，首次解析后缓存。
+    未安装 openai 时为空元组（except 子句中不能再抛 ImportError）。
+    """
+    global _api_error_types
+    if _api_error_types is None:
+        try:
+            from openai import APIError, RateLimitError
+            _api_error_types = (RateLimitError, APIError)
+        except ImportError:  # 可选依赖
+            _api_error_types = ()
+    return _api_error_types
+
+
+class SplitReport:
+    """
+    一次切片调用的结果记录：fallbacks 为回退为未切原文的次数（含流式的剩余原文、本地修复补齐的尾部）。
+    并发块共用同一实例，计数加锁。
+    """
+
+    def __init__(self):
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def add_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    @property
+    def complete(self) -> bool:
+        return self.fallbacks == 0
+
+
+def _fallback(content: str, report: Optional[SplitReport]) -> List[str]:
+    if report is not None:
+        report.add_fallback()
+    return [content]
 
 # ========= 工具函数 =========
 def extract_contents(node: Dict[str, Any]) -> List[str]:
@@ -50,7 +121,7 @@ def _best_effort_json_loads(text: str):
     - 尝试用正则抽取第一个以 [ 开始、以 ] 结束的片段
     """
     if not isinstance(text, str):
-        raise json.JSONDecodeError("not a string", doc=str(text), pos=0)
+        raise json_io.JSONDecodeError("not a string", doc=str(text), pos=0)
 
     # 去除三引号代码块
     fence = re.compile(r"```(?:json)?\s*([\s\S]*?)```", re.IGNORECASE)
@@ -64,16 +135,11 @@ def _best_effort_json_loads(text: str):
         if arr:
             text = arr.group(0)
 
-    return json.loads(text)
+    return json_io.loads(text)
 
 
-def split_with_gpt(content: str, model: str = "gpt-4o", temperature: float = 0.0,
-                   max_retries: int = 3, retry_base_sleep: float = 2.0) -> List[str]:
-    """
-    调用 GPT 将一段内容按语义切片为字符串数组。
-    - 解析失败或接口异常时做有限次数重试
-    - 最终仍失败则回退为 [content]
-    """
+def _build_messages(content: str) -> List[Dict[str, str]]:
+    """构造分片请求的 messages（流式与非流式共用同一提示词）。"""
     prompt = f"""
 你是一个文档分片助手。请根据语义将### Content中的内容分割为若干语义完整的段落，每个分割后的片段不应该低于两个完整的句子(需要以句号结束才叫做句子，逗号不算)。
 如果分隔的某个片段只有一个句子则可以考虑将其合并到其他的片段。
@@ -100,65 +166,447 @@ Example
 ### Content:
 {content}
 """.strip()
+    return [
+        {"role": "system", "content": "你是一个严格的助手，只输出符合要求的 JSON。"},
+        {"role": "user", "content": prompt},
+    ]
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            resp = client.chat.completions.create(
+
+def _slices_from_response(resp) -> List[str]:
+    """从 completion 响应中解析切片；无法解析或为空时抛出异常。"""
+    slices = _best_effort_json_loads(resp.choices[0].message.content)
+    # 只保留字符串条目
+    slices = [s for s in slices if isinstance(s, str) and s.strip()]
+    if not slices:
+        raise ValueError("Empty slices produced.")
+    return slices
+
+
+def _is_valid_response(resp) -> bool:
+    try:
+        _slices_from_response(resp)
+        return True
+    except Exception:
+        return False
+
+
+def split_with_gpt(content: str, model: str = "gpt-4o", temperature: float = 0.0,
+                   max_retries: int = 3, retry_base_sleep: float = 2.0,
+                   timeout: Optional[float] = REQUEST_TIMEOUT, hedge: Optional[HedgePolicy] = None,
+                   retry: Optional[RetryController] = None,
+                   report: Optional[SplitReport] = None) -> List[str]:
+    """
+    调用 GPT 将一段内容按语义切片为字符串数组。
+    - 接口异常时按 retry（缺省为进程内共享的控制器）退避重试：指数退避 + 抖动，优先遵循 Retry-After；
+      客户端错误（如 400/401）不重试
+    - 输出无法解析时先本地修复，修复不了立即重试（内容问题，不等待）
+    - 最终仍失败或接口持续熔断则回退为 [content]，并记入 report
+    - 每次请求最长等待 timeout 秒
+    - 给出 hedge 时按其策略对慢请求发出对冲请求，先返回且可解析的结果胜出；
+      对冲请求另占一个并发名额，AIMD 限流看到的是实际在途的请求数；落败请求的名额在胜出时即归还
+    """
+    controller = retry or get_controller()
+    messages = _build_messages(content)
+
+    def request(cancel=None):
+        # 每次实际发出的请求（含对冲请求）各占一个并发名额、各自计入限流与熔断；
+        # 对冲落败时立即归还名额，不等落败请求超时
+        if cancel is not None and cancel.is_set():
+            return None
+        with controller.call() as slot:
+            if cancel is not None:
+                cancel.add_callback(slot.abandon)
+            return _get_client().chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": "你是一个严格的助手，只输出符合要求的 JSON。"},
-                    {"role": "user", "content": prompt},
-                ],
+                messages=messages,
                 temperature=temperature,
+                timeout=timeout,
             )
-            content_out = resp.choices[0].message.content
-            try:
-                slices = _best_effort_json_loads(content_out)
-                # 只保留字符串条目
-                slices = [s for s in slices if isinstance(s, str) and s.strip()]
-                if not slices:
-                    raise ValueError("Empty slices produced.")
-                return slices
-            except Exception:
-                if attempt >= max_retries:
-                    return [content]
-                time.sleep(retry_base_sleep * attempt)
-        except (RateLimitError, APIError) as e:
-            # 简单指数退避
+
+    for attempt in range(1, max_retries + 1):
+        try:
+            resp = hedge.run(request, valid=_is_valid_response) if hedge is not None else request()
+        except CircuitOpenError as e:
+            print(f"[ERROR] {e}，放弃本段切片")
+            return _fallback(content, report)
+        except _api_errors() as e:
+            if not is_retryable(e):
+                print(f"[ERROR] OpenAI 调用失败（不可重试）: {e}")
+                return _fallback(content, report)
             if attempt >= max_retries:
                 print(f"[ERROR] OpenAI 调用失败（已达最大重试次数）: {e}")
-                return [content]
-            sleep_s = retry_base_sleep * attempt
+                return _fallback(content, report)
+            sleep_s = controller.backoff(attempt, retry_after_of(e), base=retry_base_sleep)
             print(f"[WARN] OpenAI 调用异常，{sleep_s:.1f}s 后重试（第 {attempt}/{max_retries} 次）: {e}")
             time.sleep(sleep_s)
+            continue
         except Exception as e:
             # 其他未知异常：不再无限重试，按上限处理
             if attempt >= max_retries:
                 print(f"[ERROR] 调用异常（已达最大重试次数）: {e}")
-                return [content]
-            time.sleep(retry_base_sleep * attempt)
+                return _fallback(content, report)
+            time.sleep(controller.backoff(attempt, base=retry_base_sleep))
+            continue
+
+        try:
+            return _slices_from_response(resp)
+        except Exception:
+            repaired = _repair_slices(resp.choices[0].message.content, content, report)
+            if repaired:
+                print(f"[INFO] 输出无法直接解析，已本地修复（{len(repaired)} 个切片）")
+                return repaired
+        if attempt >= max_retries:
+            return _fallback(content, report)
+        # 无法修复：内容问题而非接口问题，立即重试
 
     # 理论不达
-    return [content]
+    return _fallback(content, report)
 
 
-def process_case_dir(case_dir: Path, model: str):
+# ========= 流式增量解析 =========
+class _StreamingSliceParser:
+    """
+    增量解析 JSON 字符串数组：逐段 feed 模型输出的增量文本，每闭合一个字符串元素即返回。
+    - 第一个 '[' 之前的内容（如 ```json 代码块标记、说明文字）直接忽略
+    - 数组内的非字符串元素忽略（与非流式模式只保留字符串条目一致）
+    - partial 为当前尚未闭合的字符串已解码部分，可用于提前校验
+    """
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self):
+        self.state = "seek"     # seek / array / string / escape / unicode / done
+        self.partial = ""
+        self._hex = ""
+        self._high_surrogate = ""
+
+    @property
+    def done(self) -> bool:
+        return self.state == "done"
+
+    def feed(self, text: str) -> List[str]:
+        closed: List[str] = []
+        for ch in text:
+            state = self.state
+            if state == "string":
+                if ch == '"':
+                    closed.append(self.partial)
+                    self.partial = ""
+                    self.state = "array"
+                elif ch == "\\":
+                    self.state = "escape"
+                else:
+                    self.partial += ch
+            elif state == "escape":
+                if ch == "u":
+                    self._hex = ""
+                    self.state = "unicode"
+                else:
+                    self.partial += self._ESCAPES.get(ch, ch)
+                    self.state = "string"
+            elif state == "unicode":
+                self._hex += ch
+                if len(self._hex) == 4:
+                    self._push_code_unit(int(self._hex, 16))
+                    self.state = "string"
+            elif state == "array":
+                if ch == '"':
+                    self.state = "string"
+                elif ch == "]":
+                    self.state = "done"
+            elif state == "seek":
+                if ch == "[":
+                    self.state = "array"
+            else:  # done：数组闭合后的内容全部忽略
+                break
+        return closed
+
+    def _push_code_unit(self, code: int):
+        # 处理 \uD83D\uDE00 形式的代理对
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = chr(code)
+            return
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate:
+            pair = (self._high_surrogate + chr(code)).encode("utf-16", "surrogatepass")
+            self.partial += pair.decode("utf-16")
+        else:
+            self.partial += chr(code)
+        self._high_surrogate = ""
+
+
+class _SourceTracker:
+    """
+    校验模型输出是否仍与原文一致：忽略空白差异，逐字符比对。
+    pos 为原文中已对齐到的位置；text 以空白结尾时，原文中紧随的空白一并归入已对齐部分。
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.pos = 0
+
+    def advance(self, text: str) -> bool:
+        src, pos = self.source, self.pos
+        for ch in text:
+            if ch.isspace():
+                continue
+            while pos < len(src) and src[pos].isspace():
+                pos += 1
+            if pos >= len(src) or src[pos] != ch:
+                return False
+            pos += 1
+        if text[-1:].isspace():
+            while pos < len(src) and src[pos].isspace():
+                pos += 1
+        self.pos = pos
+        return True
+
+    def check_partial(self, text: str) -> bool:
+        """不移动 pos，仅判断 text 能否接在当前位置之后。"""
+        saved = self.pos
+        ok = self.advance(text)
+        self.pos = saved
+        return ok
+
+
+def _repair_slices(text: str, source: str, report: Optional[SplitReport] = None) -> Optional[List[str]]:
+    """
+    本地修复无法直接解析的输出，省去一次重新请求：
+    - 用增量解析器读取：容忍数组前后的说明文字、字符串内的裸换行、多余的逗号
+    - 输出被截断时丢弃未闭合的最后一个字符串，用原文剩余部分补齐（该尾部未经切片，记入 report）
+    修复结果必须与原文一致（忽略空白差异），否则返回 None。
+    """
+    if not isinstance(text, str):
+        return None
+    parser = _StreamingSliceParser()
+    slices = parser.feed(text)
+    tracker = _SourceTracker(source)
+    if not slices or not all(tracker.advance(s) for s in slices):
+        return None
+    slices = [s for s in slices if s.strip()]
+    # 已解析部分与原文逐字一致时精确接续，否则从对齐位置接续（空白可能略有出入）
+    joined = "".join(slices)
+    rest = source[len(joined):] if source.startswith(joined) else source[tracker.pos:]
+    if rest.strip():
+        slices.append(rest)
+        if report is not None:
+            report.add_fallback()
+    return slices or None
+
+
+def split_with_gpt_stream(content: str, model: str = "gpt-4o", temperature: float = 0.0,
+                          max_retries: int = 3, retry_base_sleep: float = 2.0,
+                          timeout: Optional[float] = REQUEST_TIMEOUT,
+                          retry: Optional[RetryController] = None,
+                          report: Optional[SplitReport] = None) -> Iterator[str]:
+    """
+    流式版 split_with_gpt：消费 completion 的 token 流，每闭合一个切片立即 yield。
+    - 每收到增量即与原文比对，一旦偏离原文立即中断本次生成并重试
+    - 重试只针对尚未产出的剩余原文，已 yield 的切片不会重复
+    - 接口异常的退避、并发与熔断同 split_with_gpt
+    - 最终仍失败则将剩余原文作为最后一个切片返回，并记入 report
+    """
+    controller = retry or get_controller()
+    remaining = content
+    for attempt in range(1, max_retries + 1):
+        parser = _StreamingSliceParser()
+        tracker = _SourceTracker(remaining)
+        stream = None
+        diverged = False
+        try:
+            with controller.call():
+                stream = _get_client().chat.completions.create(
+                    model=model,
+                    messages=_build_messages(remaining),
+                    temperature=temperature,
+                    stream=True,
+                    timeout=timeout,
+                )
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    for s in parser.feed(delta):
+                        if not tracker.advance(s):
+                            diverged = True
+                            break
+                        # 输出原文对应的片段而非模型文本，空白差异不会带入结果
+                        piece = remaining[:tracker.pos]
+                        if piece.strip():
+                            yield piece
+                            remaining = remaining[tracker.pos:]
+                        tracker = _SourceTracker(remaining)
+                    if not diverged and parser.partial and not tracker.check_partial(parser.partial):
+                        diverged = True
+                    if diverged or parser.done:
+                        break
+        except CircuitOpenError as e:
+            print(f"[ERROR] {e}，剩余内容不再切片")
+            break
+        except _api_errors() as e:
+            if not is_retryable(e):
+                print(f"[ERROR] OpenAI 调用失败（不可重试）: {e}")
+                break
+            if attempt >= max_retries:
+                print(f"[ERROR] OpenAI 调用失败（已达最大重试次数）: {e}")
+                break
+            sleep_s = controller.backoff(attempt, retry_after_of(e), base=retry_base_sleep)
+            print(f"[WARN] OpenAI 调用异常，{sleep_s:.1f}s 后重试（第 {attempt}/{max_retries} 次）: {e}")
+            time.sleep(sleep_s)
+            continue
+        except Exception as e:
+            if attempt >= max_retries:
+                print(f"[ERROR] 调用异常（已达最大重试次数）: {e}")
+                break
+            time.sleep(controller.backoff(attempt, base=retry_base_sleep))
+            continue
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+        if not remaining.strip():
+            return
+        # 偏离原文或输出不完整：内容问题而非接口问题，立即重试剩余部分
+        if diverged:
+            print(f"[WARN] 流式输出偏离原文，已中断并重试剩余内容（第 {attempt}/{max_retries} 次）")
+
+    if remaining.strip():
+        if report is not None:
+            report.add_fallback()
+        yield remaining
+
+
+# ========= 超长段落预切块 =========
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+_PARA_SPLIT_RE = re.compile(r"(?<=\n\n)(?=[^\n])")       # 段落边界（空行之后）
+_SENT_SPLIT_RE = re.compile(r"(?<=[。？！；!?;\n])")        # 句子边界（保留分隔符）
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数（不依赖 tokenizer）：
+    - CJK 字符及全角标点按 1 个 token 计
+    - 其余字符按 4 个字符约 1 个 token 计
+    """
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _split_units(text: str, max_tokens: int) -> List[str]:
+    """
+    将文本拆成不超过 max_tokens 的最小单元，拼接后与原文完全一致：
+    优先按段落，段落过长再按句子，句子仍过长则按字符硬切。
+    """
+    units: List[str] = []
+    for para in _PARA_SPLIT_RE.split(text):
+        if not para:
+            continue
+        if _estimate_tokens(para) <= max_tokens:
+            units.append(para)
+            continue
+        for sent in _SENT_SPLIT_RE.split(para):
+            if not sent:
+                continue
+            if _estimate_tokens(sent) <= max_tokens:
+                units.append(sent)
+                continue
+            # 单句超长：按字符硬切（CJK 下 max_tokens 个字符不会超限）
+            step = max(1, max_tokens)
+            units.extend(sent[i:i + step] for i in range(0, len(sent), step))
+    return units
+
+
+def _chunk_content(content: str, max_tokens: int = MAX_CHUNK_TOKENS) -> List[str]:
+    """
+    在段落/句子边界处将超长 content 预切为若干块，每块估算 token 数不超过 max_tokens。
+    各块依次拼接可完整还原 content。
+    """
+    if max_tokens <= 0 or _estimate_tokens(content) <= max_tokens:
+        return [content]
+
+    chunks: List[str] = []
+    buf, buf_tokens = "", 0
+    for unit in _split_units(content, max_tokens):
+        unit_tokens = _estimate_tokens(unit)
+        if buf and buf_tokens + unit_tokens > max_tokens:
+            chunks.append(buf)
+            buf, buf_tokens = "", 0
+        buf += unit
+        buf_tokens += unit_tokens
+    if buf:
+        chunks.append(buf)
+    return chunks
+
+
+def split_long_content(content: str, model: str = "gpt-4o",
+                       max_chunk_tokens: int = MAX_CHUNK_TOKENS,
+                       workers: int = CHUNK_WORKERS, stream: bool = False,
+                       timeout: Optional[float] = REQUEST_TIMEOUT,
+                       hedge: Optional[HedgePolicy] = None,
+                       report: Optional[SplitReport] = None) -> List[str]:
+    """
+    对超长 content 先预切块，再并发调用 split_with_gpt，最后按顺序拼接结果：
+    - 每个块独立切片，整体耗时取决于最大的块而非最长的段落
+    - 相邻两块的交界片段（前块末片 + 后块首片）合并后再切一次，避免块边界切断语义
+    - content 不超过 max_chunk_tokens 时与直接调用 split_with_gpt 等价
+    - stream=True 时改用 split_with_gpt_stream（偏离原文即提前中断重试，不做对冲）
+    - 任一块（含交界复核）回退为未切原文时记入 report，调用方据此判断结果是否完整
+    """
+    if stream:
+        split_one = lambda c: list(split_with_gpt_stream(c, model=model, timeout=timeout, report=report))
+    else:
+        split_one = lambda c: split_with_gpt(c, model=model, timeout=timeout, hedge=hedge, report=report)
+
+    chunks = _chunk_content(content, max_chunk_tokens)
+    if len(chunks) == 1:
+        return split_one(content)
+
+    print(f"    · 段落过长，预切为 {len(chunks)} 块并发处理")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        parts: List[List[str]] = list(pool.map(split_one, chunks))
+
+        # 交界片段复核：仅当合并后仍不超过块上限时才重新切片
+        boundaries = []
+        for i in range(len(parts) - 1):
+            if not parts[i] or not parts[i + 1]:
+                continue
+            # 块只有一片且已作为上一交界的后片参与复核时跳过，避免同一片段被复核两次而重复输出
+            if len(parts[i]) == 1 and boundaries and boundaries[-1][0] == i - 1:
+                continue
+            joined = parts[i][-1] + parts[i + 1][0]
+            if _estimate_tokens(joined) <= max_chunk_tokens:
+                boundaries.append((i, joined))
+        rejoined = list(pool.map(lambda b: split_one(b[1]), boundaries))
+
+    # 用复核结果替换交界处的两片；替换后该片归属前块，后块首片移除
+    for (i, _), slices in zip(boundaries, rejoined):
+        parts[i] = parts[i][:-1] + slices
+        parts[i + 1] = parts[i + 1][1:]
+
+    return [s for part in parts for s in part]
+
+
+def process_case_dir(case_dir: Path, model: str,
+                     max_chunk_tokens: int = MAX_CHUNK_TOKENS, workers: int = CHUNK_WORKERS,
+                     stream: bool = False, compact: Optional[bool] = None,
+                     policy: Optional[SplitterPolicy] = None):
     """
     处理一个 case* 目录：
     - 读取 section_content.json
-    - 提取所有 content，逐段调用分片
+    - 提取所有 content，逐段按 policy 选择的后端切片（默认 llm：超长段落先预切块并发处理）
     - 汇总写入 split_snippet.json
     """
+    if policy is None:
+        policy = SplitterPolicy(DEFAULT_BACKEND, model=model, max_chunk_tokens=max_chunk_tokens,
+                                workers=workers, stream=stream)
+
     in_path = case_dir / INPUT_JSON_NAME
     out_path = case_dir / OUTPUT_JSON_NAME
 
-    if not in_path.exists():
+    if not storage.exists(in_path):
         print(f"[SKIP] 找不到输入文件：{in_path}")
         return
 
     try:
-        with in_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json_io.load_file(in_path)
     except Exception as e:
         print(f"[WARN] 读取 JSON 失败，跳过：{in_path} ({e})")
         return
@@ -170,13 +618,12 @@ def process_case_dir(case_dir: Path, model: str):
 
     all_slices: List[str] = []
     for idx, content in enumerate(all_contents, 1):
-        print(f"  - 处理段落 {idx}/{len(all_contents)} ...")
-        slices = split_with_gpt(content, model=model)
-        all_slices.extend(slices)
+        splitter = policy.pick(case_dir.name, content)
+        print(f"  - 处理段落 {idx}/{len(all_contents)}（{splitter.name}）...")
+        all_slices.extend(splitter.split(content))
 
     try:
-        with out_path.open("w", encoding="utf-8") as f:
-            json.dump(all_slices, f, ensure_ascii=False, indent=2)
+        json_io.dump_file(all_slices, out_path, compact=compact)
         print(f"[OK] 已写出：{out_path}")
     except Exception as e:
         print(f"[ERROR] 写文件失败：{out_path} ({e})")
@@ -186,12 +633,15 @@ def is_case_dir(p: Path, prefix: str = "case") -> bool:
     """
     判断目录名是否为形如 '<prefix><非负整数>' 的目录，例如 'case0' / 'case1' / ...
     """
-    if not p.is_dir():
+    if not storage.is_case_dir(p):
         return False
     return re.fullmatch(fr'{re.escape(prefix)}\d+', p.name) is not None
 
 
-def process_root(root: Path, model: str, case_prefix: str = "case"):
+def process_root(root: Path, model: str, case_prefix: str = "case",
+                 max_chunk_tokens: int = MAX_CHUNK_TOKENS, workers: int = CHUNK_WORKERS,
+                 stream: bool = False, compact: Optional[bool] = None,
+                 policy: Optional[SplitterPolicy] = None):
     """
     遍历根目录：
     - 仅遍历第一层中所有形如 '<prefix><数字>' 的子目录（默认 'case0/ case1/ ...'）
@@ -200,7 +650,7 @@ def process_root(root: Path, model: str, case_prefix: str = "case"):
     if not root.exists() or not root.is_dir():
         raise FileNotFoundError(f"根目录不存在或不是目录：{root}")
 
-    case_dirs = [p for p in root.iterdir() if is_case_dir(p, case_prefix)]
+    case_dirs = [p for p in storage.iter_case_dirs(root) if is_case_dir(p, case_prefix)]
     if not case_dirs:
         print(f"[WARN] 根目录下未发现 '{case_prefix}<数字>' 形式的子目录：{root}")
         return
@@ -215,21 +665,75 @@ def process_root(root: Path, model: str, case_prefix: str = "case"):
     for d in case_dirs:
         print(f"[DIR] {d.name}")
         process_root.current_dir = d.name
-        process_case_dir(d, model=model)
+        process_case_dir(d, model=model, max_chunk_tokens=max_chunk_tokens,
+                         workers=workers, stream=stream, compact=compact, policy=policy)
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="遍历根目录下的 case* 子目录，调用 OpenAI 进行内容分片。"
+        description="遍历根目录下的 case* 子目录，按所选后端（默认调用 OpenAI）进行内容分片。"
     )
     parser.add_argument("--root", type=str, default="./", help="数据集根目录，例如：/path/to/dataset_root")
     parser.add_argument("--model", type=str, default="gpt-4o", help="OpenAI 模型名（默认：gpt-4o）")
     parser.add_argument("--case-prefix", type=str, default="case", help="子目录前缀（默认：case）")
+    parser.add_argument("--max-chunk-tokens", type=int, default=MAX_CHUNK_TOKENS,
+                        help=f"超长段落预切块的估算 token 上限，<=0 表示不切块（默认：{MAX_CHUNK_TOKENS}）")
+    parser.add_argument("--workers", type=int, default=CHUNK_WORKERS,
+                        help=f"块级并发数（默认：{CHUNK_WORKERS}）")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式请求并增量解析，输出偏离原文时提前中断重试")
+    parser.add_argument("--compact", action="store_true", default=None,
+                        help="输出紧凑 JSON（默认缩进 2，可用 JSON_COMPACT=1 设置）")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=available_backends(),
+                        help=f"默认切片后端（默认：{DEFAULT_BACKEND}）")
+    parser.add_argument("--case-backend", default="",
+                        help="按 case 指定后端，如 case3=local,case5=cached-llm")
+    parser.add_argument("--short-backend", default=None, choices=available_backends(),
+                        help="不超过 --short-max-chars 的短段落改用该后端")
+    parser.add_argument("--short-max-chars", type=int, default=200,
+                        help="--short-backend 生效的段落字符数上限（默认：200）")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT,
+                        help=f"单次请求超时秒数（默认：{REQUEST_TIMEOUT:g}）")
+    parser.add_argument("--hedge", action="store_true",
+                        help="对慢请求发出对冲请求（超过近期延迟分位数时重发一份，先返回者胜出）")
+    parser.add_argument("--hedge-percentile", type=float, default=0.95,
+                        help="触发对冲的延迟分位数（默认：0.95）")
+    parser.add_argument("--hedge-max-extra", type=float, default=0.1,
+                        help="对冲请求数占请求总数的上限（默认：0.1）")
+    parser.add_argument("--max-inflight", type=int, default=32,
+                        help="在途请求数上限；实际并发按 AIMD 自适应：成功时缓增，遇 429 减半（默认：32）")
+    parser.add_argument("--breaker-threshold", type=int, default=5,
+                        help="连续多少次接口故障（5xx/超时/连接失败）后熔断（默认：5）")
+    parser.add_argument("--breaker-cooldown", type=float, default=30.0,
+                        help="熔断后暂停所有请求的秒数，之后放行单个探测请求（默认：30）")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"cached-llm 后端的缓存目录（默认：{DEFAULT_CACHE_DIR}）")
     args = parser.parse_args()
 
     root = Path(args.root).expanduser().resolve()
+    controller = configure_retry(max_inflight=args.max_inflight, failure_threshold=args.breaker_threshold,
+                                 cooldown=args.breaker_cooldown)
+    hedge = None
+    if args.hedge:
+        # 池内同时有主请求与落败后仍在等待超时的请求，按并发上限的两倍留出线程
+        hedge = HedgePolicy(percentile=args.hedge_percentile, max_extra=args.hedge_max_extra,
+                            max_workers=2 * controller.limiter.maximum)
+    try:
+        policy = SplitterPolicy(args.backend, per_case=parse_backend_map(args.case_backend),
+                                short_backend=args.short_backend, short_max_chars=args.short_max_chars,
+                                model=args.model, max_chunk_tokens=args.max_chunk_tokens, workers=args.workers,
+                                stream=args.stream, cache_dir=args.cache_dir, timeout=args.timeout, hedge=hedge)
+    except ValueError as e:
+        parser.error(str(e))
+
     print(f"[START] 根目录：{root}")
-    process_root(root, model=args.model, case_prefix=args.case_prefix)
+    process_root(root, model=args.model, case_prefix=args.case_prefix,
+                 max_chunk_tokens=args.max_chunk_tokens, workers=args.workers,
+                 stream=args.stream, compact=args.compact, policy=policy)
+    print(f"[INFO] 重试控制：{controller.summary()}")
+    if hedge is not None:
+        print(f"[INFO] 对冲统计：{hedge.stats.summary()}")
+        hedge.shutdown()
     print("[DONE] 全部处理完成。")
 
 
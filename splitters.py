@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+切片后端注册表：所有切片方式共用同一接口 Splitter.split(content) -> List[str]。
+
+内置后端：
+- sentence     规则切分，句子级（split_sentence.py 写出 split_sentence.json 时的默认后端）
+- clause       规则切分，逗号级（split_sentence.py 写出 split_clause.json 时的默认后端）
+- llm          调用 GPT 语义切片（split_snippet.split_long_content）
+- cached-llm   llm + 磁盘缓存：按 (提示词, 模型, 切片选项, 内容) 哈希命中时不发请求
+- local        离线启发式：按段落合并为语义块，不联网、无额外依赖
+
+重依赖延迟加载：openai 只在 llm 后端真正发请求时才导入，
+规则/离线后端与缓存命中都不会触发，因此 CLI 启动只需毫秒级。
+
+SplitterPolicy 按 case 或按段落长度选择后端：
+    单 case 指定（per_case） > 短段落规则（short_backend / short_max_chars） > 默认后端
+"""
+
+import abc
+import hashlib
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import json_io
+import storage
+
+DEFAULT_BACKEND = "llm"
+DEFAULT_CACHE_DIR = ".split_cache"
+
+# split_snippet 写出的 LLM 切片文件名（split_snippet / incremental / watch_cases 共用，builder 读取同名文件）
+SNIPPET_OUTPUT_NAME = "split_snippet.json"
+
+# local 后端：合并后单个片段的字符上限，以及每个片段至少包含的句子数
+LOCAL_MAX_CHARS = 600
+LOCAL_MIN_SENTENCES = 2
+
+_PARA_SPLIT_RE = re.compile(r"(?<=\n\n)(?=[^\n])")
+_SENT_END_RE = re.compile(r"[。？！!?]")
+
+
+class Splitter(abc.ABC):
+    """切片后端基类：子类实现 split，返回的片段应能覆盖 content。"""
+
+    name = ""
+
+    @abc.abstractmethod
+    def split(self, content: str) -> List[str]:
+        ...
+
+
+_REGISTRY: Dict[str, Callable[..., Splitter]] = {}
+
+
+def register(name: str):
+    """注册后端工厂（类或函数），工厂接收关键字参数并忽略不认识的参数。"""
+    def deco(factory):
+        _REGISTRY[name] = factory
+        return factory
+    return deco
+
+
+def available_backends() -> List[str]:
+    return sorted(_REGISTRY)
+
+
+def create_splitter(name: str, **opts) -> Splitter:
+    factory = _REGISTRY.get(name)
+    if factory is None:
+        raise ValueError(f"未知的切片后端：{name}（可选：{', '.join(available_backends())}）")
+    return factory(**opts)
+
+
+# ========= 规则后端 =========
+class RuleSplitter(Splitter):
+    def __init__(self, level: str = "sentence", **_):
+        self.level = level
+        self.name = level
+
+    def split(self, content: str) -> List[str]:
+        from split_sentence import split_markdown_to_lists
+
+        sent_list, clause_list = split_markdown_to_lists(content)
+        return sent_list if self.level == "sentence" else clause_list
+
+
+register("sentence")(lambda **opts: RuleSplitter(level="sentence", **opts))
+register("clause")(lambda **opts: RuleSplitter(level="clause", **opts))
+
+
+# ========= LLM 后端 =========
+@register("llm")
+class LLMSplitter(Splitter):
+    name = "llm"
+
+    def __init__(self, model: str = "gpt-4o", max_chunk_tokens: Optional[int] = None,
+                 workers: Optional[int] = None, stream: bool = False,
+                 timeout: Optional[float] = None, hedge=None, **_):
+        self.model = model
+        self.max_chunk_tokens = max_chunk_tokens
+        self.workers = workers
+        self.stream = stream
+        self.timeout = timeout
+        self.hedge = hedge
+
+    def _chunk_tokens(self) -> int:
+        import split_snippet
+
+        return self.max_chunk_tokens if self.max_chunk_tokens is not None else split_snippet.MAX_CHUNK_TOKENS
+
+    def split(self, content: str, report=None) -> List[str]:
+        """report 为 split_snippet.SplitReport 时记录回退为未切原文的次数。"""
+        import split_snippet
+
+        return split_snippet.split_long_content(
+            content, model=self.model,
+            max_chunk_tokens=self._chunk_tokens(),
+            workers=self.workers if self.workers is not None else split_snippet.CHUNK_WORKERS,
+            stream=self.stream,
+            timeout=self.timeout if self.timeout is not None else split_snippet.REQUEST_TIMEOUT,
+            hedge=self.hedge,
+            report=report,
+        )
+
+
+@register("cached-llm")
+class CachedLLMSplitter(LLMSplitter):
+    """
+    带磁盘缓存的 llm 后端：缓存键为 sha1(提示词 + 模型 + 预切块上限 + 是否流式 + 内容)，
+    提示词或切片选项改动后自动失效。
+    只缓存完整成功的结果：任一块回退为未切原文（接口失败、熔断、流式剩余部分）时不写缓存，下次重新请求。
+    """
+    name = "cached-llm"
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, **opts):
+        super().__init__(**opts)
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, content: str) -> str:
+        from split_snippet import _build_messages
+
+        h = hashlib.sha1()
+        for msg in _build_messages(""):
+            h.update(msg["content"].encode("utf-8"))
+        opts = f"{self.model}\0{self._chunk_tokens()}\0{int(bool(self.stream))}"
+        h.update(b"\0" + opts.encode("utf-8") + b"\0" + content.encode("utf-8"))
+        return h.hexdigest()
+
+    def split(self, content: str, report=None) -> List[str]:
+        from split_snippet import SplitReport
+
+        key = self._key(content)
+        path = self.cache_dir / key[:2] / f"{key}.json"
+        if storage.exists(path):
+            try:
+                cached = json_io.load_file(path)
+                if isinstance(cached, list) and all(isinstance(s, str) for s in cached):
+                    self.hits += 1
+                    return cached
+            except json_io.JSONDecodeError:
+                print(f"[WARN] 缓存损坏，重新请求：{path}")
+
+        self.misses += 1
+        report = report if report is not None else SplitReport()
+        fallbacks_before = report.fallbacks
+        slices = super().split(content, report=report)
+        if report.fallbacks == fallbacks_before:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            json_io.dump_file(slices, path, compact=True)
+        return slices
+
+
+# ========= 离线本地后端 =========
+def _is_heading_block(text: str) -> bool:
+    lines = [l for l in text.strip().splitlines() if l.strip()]
+    return bool(lines) and lines[-1].lstrip().startswith("#")
+
+
+@register("local")
+class LocalSplitter(Splitter):
+    """
+    离线启发式切片：以空行分隔的段落为单位顺序合并，
+    - 片段至少包含 min_sentences 个句子且超过 max_chars，或遇到新的标题时断开
+    - 标题段落总是与其后的正文合并
+    - 各片段拼接后与原文完全一致
+    """
+    name = "local"
+
+    def __init__(self, local_max_chars: int = LOCAL_MAX_CHARS, local_min_sentences: int = LOCAL_MIN_SENTENCES, **_):
+        self.max_chars = local_max_chars
+        self.min_sentences = local_min_sentences
+
+    def split(self, content: str) -> List[str]:
+        pieces: List[str] = []
+        buf = ""
+        for para in _PARA_SPLIT_RE.split(content):
+            if not para:
+                continue
+            if buf and not _is_heading_block(buf) and len(_SENT_END_RE.findall(buf)) >= self.min_sentences:
+                if para.lstrip().startswith("#") or len(buf) + len(para) > self.max_chars:
+                    pieces.append(buf)
+                    buf = ""
+            buf += para
+        if buf:
+            pieces.append(buf)
+        return [p for p in pieces if p.strip()] or [content]
+
+
+# ========= 后端选择 =========
+def parse_backend_map(spec: str) -> Dict[str, str]:
+    """解析 "case3=local,case5=cached-llm" 形式的单 case 后端指定。"""
+    mapping: Dict[str, str] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        case_name, sep, backend = item.partition("=")
+        if not sep or not backend.strip():
+            raise ValueError(f"无法解析后端指定：{item!r}（应为 case名=后端）")
+        mapping[case_name.strip()] = backend.strip()
+    return mapping
+
+
+class SplitterPolicy:
+    """按 case / 段落长度选择后端；后端实例首次使用时才创建并复用。"""
+
+    def __init__(self, default: str = DEFAULT_BACKEND, per_case: Optional[Dict[str, str]] = None,
+                 short_backend: Optional[str] = None, short_max_chars: int = 0, **opts):
+        self.default = default
+        self.per_case = dict(per_case or {})
+        self.short_backend = short_backend
+        self.short_max_chars = short_max_chars
+        self.opts = opts
+        self._instances: Dict[str, Splitter] = {}
+        self._lock = threading.Lock()
+        for name in {default, short_backend, *self.per_case.values()} - {None}:
+            if name not in _REGISTRY:
+                raise ValueError(f"未知的切片后端：{name}（可选：{', '.join(available_backends())}）")
+
+    def backend_name(self, case_name: str, content: str) -> str:
+        if case_name in self.per_case:
+            return self.per_case[case_name]
+        if self.short_backend and len(content) <= self.short_max_chars:
+            return self.short_backend
+        return self.default
+
+    def get(self, name: str) -> Splitter:
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = create_splitter(name, **self.opts)
+            return self._instances[name]
+
+    def pick(self, case_name: str, content: str) -> Splitter:
+        return self.get(self.backend_name(case_name, content))
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+统一的文件存储层：所有脚本对 case 产物与汇总输出的读写都经由本模块。
+- 透明压缩：读取 foo.json 时依次查找 foo.json / foo.json.gz / foo.json.zst，按后缀流式解压
+- 写出压缩：codec=None 时取环境变量 STORAGE_CODEC（none|gz|zst，默认 none）；
+  open_write 边写边压缩到临时文件，关闭时替换目标文件后才删除同名的其他变体，
+  中途失败不会丢失原有文件，也不会读到过期文件
+- zstd 需要安装 zstandard；可选共享字典（环境变量 STORAGE_ZSTD_DICT 指向字典文件），
+  语料中大量重复的中文文本配合字典压缩率明显更高
+- case 打包：caseN/<name> 不存在时回退读取 caseN.bundle 中的同名成员（见 case_bundle.py），
+  散文件优先；iter_case_dirs 同时列出 case 目录与 bundle
+
+命令行：
+    python storage.py train-dict --root ./ --out corpus.zdict      # 用语料训练 zstd 共享字典
+    python storage.py convert --root ./ --codec zst                # 将 case 产物与汇总输出转为指定压缩格式
+"""
+
+import argparse
+import gzip
+import io
+import os
+import re
+import shutil
+from pathlib import Path
+from collections import OrderedDict
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+PathLike = Union[str, Path]
+
+CODEC_SUFFIXES = {"none": "", "gz": ".gz", "zst": ".zst"}
+# 读取时的查找顺序：未压缩优先
+_READ_ORDER = ("none", "gz", "zst")
+
+CASE_DIR_RE = re.compile(r"^case\d+$")
+# convert / train-dict 处理的文件
+CASE_ARTIFACTS = ("full_content.md", "marked_content.md", "outline.md", "user_intent.md", "meta.json",
+                  "section_content.json", "split_sentence.json", "split_clause.json", "split_snippet.json")
+OUTPUT_GLOB = "all_cases_io_*.json"
+BUNDLE_SUFFIX = ".bundle"
+
+_COPY_CHUNK = 1 << 20
+_zstd_dict = None
+_MAX_OPEN_BUNDLES = 8
+_open_bundles: "OrderedDict[Path, Tuple[float, object]]" = OrderedDict()
+
+
+def _default_codec() -> str:
+    codec = os.environ.get("STORAGE_CODEC", "none").strip().lower() or "none"
+    if codec not in CODEC_SUFFIXES:
+        print(f"[WARN] 未知的 STORAGE_CODEC={codec}，按 none 处理")
+        return "none"
+    return codec
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("zst 压缩需要安装 zstandard")
+
+
+def _load_zstd_dict():
+    global _zstd_dict
+    path = os.environ.get("STORAGE_ZSTD_DICT")
+    if _zstd_dict is None and path:
+        _zstd_dict = zstandard.ZstdCompressionDict(Path(path).read_bytes())
+    return _zstd_dict
+
+
+def _codec_of(path: Path) -> str:
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if suffix and path.name.endswith(suffix):
+            return codec
+    return "none"
+
+
+def logical_path(path: Path) -> Path:
+    """去掉压缩后缀后的逻辑路径，如 foo.json.gz -> foo.json。"""
+    suffix = CODEC_SUFFIXES[_codec_of(path)]
+    return Path(str(path)[:-len(suffix)]) if suffix else path
+
+
+def _variants(path: Path) -> List[Path]:
+    return [Path(f"{path}{CODEC_SUFFIXES[c]}") for c in _READ_ORDER]
+
+
+# ========= 路径解析 =========
+def resolve(path: PathLike) -> Optional[Path]:
+    """返回实际存在的文件（原名或其 .gz / .zst 变体），都不存在时返回 None。"""
+    path = Path(path)
+    if _codec_of(path) != "none":
+        return path if path.is_file() else None
+    for p in _variants(path):
+        if p.is_file():
+            return p
+    return None
+
+
+def exists(path: PathLike) -> bool:
+    return resolve(path) is not None or _bundle_member(Path(path)) is not None
+
+
+def stat(path: PathLike) -> Optional[Tuple[float, int]]:
+    """返回 (mtime, size)；包内成员取 bundle 的 mtime 与成员长度。不存在时返回 None。"""
+    real = resolve(path)
+    if real is not None:
+        st = real.stat()
+        return st.st_mtime, st.st_size
+    found = _bundle_member(Path(path))
+    if found is None:
+        return None
+    bundle, name = found
+    return bundle.path.stat().st_mtime, bundle.members[name][1]
+
+
+# ========= case 打包（bundle） =========
+def bundle_path(case_dir: PathLike) -> Path:
+    case_dir = Path(case_dir)
+    return case_dir.with_name(case_dir.name + BUNDLE_SUFFIX)
+
+
+def is_case_dir(path: PathLike) -> bool:
+    """case 目录存在，或存在对应的 caseN.bundle。"""
+    path = Path(path)
+    return path.is_dir() or bundle_path(path).is_file()
+
+
+def iter_case_dirs(root: PathLike) -> List[Path]:
+    """列出 root 下的 case 候选（目录或 bundle，统一返回目录形式的逻辑路径），按路径排序。"""
+    root = Path(root)
+    found = set()
+    for p in root.iterdir():
+        if p.is_dir():
+            found.add(p)
+        elif p.name.endswith(BUNDLE_SUFFIX) and p.is_file():
+            found.add(p.with_name(p.name[:-len(BUNDLE_SUFFIX)]))
+    return sorted(found)
+
+
+def _open_bundle(case_dir: Path):
+    """打开（并缓存）case 对应的 bundle；bundle 被重写后自动重新打开。"""
+    path = bundle_path(case_dir)
+    try:
+        st_mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    cached = _open_bundles.get(path)
+    if cached is not None and cached[0] == st_mtime:
+        _open_bundles.move_to_end(path)
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+
+    from case_bundle import CaseBundle  # 延迟导入，避免循环依赖
+    bundle = CaseBundle(path)
+    _open_bundles[path] = (st_mtime, bundle)
+    while len(_open_bundles) > _MAX_OPEN_BUNDLES:
+        _, (_, old) = _open_bundles.popitem(last=False)
+        old.close()
+    return bundle
+
+
+def _bundle_member(path: Path):
+    name = logical_path(path).name
+    bundle = _open_bundle(path.parent)
+    if bundle is None or name not in bundle:
+        return None
+    return bundle, name
+
+
+def list_bundle_members(case_dir: PathLike) -> List[str]:
+    bundle = _open_bundle(Path(case_dir))
+    return bundle.names() if bundle is not None else []
+
+
+def close_bundles() -> None:
+    """关闭所有缓存的 bundle 句柄（重写 bundle 前调用）。"""
+    while _open_bundles:
+        _, (_, bundle) = _open_bundles.popitem()
+        bundle.close()
+
+
+# ========= 读取 =========
+def open_read(path: PathLike) -> BinaryIO:
+    """以二进制流打开文件，按实际变体流式解压；散文件不存在时回退到 bundle 成员。"""
+    real = resolve(path)
+    if real is None:
+        found = _bundle_member(Path(path))
+        if found is None:
+            raise FileNotFoundError(str(path))
+        bundle, name = found
+        return io.BytesIO(bundle.read(name))
+    codec = _codec_of(real)
+    if codec == "gz":
+        return gzip.open(real, "rb")
+    if codec == "zst":
+        _require_zstd()
+        dctx = zstandard.ZstdDecompressor(dict_data=_load_zstd_dict())
+        return dctx.stream_reader(open(real, "rb"), closefd=True)
+    return open(real, "rb")
+
+
+def read_bytes(path: PathLike) -> bytes:
+    with open_read(path) as f:
+        return f.read()
+
+
+def read_text(path: PathLike, encoding: str = "utf-8") -> str:
+    return read_bytes(path).decode(encoding)
+
+
+# ========= 写出 =========
+def _target_path(path: Path, codec: Optional[str]) -> Path:
+    if _codec_of(path) != "none":
+        # 显式带压缩后缀时以后缀为准
+        return path
+    codec = codec or _default_codec()
+    return Path(f"{path}{CODEC_SUFFIXES[codec]}")
+
+
+def _remove_stale_variants(path: Path, keep: Path) -> None:
+    for p in _variants(logical_path(path)):
+        if p != keep and p.is_file():
+            p.unlink()
+
+
+class _AtomicWriter:
+    """
+    open_write 返回的写入流：数据（按需压缩后）先写入同目录的临时文件，
+    正常关闭时替换目标文件并删除其他变体；在 with 块中抛出异常时丢弃临时文件，原文件保持不变。
+    """
+
+    def __init__(self, path: Path, target: Path):
+        codec = _codec_of(target)
+        if codec == "zst":
+            _require_zstd()
+        self.path = path
+        self.target = target
+        self.closed = False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = Path(f"{target}.tmp")
+        self._raw = open(self._tmp, "wb")
+        if codec == "gz":
+            self._stream = gzip.GzipFile(filename="", mode="wb", fileobj=self._raw, mtime=0)
+        elif codec == "zst":
+            cctx = zstandard.ZstdCompressor(level=10, dict_data=_load_zstd_dict())
+            self._stream = cctx.stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def write(self, data: bytes) -> int:
+        return self._stream.write(data)
+
+    def close(self) -> None:
+        self._finish(commit=True)
+
+    def abort(self) -> None:
+        self._finish(commit=False)
+
+    def _finish(self, commit: bool) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._stream is not self._raw:
+                self._stream.close()
+            self._raw.close()
+        except BaseException:
+            self._tmp.unlink(missing_ok=True)
+            raise
+        if not commit:
+            self._tmp.unlink(missing_ok=True)
+            return
+        os.replace(self._tmp, self.target)
+        _remove_stale_variants(self.path, keep=self.target)
+
+    def __enter__(self) -> "_AtomicWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._finish(commit=exc_type is None)
+
+
+def open_write(path: PathLike, codec: Optional[str] = None) -> _AtomicWriter:
+    """
+    以二进制流打开待写文件，按 codec 流式压缩，应在 with 块中使用。
+    path 本身带 .gz / .zst 后缀时以后缀为准。关闭后才替换目标文件，写入中途失败不影响原文件。
+    """
+    path = Path(path)
+    return _AtomicWriter(path, _target_path(path, codec))
+
+
+def write_bytes(path: PathLike, data: bytes, codec: Optional[str] = None) -> None:
+    """整体写出（经由 open_write，同样是先写临时文件再替换）。"""
+    with open_write(path, codec) as f:
+        f.write(data)
+
+
+def write_text(path: PathLike, text: str, codec: Optional[str] = None, encoding: str = "utf-8") -> None:
+    write_bytes(path, text.encode(encoding), codec)
+
+
+# ========= 批量工具 =========
+def iter_artifacts(root: Path) -> Iterator[Path]:
+    """遍历 root 下所有 case 产物与汇总输出（返回逻辑路径，不带压缩后缀）。"""
+    for case_dir in (p for p in iter_case_dirs(root) if CASE_DIR_RE.match(p.name)):
+        for name in CASE_ARTIFACTS:
+            if exists(case_dir / name):
+                yield case_dir / name
+    seen = set()
+    for p in sorted(root.glob(OUTPUT_GLOB + "*")):
+        logical = logical_path(p)
+        if logical not in seen:
+            seen.add(logical)
+            yield logical
+
+
+def convert(root: Path, codec: str) -> None:
+    """将 root 下的 case 产物与汇总输出重新写为指定压缩格式。"""
+    for logical in iter_artifacts(root):
+        real = resolve(logical)
+        if real is None or _codec_of(real) == codec:
+            continue
+        with open_read(logical) as src, open_write(logical, codec) as dst:
+            shutil.copyfileobj(src, dst, _COPY_CHUNK)
+        print(f"[OK] {real.name} -> {_target_path(logical, codec).name}")
+
+
+def train_dictionary(root: Path, out_path: Path, dict_size: int = 112640) -> None:
+    """用 root 下所有 case 产物训练 zstd 共享字典。"""
+    _require_zstd()
+    samples = [read_bytes(p) for p in iter_artifacts(root) if not p.name.startswith("all_cases_io_")]
+    if not samples:
+        raise RuntimeError(f"未在 {root} 下找到可用于训练字典的文件")
+    zdict = zstandard.train_dictionary(dict_size, samples)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_bytes(zdict.as_bytes())
+    print(f"[OK] 字典已写出：{out_path}（{len(samples)} 个样本文件，{len(zdict.as_bytes())} 字节）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="case 产物的压缩存储工具")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_train = sub.add_parser("train-dict", help="用语料训练 zstd 共享字典")
+    p_train.add_argument("--root", default="./", help="数据集根目录")
+    p_train.add_argument("--out", default="corpus.zdict", help="字典输出路径（默认：corpus.zdict）")
+    p_train.add_argument("--size", type=int, default=112640, help="字典大小（字节，默认：112640）")
+
+    p_conv = sub.add_parser("convert", help="将 case 产物与汇总输出转为指定压缩格式")
+    p_conv.add_argument("--root", default="./", help="数据集根目录")
+    p_conv.add_argument("--codec", choices=sorted(CODEC_SUFFIXES), required=True, help="目标压缩格式")
+
+    args = parser.parse_args()
+    root = Path(args.root).expanduser().resolve()
+    if args.cmd == "train-dict":
+        train_dictionary(root, Path(args.out), args.size)
+    else:
+        convert(root, args.codec)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+<tag>…</tag> 标注的一次性线性扫描与 span 索引：
+- scan_tags：单次线性扫描文本，提取全部 tag span（标记位置 + 去标记后的纯文本偏移）
+  未闭合的 <tag> 在所在行末（或下一个标记处）截断，并标记 closed=False
+- build_case_index：将 marked_content.md 中的 span 对齐到 full_content.md 的字符偏移，
+  并归属到 full_content.md 的章节，写为紧凑的列式表 tag_spans.json
+- TagSpanIndex：按 full_content.md 偏移做区间查询（二分），供按 tag 条件生成样本时直接查表
+
+marked_content.md 与 full_content.md 并非逐字一致（存在空白与少量文字差异），
+对齐时忽略空白后做序列匹配（difflib，非线性，见 _Aligner）；落在不一致区域的端点就近吸附到相邻的已匹配位置。
+
+用法：
+    python tag_spans.py --root ./          # 为每个含 marked_content.md 的 case 生成 tag_spans.json
+"""
+
+import argparse
+import bisect
+import difflib
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import json_io
+import storage
+
+OPEN_TAG = "<tag>"
+CLOSE_TAG = "</tag>"
+INDEX_NAME = "tag_spans.json"
+INDEX_VERSION = 1
+
+CASE_DIR_RE = re.compile(r"^case\d+$")
+
+
+class TagSpan(NamedTuple):
+    open_pos: int      # "<tag>" 在原文中的位置
+    inner_start: int   # 标注内容起点（原文偏移）
+    inner_end: int     # 标注内容终点（原文偏移，不含 "</tag>"）
+    plain_start: int   # 去掉所有标记后的纯文本偏移
+    plain_end: int
+    closed: bool
+
+
+def scan_tags(text: str) -> Tuple[str, List[TagSpan]]:
+    """
+    单次线性扫描 text，返回 (去标记后的纯文本, span 列表)。
+    span 按出现顺序排列且互不重叠；未闭合的 <tag>（遇到下一个 <tag> 或文末仍未闭合）
+    截断到其所在行末。
+    """
+    spans: List[TagSpan] = []
+    pieces: List[str] = []
+    plain_len = 0
+    pos = 0
+    open_at: Optional[Tuple[int, int, int]] = None   # (open_pos, inner_start, plain_start)
+    n = len(text)
+
+    def close(inner_end: int, closed: bool):
+        o, s, ps = open_at
+        if not closed:
+            nl = text.find("\n", s, inner_end)
+            inner_end = inner_end if nl == -1 else nl
+        spans.append(TagSpan(o, s, inner_end, ps, ps + (inner_end - s), closed))
+
+    while pos < n:
+        nxt = text.find("<", pos)
+        if nxt == -1:
+            nxt = n
+        pieces.append(text[pos:nxt])
+        plain_len += nxt - pos
+        if nxt >= n:
+            break
+        if text.startswith(OPEN_TAG, nxt):
+            if open_at is not None:
+                close(nxt, False)
+            open_at = (nxt, nxt + len(OPEN_TAG), plain_len)
+            pos = nxt + len(OPEN_TAG)
+        elif text.startswith(CLOSE_TAG, nxt):
+            if open_at is not None:
+                close(nxt, True)
+                open_at = None
+            pos = nxt + len(CLOSE_TAG)
+        else:
+            pieces.append("<")
+            plain_len += 1
+            pos = nxt + 1
+
+    if open_at is not None:
+        close(n, False)
+    return "".join(pieces), spans
+
+
+# ========= 对齐到 full_content.md =========
+def _squeeze(text: str) -> Tuple[str, List[int]]:
+    """去掉空白，返回 (压缩串, 压缩串每个字符在原串中的位置)。"""
+    keep = [i for i, ch in enumerate(text) if not ch.isspace()]
+    return "".join(text[i] for i in keep), keep
+
+
+class _Aligner:
+    """
+    把纯文本（marked 去标记后）的偏移映射到 full_content 的偏移。
+    匹配用 difflib.SequenceMatcher：两份文本基本一致时接近线性，差异很多时最坏为平方级，
+    每个 case 只在建索引时对齐一次；单个端点的映射为二分查找。
+    """
+
+    def __init__(self, plain: str, full: str):
+        self.plain_sq, self.plain_pos = _squeeze(plain)
+        self.full_sq, self.full_pos = _squeeze(full)
+        self.full_len = len(full)
+        matcher = difflib.SequenceMatcher(None, self.plain_sq, self.full_sq, autojunk=False)
+        self.blocks = [b for b in matcher.get_matching_blocks() if b.size]
+        self.block_starts = [b.a for b in self.blocks]
+        matched = sum(b.size for b in self.blocks)
+        self.coverage = matched / len(self.plain_sq) if self.plain_sq else 1.0
+
+    def _sq_index(self, plain_offset: int) -> int:
+        # 纯文本偏移 -> 压缩串下标（指向 plain_offset 之后的第一个非空白字符）
+        return bisect.bisect_left(self.plain_pos, plain_offset)
+
+    def map(self, plain_offset: int, is_end: bool) -> int:
+        if not self.blocks:
+            return 0
+        # 终点按 span 内最后一个非空白字符映射后再 +1，避免吞入其后的空白
+        a = self._sq_index(plain_offset) - (1 if is_end else 0)
+        if a < 0:
+            return 0
+        i = bisect.bisect_right(self.block_starts, a) - 1
+        if i >= 0 and a < self.blocks[i].a + self.blocks[i].size:
+            b = self.blocks[i].b + (a - self.blocks[i].a)
+            return self.full_pos[b] + (1 if is_end else 0)
+        if is_end:
+            # 不一致区域的终点吸附到前一个已匹配块的末尾
+            if i < 0:
+                return 0
+            blk = self.blocks[i]
+            return self.full_pos[blk.b + blk.size - 1] + 1
+        # 起点吸附到后一个已匹配块的开头
+        if i + 1 >= len(self.blocks):
+            return self.full_len
+        return self.full_pos[self.blocks[i + 1].b]
+
+
+def _section_ranges(full: str) -> Tuple[List[List[str]], List[Tuple[int, int, int]]]:
+    """返回 (章节标题路径列表, [(起始偏移, 结束偏移, 章节下标)])，按起始偏移排序、内层在后。"""
+    from extract_section_content import parse_markdown_headings
+
+    lines, nodes = parse_markdown_headings(full)
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line) + 1)
+    paths: List[List[str]] = []
+    ranges: List[Tuple[int, int, int]] = []
+    for node in nodes:
+        start = line_starts[min(node.start_idx, len(lines))]
+        end = line_starts[min(node.end_idx if node.end_idx is not None else len(lines), len(lines))]
+        ranges.append((start, end, len(paths)))
+        paths.append(node.path_titles())
+    return paths, ranges
+
+
+def _section_of(offset: int, ranges: List[Tuple[int, int, int]]) -> int:
+    # 取包含 offset 的最内层章节（ranges 按起点排序，后出现的更靠内）
+    best = -1
+    for start, end, idx in ranges:
+        if start > offset:
+            break
+        if offset < end:
+            best = idx
+    return best
+
+
+def build_case_index(case_dir: Path) -> Optional[Dict]:
+    """扫描 case 的 marked_content.md，生成对齐到 full_content.md 的 span 表。"""
+    if not storage.exists(case_dir / "marked_content.md"):
+        return None
+    marked = storage.read_text(case_dir / "marked_content.md")
+    plain, spans = scan_tags(marked)
+
+    full = storage.read_text(case_dir / "full_content.md") if storage.exists(case_dir / "full_content.md") else ""
+    aligner = _Aligner(plain, full) if full else None
+    sections, ranges = _section_ranges(full) if full else ([], [])
+
+    cols: Dict[str, List] = {k: [] for k in ("marked_start", "marked_end", "plain_start", "plain_end",
+                                             "full_start", "full_end", "section", "closed")}
+    for sp in spans:
+        cols["marked_start"].append(sp.inner_start)
+        cols["marked_end"].append(sp.inner_end)
+        cols["plain_start"].append(sp.plain_start)
+        cols["plain_end"].append(sp.plain_end)
+        if aligner is not None:
+            fs = aligner.map(sp.plain_start, is_end=False)
+            fe = max(fs, aligner.map(sp.plain_end, is_end=True))
+        else:
+            fs = fe = -1
+        cols["full_start"].append(fs)
+        cols["full_end"].append(fe)
+        cols["section"].append(_section_of(fs, ranges) if fs >= 0 else -1)
+        cols["closed"].append(1 if sp.closed else 0)
+
+    return {
+        "version": INDEX_VERSION,
+        "count": len(spans),
+        "coverage": round(aligner.coverage, 4) if aligner is not None else 0.0,
+        "sections": sections,
+        "columns": cols,
+    }
+
+
+class TagSpanIndex:
+    """tag_spans.json 的查询视图：按 full_content.md 偏移做区间查找。"""
+
+    def __init__(self, table: Dict):
+        cols = table["columns"]
+        self.sections: List[List[str]] = table.get("sections", [])
+        self.starts: List[int] = cols["full_start"]
+        self.ends: List[int] = cols["full_end"]
+        self.section_ids: List[int] = cols["section"]
+
+    @classmethod
+    def load(cls, case_dir: Path) -> Optional["TagSpanIndex"]:
+        path = case_dir / INDEX_NAME
+        if not storage.exists(path):
+            return None
+        return cls(json_io.load_file(path))
+
+    def overlapping(self, start: int, end: int) -> List[int]:
+        """与 [start, end) 有交集的 span 下标（span 按起点有序且互不重叠）。"""
+        hi = bisect.bisect_left(self.starts, end)
+        lo = max(0, bisect.bisect_right(self.starts, start) - 1)
+        return [i for i in range(lo, hi) if self.ends[i] > start and self.starts[i] >= 0]
+
+    def relative_spans(self, start: int, end: int) -> List[List[int]]:
+        """与 [start, end) 相交的 span，转换为相对 start 的 [起, 止)（裁剪到区间内）。"""
+        return [[max(self.starts[i], start) - start, min(self.ends[i], end) - start]
+                for i in self.overlapping(start, end)]
+
+
+def process_root(root: Path) -> None:
+    for case_dir in storage.iter_case_dirs(root):
+        if not CASE_DIR_RE.match(case_dir.name):
+            continue
+        table = build_case_index(case_dir)
+        if table is None:
+            continue
+        json_io.dump_file(table, case_dir / INDEX_NAME, compact=True)
+        print(f"[OK] {case_dir.name}: {table['count']} 个 tag span，对齐覆盖率 {table['coverage']:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="扫描 marked_content.md 中的 <tag> 标注并生成 tag_spans.json")
+    parser.add_argument("--root", default="./", help="数据集根目录")
+    args = parser.parse_args()
+    process_root(Path(args.root).expanduser().resolve())
+
+
+if __name__ == "__main__":
+    main()
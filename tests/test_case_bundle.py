@@ -0,0 +1,53 @@
+import shutil
+from pathlib import Path
+
+import case_bundle
+import storage
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def _snapshot(case_dir: Path):
+    return {p.name: p.read_bytes() for p in case_dir.iterdir() if p.is_file()}
+
+
+def test_pack_unpack_round_trip(tmp_path):
+    case_dir = tmp_path / "case0"
+    shutil.copytree(REPO / "case0", case_dir)
+    before = _snapshot(case_dir)
+
+    case_bundle.process_root(tmp_path, "pack", remove=True)
+    assert not case_dir.exists()
+    assert (tmp_path / "case0.bundle").is_file()
+    # storage 层透明读取包内成员
+    assert storage.read_bytes(case_dir / "outline.md") == before["outline.md"]
+
+    storage.close_bundles()
+    case_bundle.process_root(tmp_path, "unpack", remove=True)
+    assert not (tmp_path / "case0.bundle").exists()
+    assert _snapshot(case_dir) == before
+
+
+def test_non_case_dirs_are_left_alone(tmp_path):
+    for name in (".git", "notes", "__pycache__", "case1x"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "keep.txt").write_text("x")
+    (tmp_path / "case3").mkdir()
+    (tmp_path / "case3" / "outline.md").write_text("# t")
+
+    case_bundle.process_root(tmp_path, "pack", remove=True)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".git", "__pycache__", "case1x", "case3.bundle", "notes"]
+    for name in (".git", "notes", "__pycache__", "case1x"):
+        assert (tmp_path / name / "keep.txt").read_text() == "x"
+
+
+def test_remove_keeps_unpacked_subdirectories(tmp_path):
+    case_dir = tmp_path / "case2"
+    (case_dir / "images").mkdir(parents=True)
+    (case_dir / "images" / "fig.png").write_bytes(b"png")
+    (case_dir / "outline.md").write_text("# t")
+
+    case_bundle.process_root(tmp_path, "pack", remove=True)
+    assert (case_dir / "images" / "fig.png").read_bytes() == b"png"
+    assert not (case_dir / "outline.md").exists()
+    assert storage.read_text(case_dir / "outline.md") == "# t"
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from columnar_io import ALL_FIELDS, export_columnar, read_columns
+
+
+def _samples(n):
+    return [{"user_intent": "写综述", "outline": "# 大纲", "file": f"case{i % 2}", "context": "上文" * i,
+             "hint": "", "output": f"输出{i}。", "ratio": 0.3 * (i % 2)} for i in range(n)]
+
+
+@pytest.mark.parametrize("n", [0, 1, 5])
+def test_npy_round_trip(tmp_path, n):
+    path = export_columnar(_samples(n), tmp_path / "all_cases_io_demo.json", fmt="npy")
+    cols = read_columns(path)
+    assert set(cols) == set(ALL_FIELDS) - {"tag_spans"}
+    for name in cols:
+        assert cols[name] == [s[name] for s in _samples(n)]
+
+
+def test_npy_filters(tmp_path):
+    path = export_columnar(_samples(6), tmp_path / "demo.cols", fmt="npy")
+    cols = read_columns(path, columns=["output"], filters={"file": "case1"})
+    assert cols["output"] == ["输出1。", "输出3。", "输出5。"]
+
+
+def test_unknown_fields_are_rejected(tmp_path):
+    samples = _samples(2)
+    samples[1]["extra"] = "x"
+    with pytest.raises(ValueError, match="extra"):
+        export_columnar(samples, tmp_path / "demo.cols", fmt="npy")
+
+
+def _tagged(n):
+    samples = _samples(n)
+    for i, s in enumerate(samples):
+        s["tag_spans"] = [[j, j + 2] for j in range(i % 3)]
+    return samples
+
+
+@pytest.mark.parametrize("n", [1, 5])
+def test_npy_tag_spans_round_trip(tmp_path, n):
+    path = export_columnar(_tagged(n), tmp_path / "all_cases_io_snippet.json", fmt="npy")
+    assert read_columns(path, columns=["tag_spans"])["tag_spans"] == [s["tag_spans"] for s in _tagged(n)]
+
+
+def test_tag_spans_column_only_when_present(tmp_path):
+    assert "tag_spans" not in read_columns(export_columnar(_samples(3), tmp_path / "a.cols", fmt="npy"))
+    assert "tag_spans" in read_columns(export_columnar(_tagged(3), tmp_path / "b.cols", fmt="npy"))
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_arrow_tag_spans_round_trip(tmp_path, fmt):
+    pytest.importorskip("pyarrow")
+    path = export_columnar(_tagged(5), tmp_path / "all_cases_io_snippet.json", fmt=fmt)
+    cols = read_columns(path, filters={"file": "case1"})
+    assert cols["tag_spans"] == [s["tag_spans"] for s in _tagged(5) if s["file"] == "case1"]
+    assert cols["output"] == ["输出1。", "输出3。"]
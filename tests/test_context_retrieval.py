@@ -0,0 +1,98 @@
+import random
+from pathlib import Path
+
+import pytest
+
+import build_io_data
+import storage
+from context_retrieval import GAP_MARK, IncrementalBM25, RetrievalConfig, RetrievalContext, tokenize
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def _doc():
+    return storage.read_text(REPO / "case0" / "full_content.md")
+
+
+def _state(ctx):
+    return ctx.passages, ctx.headings, ctx.current, ctx.consumed, ctx.build()
+
+
+def test_tokenize():
+    assert tokenize("蛋白印迹 Western-Blot 2x") == ["蛋白", "白印", "印迹", "western", "blot", "2x"]
+    assert tokenize("膜") == ["膜"]
+
+
+def test_bm25_incremental_matches_batch():
+    passages = ["蛋白质样品经电泳分离", "转膜缓冲液的配制", "一抗与二抗的孵育", "电泳分离后转膜"]
+    incremental = IncrementalBM25()
+    for i, p in enumerate(passages):
+        incremental.add(p)
+        batch = IncrementalBM25()
+        for q in passages[:i + 1]:
+            batch.add(q)
+        assert incremental.search("电泳 转膜", 3) == batch.search("电泳 转膜", 3)
+    hits = [doc_id for doc_id, _ in incremental.search("电泳分离", 2)]
+    assert set(hits) == {0, 3}
+    assert incremental.search("不存在的词", 3) == []
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_advance_in_pieces_matches_from_scratch(seed):
+    doc = _doc()
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(doc)), 40))
+    ctx = RetrievalContext(max_chars=600)
+    prev = 0
+    for cut in cuts:
+        ctx.advance(doc[prev:cut])
+        prev = cut
+        fresh = RetrievalContext(max_chars=600)
+        fresh.advance(doc[:cut])
+        assert _state(ctx) == _state(fresh)
+
+
+def test_seek_backwards_and_forwards():
+    doc = _doc()
+    ctx = RetrievalContext(max_chars=600)
+    for offset in (len(doc) // 2, len(doc) // 5, len(doc) - 10, 0, len(doc) // 3):
+        ctx.seek(doc, offset)
+        fresh = RetrievalContext(max_chars=600)
+        fresh.advance(doc[:offset])
+        assert _state(ctx) == _state(fresh)
+
+
+def test_build_caps_length_and_keeps_current_section():
+    doc = "# 总标题\n\n## 第一章\n\n" + "电泳分离蛋白质。" * 40 + "\n\n## 第二章\n\n转膜之前先电泳分离。\n"
+    ctx = RetrievalContext(top_k=2, max_chars=200, passage_chars=60)
+    ctx.advance(doc)
+    built = ctx.build()
+    assert len(built) <= 200
+    # 当前章节完整保留在末尾，上级标题紧挨在前；剩余额度放入检索到的历史段落
+    assert built.endswith("# 总标题\n## 第二章\n\n转膜之前先电泳分离。\n")
+    assert GAP_MARK in built and "电泳分离蛋白质。" in built
+
+    # 当前章节本身超出上限时只保留其末尾，不再附加检索段落
+    ctx.advance("很长的当前章节。" * 50)
+    built = ctx.build()
+    assert len(built) == 200
+    assert built.endswith("很长的当前章节。") and GAP_MARK not in built
+
+
+def test_process_one_file_retrieval_mode():
+    fp = REPO / "case0" / "split_sentence.json"
+    cfg = RetrievalConfig(top_k=2, max_chars=300)
+    full_rows = build_io_data.process_one_file(fp, "case0", [0.0, 0.5])
+    rows = build_io_data.process_one_file(fp, "case0", [0.0, 0.5], context_mode="retrieval", retrieval_cfg=cfg)
+
+    assert [(r["output"], r["hint"], r["ratio"]) for r in rows] == \
+        [(r["output"], r["hint"], r["ratio"]) for r in full_rows]
+    assert all(len(r["context"]) <= cfg.max_chars for r in rows)
+    # 前文较短时 context 就是完整前文的末尾部分；后面的样本 context 不再随位置增长
+    assert any(len(f["context"]) > cfg.max_chars for f in full_rows)
+    for r, f in zip(rows, full_rows):
+        tail = r["context"].split(GAP_MARK)[-1].split("\n")[-1]
+        assert f["context"].endswith(tail)
+
+    with pytest.raises(ValueError):
+        build_io_data.process_one_file(fp, "case0", [0.0], context_mode="nearest")
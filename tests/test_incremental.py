@@ -0,0 +1,69 @@
+import random
+import shutil
+from pathlib import Path
+
+import pytest
+
+import case_bundle
+import incremental
+import storage
+from splitters import create_splitter
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def _edit(text, rng):
+    lines = text.splitlines(keepends=True)
+    for _ in range(rng.randint(1, 3)):
+        i = rng.randrange(len(lines))
+        op = rng.choice(["insert", "delete", "modify"])
+        if op == "insert":
+            lines.insert(i, rng.choice(["新增的一句话。\n", "新增一行，没有句号\n", "\n"]))
+        elif op == "delete" and len(lines) > 1:
+            del lines[i]
+        else:
+            line = lines[i]
+            cut = rng.randint(0, len(line))
+            lines[i] = line[:cut] + rng.choice(["改动", "。插入句子。", "，"]) + line[cut:]
+    return "".join(lines)
+
+
+@pytest.mark.parametrize("level", ["sentence", "clause"])
+@pytest.mark.parametrize("seed", range(8))
+def test_diff_resplit_matches_full_split(level, seed):
+    rng = random.Random(seed)
+    splitter = create_splitter(level)
+    old = incremental._rule_text(storage.read_text(REPO / "case0" / "full_content.md"))
+    new = incremental._rule_text(_edit(old, rng))
+
+    res = incremental.diff_resplit(old, new, splitter.split(old), splitter.split)
+    assert res.fragments == splitter.split(new)
+    assert res.reused > 0
+
+
+def test_unchanged_text_reuses_everything():
+    splitter = create_splitter("sentence")
+    text = incremental._rule_text(storage.read_text(REPO / "case0" / "full_content.md"))
+    fragments = splitter.split(text)
+    res = incremental.diff_resplit(text, text, fragments, splitter.split)
+    assert res.fragments == fragments
+    assert res.regions == 0 and res.reused == len(fragments)
+
+
+def test_snapshots_live_outside_case_dirs(tmp_path):
+    case_dir = tmp_path / "case0"
+    shutil.copytree(REPO / "case0", case_dir)
+    before = sorted(p.name for p in case_dir.iterdir())
+
+    incremental.resplit_rule_case(case_dir)
+    snap = tmp_path / incremental.SNAPSHOT_DIR / "case0" / incremental.RULE_SOURCE
+    assert storage.read_text(snap) == storage.read_text(case_dir / incremental.RULE_SOURCE)
+    assert sorted(p.name for p in case_dir.iterdir()) == before
+
+    # 快照不随 case 打包，.snapshots 本身也不是 case 目录
+    case_bundle.process_root(tmp_path, "pack", remove=True)
+    assert sorted(storage.list_bundle_members(case_dir)) == before
+    assert storage.read_text(snap) == storage.read_text(case_dir / incremental.RULE_SOURCE)
+    assert not (tmp_path / (incremental.SNAPSHOT_DIR + storage.BUNDLE_SUFFIX)).exists()
+    storage.close_bundles()
+
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import json_io
+
+OBJECTS = [
+    {"title": "标题", "tag": "", "content": "第一句。\n第二句。", "children": [{"title": "子节", "children": []}]},
+    ["片段一。", "片段二，\"引号\"\t制表符", ""],
+    [{"context": "上文", "hint": "提示", "output": "输出", "ratio": 0.3}],
+    [],
+    {},
+]
+
+BACKENDS = ["json"] + [name for name, mod in (("orjson", json_io.orjson), ("msgspec", json_io.msgspec)) if mod]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    monkeypatch.setattr(json_io, "BACKEND", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("obj", OBJECTS)
+def test_pretty_output_matches_stdlib(backend, obj):
+    expected = json.dumps(obj, ensure_ascii=False, indent=2)
+    assert json_io.dumps(obj, compact=False) == expected
+    assert json_io.loads(json_io.dumps_bytes(obj, compact=False)) == obj
+
+
+@pytest.mark.parametrize("obj", OBJECTS)
+def test_compact_output_matches_stdlib(backend, obj):
+    expected = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    assert json_io.dumps(obj, compact=True) == expected
+    assert json_io.loads(json_io.dumps(obj, compact=True)) == obj
+
+
+def test_compact_from_environment(backend, monkeypatch):
+    monkeypatch.setenv("JSON_COMPACT", "1")
+    assert json_io.dumps([1, {"a": "中"}]) == '[1,{"a":"中"}]'
+
+
+def test_decode_error_is_stdlib_type(backend):
+    with pytest.raises(json_io.JSONDecodeError):
+        json_io.loads(b'["unterminated')
+
+
+def test_file_round_trip(backend, tmp_path):
+    path = tmp_path / "section_content.json"
+    json_io.dump_file(OBJECTS[0], path)
+    assert path.read_text(encoding="utf-8") == json.dumps(OBJECTS[0], ensure_ascii=False, indent=2)
+    assert json_io.load_file(path) == OBJECTS[0]
@@ -0,0 +1,169 @@
+import threading
+import time
+
+import pytest
+
+import retry_control
+from retry_control import AIMDLimiter, CircuitBreaker, CircuitOpenError, RetryController
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("R", (), {"headers": headers or {}})()
+
+
+class APITimeoutError(Exception):
+    pass
+
+
+def _fail(controller, exc):
+    with pytest.raises(type(exc)):
+        with controller.call():
+            raise exc
+
+
+def test_classify():
+    assert retry_control.classify(_StatusError(429)) == retry_control.RATE_LIMIT
+    assert retry_control.classify(_StatusError(400)) == retry_control.CLIENT_ERROR
+    assert retry_control.classify(_StatusError(408)) == retry_control.SERVER_ERROR
+    assert retry_control.classify(_StatusError(503)) == retry_control.SERVER_ERROR
+    assert retry_control.classify(APITimeoutError()) == retry_control.SERVER_ERROR
+    assert retry_control.classify(ConnectionResetError()) == retry_control.SERVER_ERROR
+    assert retry_control.classify(ValueError()) == retry_control.OTHER
+    assert not retry_control.is_retryable(_StatusError(401))
+    assert retry_control.is_retryable(_StatusError(500))
+
+
+def test_retry_after_of():
+    assert retry_control.retry_after_of(_StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_control.retry_after_of(_StatusError(429, {"Retry-After": "3"})) == 3.0
+    assert retry_control.retry_after_of(_StatusError(429)) is None
+    assert retry_control.retry_after_of(ValueError()) is None
+
+
+def test_backoff_bounds():
+    controller = RetryController(base_sleep=1.0, max_sleep=5.0, seed=0)
+    for attempt in range(1, 8):
+        cap = min(5.0, 2 ** (attempt - 1))
+        assert cap / 2 <= controller.backoff(attempt) <= cap
+    assert 4.0 <= controller.backoff(1, retry_after=4.0) <= 4.5
+
+
+def test_aimd_increase_and_halving():
+    limiter = AIMDLimiter(initial=4, maximum=6, cooldown=60.0)
+    for _ in range(4):
+        limiter.on_success()
+    assert limiter.limit == pytest.approx(5.0, abs=0.1)
+    before = limiter.limit
+    limiter.on_rate_limit()
+    halved = limiter.limit
+    assert halved == pytest.approx(before / 2)
+    # cooldown 内的后续 429 不再减半
+    limiter.on_rate_limit()
+    assert limiter.limit == halved
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 6.0
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05, max_wait=None)
+    controller = RetryController(breaker=breaker)
+    _fail(controller, _StatusError(503))
+    assert breaker.state == "closed"
+    _fail(controller, _StatusError(503))
+    assert breaker.state == "open" and breaker.trips == 1
+
+    # 冷却后只放行一个探测；探测失败重新熔断
+    assert breaker.before_call() is True
+    assert breaker.state == "half_open"
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.trips == 1
+
+    with controller.call():
+        pass
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_rate_limit_and_client_errors_do_not_trip():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10.0)
+    controller = RetryController(breaker=breaker)
+    _fail(controller, _StatusError(429))
+    _fail(controller, _StatusError(400))
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_circuit_open_error_after_max_wait():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10.0, max_wait=0.05)
+    controller = RetryController(breaker=breaker)
+    _fail(controller, _StatusError(500))
+    start = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        with controller.call():
+            pass
+    assert time.monotonic() - start < 1.0
+
+
+def test_other_exceptions_are_neutral():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10.0)
+    limiter = AIMDLimiter(initial=4)
+    controller = RetryController(limiter=limiter, breaker=breaker)
+    _fail(controller, _StatusError(503))
+    _fail(controller, ValueError("bad json"))
+    _fail(controller, ImportError("openai"))
+    # 中间的本地异常没有清零故障计数，也没有让并发上限增长
+    assert breaker.failures == 1
+    assert limiter.limit == 4 and limiter.in_flight == 0
+    _fail(controller, _StatusError(503))
+    assert breaker.state == "open"
+
+
+def test_neutral_probe_releases_probe_slot():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.01, max_wait=None)
+    controller = RetryController(breaker=breaker)
+    _fail(controller, _StatusError(500))
+    time.sleep(0.02)
+
+    def stream():
+        with controller.call():
+            yield 1
+            yield 2
+
+    gen = stream()
+    next(gen)
+    assert breaker.state == "half_open"
+    gen.close()   # GeneratorExit：探测未得出结论
+    assert breaker.state == "half_open"
+
+    entered = threading.Event()
+
+    def probe():
+        with controller.call():
+            entered.set()
+
+    t = threading.Thread(target=probe)
+    t.start()
+    t.join(timeout=1.0)
+    assert entered.is_set()
+    assert breaker.state == "closed"
+
+
+def test_abandoned_slot_is_released_once_and_not_recorded():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10.0)
+    limiter = AIMDLimiter(initial=4)
+    controller = RetryController(limiter=limiter, breaker=breaker)
+    with pytest.raises(_StatusError):
+        with controller.call() as slot:
+            assert limiter.in_flight == 1
+            slot.abandon()
+            assert limiter.in_flight == 0
+            slot.abandon()
+            raise _StatusError(503)   # 落败请求之后超时：不再计入熔断
+    assert limiter.in_flight == 0
+    assert breaker.state == "closed" and breaker.failures == 0
+
+    with controller.call() as slot:
+        slot.abandon()
+    assert limiter.in_flight == 0 and limiter.limit == 4
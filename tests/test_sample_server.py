@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+import json_io
+import sample_server
+from sample_server import SampleClient, SampleStore, make_server
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "all_cases_io_demo.json"
+    json_io.dump_file([{"file": f"case{i % 3}", "input": str(i)} for i in range(10)], path)
+    store = SampleStore()
+    store.load(path)
+    server = make_server(store, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield SampleClient(f"http://127.0.0.1:{server.server_address[1]}"), store
+    server.shutdown()
+    server.server_close()
+
+
+def test_samples_and_batch(client):
+    c, _ = client
+    assert [s["input"] for s in c.samples([0, 9])] == ["0", "9"]
+    seen = [s["input"] for i in range(4) for s in c.batch(size=3, index=i, seed=1)]
+    assert sorted(seen, key=int) == [str(i) for i in range(10)]
+
+
+@pytest.mark.parametrize("call", [
+    lambda c: c.samples([-1]),
+    lambda c: c.samples([10]),
+    lambda c: c.batch(size=0),
+    lambda c: c.batch(size=-2),
+    lambda c: c.batch(size=2, index=-1),
+    lambda c: c.range(-3, 2),
+])
+def test_invalid_requests_are_rejected(client, call):
+    c, _ = client
+    with pytest.raises(RuntimeError, match="400"):
+        call(c)
+
+
+def test_permutation_cache_is_bounded(client):
+    c, store = client
+    for epoch in range(sample_server.PERM_CACHE_SIZE * 3):
+        c.batch(size=2, epoch=epoch)
+    assert len(store._perm_cache) == sample_server.PERM_CACHE_SIZE
@@ -0,0 +1,55 @@
+from collections import Counter
+
+import pytest
+
+from sampling import BudgetedSampler, _allocate, length_bucket
+
+
+def _candidates(n_cases=20, per_case=50):
+    for c in range(n_cases):
+        for i in range(per_case):
+            yield f"case{c}", (i % 3, length_bucket(i * 7)), (c, i)
+
+
+@pytest.mark.parametrize("budget,cap", [(100, None), (None, 10), (100, 10), (1000, 3), (5, 50)])
+def test_budget_and_per_case_cap(budget, cap):
+    sampler = BudgetedSampler(budget=budget, per_case_cap=cap, seed=1)
+    for case, stratum, item in _candidates():
+        sampler.offer(case, stratum, item)
+    selected = sampler.finish()
+
+    total = 20 * 50
+    expected = min(x for x in (budget, cap * 20 if cap else None, total) if x is not None)
+    assert len(selected) == expected
+    per_case = Counter(case for case, _ in selected)
+    if cap is not None:
+        assert max(per_case.values()) <= cap
+    # 保持提交顺序
+    items = [item for _, item in selected]
+    assert items == sorted(items)
+
+
+def test_no_limits_passes_everything_through():
+    sampler = BudgetedSampler()
+    cands = list(_candidates(3, 4))
+    for case, stratum, item in cands:
+        sampler.offer(case, stratum, item)
+    assert sampler.finish() == [(case, item) for case, _, item in cands]
+
+
+def test_same_seed_is_reproducible():
+    def run(seed):
+        sampler = BudgetedSampler(budget=50, per_case_cap=5, seed=seed)
+        for case, stratum, item in _candidates():
+            sampler.offer(case, stratum, item)
+        return sampler.finish()
+
+    assert run(7) == run(7)
+    assert run(7) != run(8)
+
+
+def test_allocate_is_proportional_and_capped():
+    alloc = _allocate({"a": 90, "b": 10}, {"a": 100, "b": 100}, 10)
+    assert alloc == {"a": 9, "b": 1}
+    alloc = _allocate({"a": 90, "b": 10}, {"a": 5, "b": 100}, 10)
+    assert alloc == {"a": 5, "b": 5}
@@ -0,0 +1,145 @@
+import random
+import re
+
+import pytest
+
+import split_snippet
+
+
+def _sentences(text):
+    return [s for s in re.split(r"(?<=[。\n])", text) if s]
+
+
+def _make_doc(seed, n_paras=12):
+    rng = random.Random(seed)
+    paras = []
+    for p in range(n_paras):
+        sents = "".join(f"第{p}段第{s}句" + "内容" * rng.randint(1, 8) + "。" for s in range(rng.randint(1, 5)))
+        paras.append(sents + "\n\n")
+    return "".join(paras)
+
+
+@pytest.mark.parametrize("mode", ["fallback", "sentences", "mixed"])
+@pytest.mark.parametrize("seed", range(5))
+def test_split_long_content_round_trip(monkeypatch, mode, seed):
+    rng = random.Random(seed)
+
+    def fake_split(content, **_):
+        if mode == "fallback" or (mode == "mixed" and rng.random() < 0.5):
+            return [content]
+        return _sentences(content)
+
+    monkeypatch.setattr(split_snippet, "split_with_gpt", fake_split)
+    doc = _make_doc(seed)
+    for max_tokens in (20, 40, 80):
+        slices = split_snippet.split_long_content(doc, max_chunk_tokens=max_tokens, workers=2)
+        assert "".join(slices) == doc
+
+
+def test_chunk_content_round_trip():
+    doc = _make_doc(0, n_paras=30)
+    chunks = split_snippet._chunk_content(doc, 30)
+    assert len(chunks) > 1
+    assert "".join(chunks) == doc
+
+
+class _FakeStreamClient:
+    """按固定步长把 answer 作为 chat.completions 流式增量返回。"""
+
+    def __init__(self, answer, step=5):
+        self.answer = answer
+        self.step = step
+        self.chat = self
+        self.completions = self
+
+    def create(self, **_):
+        for i in range(0, len(self.answer), self.step):
+            delta = type("D", (), {"content": self.answer[i:i + self.step]})()
+            yield type("C", (), {"choices": [type("Ch", (), {"delta": delta})()]})()
+
+
+def test_stream_slices_come_from_source(monkeypatch):
+    import json
+
+    source = "第一段。  内容很长。\n\n第二段。还有内容。\n\n第三段。结束了。"
+    # 模型输出的空白与原文不同（丢了两个空格、段末只有一个换行）
+    answer = json.dumps(["第一段。内容很长。\n", "\n第二段。还有内容。\n\n", "第三段。结束了。"], ensure_ascii=False)
+    monkeypatch.setattr(split_snippet, "_get_client", lambda: _FakeStreamClient(answer))
+
+    slices = list(split_snippet.split_with_gpt_stream(source))
+    assert slices == ["第一段。  内容很长。\n\n", "第二段。还有内容。\n\n", "第三段。结束了。"]
+    assert "".join(slices) == source
+
+
+def test_hedged_request_takes_its_own_slot(monkeypatch):
+    import json
+    import threading
+    import time
+
+    from hedging import HedgePolicy
+    from retry_control import AIMDLimiter, RetryController
+
+    controller = RetryController(limiter=AIMDLimiter(initial=4))
+    seen = []
+    calls = []
+    lock = threading.Lock()
+
+    class _SlowClient:
+        chat = completions = None
+
+        def create(self, **_):
+            with lock:
+                calls.append(1)
+                first = len(calls) == 1
+                seen.append(controller.limiter.in_flight)
+            time.sleep(0.3 if first else 0.0)
+            message = type("M", (), {"content": json.dumps(["第一句。", "第二句。"], ensure_ascii=False)})()
+            return type("R", (), {"choices": [type("Ch", (), {"message": message})()]})()
+
+    client = _SlowClient()
+    client.chat = client.completions = client
+    monkeypatch.setattr(split_snippet, "_get_client", lambda: client)
+    hedge = HedgePolicy(max_extra=1.0, min_samples=1, min_delay=0.05)
+    hedge.latency.record(0.01)
+
+    slices = split_snippet.split_with_gpt("第一句。第二句。", hedge=hedge, retry=controller)
+    assert slices == ["第一句。", "第二句。"]
+    assert hedge.stats.hedges == 1
+    assert max(seen) == 2
+    # 对冲胜出时落败的主请求仍在途，但名额已归还
+    assert len(calls) == 2 and controller.limiter.in_flight == 0
+    hedge.shutdown()
+
+
+def test_hedges_win_against_mock_server_tail_latency(monkeypatch):
+    pytest.importorskip("openai")
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from hedging import HedgePolicy
+    from mock_llm_server import MockConfig, make_server
+    from retry_control import AIMDLimiter, RetryController
+
+    config = MockConfig(latency=0.05, tail_prob=0.2, tail_latency=1.5, seed=7)
+    server = make_server(config, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(split_snippet, "_client", None)
+
+    controller = RetryController(limiter=AIMDLimiter(initial=4, maximum=4))
+    hedge = HedgePolicy(percentile=0.5, max_extra=0.5, min_samples=5, min_delay=0.1,
+                        max_workers=2 * controller.limiter.maximum)
+    docs = [f"第{i}段。内容。\n\n第{i}段后续。又一句。" for i in range(40)]
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(
+                lambda d: split_snippet.split_with_gpt(d, hedge=hedge, retry=controller, timeout=5.0), docs))
+        assert all("".join(r) == d and len(r) > 1 for r, d in zip(results, docs))
+        assert config.stats["tail"] > 0
+        assert hedge.stats.hedge_wins > 0
+        # 落败的长尾请求可能仍在等待服务端，但已不占并发名额
+        assert controller.limiter.in_flight == 0
+    finally:
+        hedge.shutdown()
+        server.shutdown()
@@ -0,0 +1,116 @@
+import split_snippet
+from splitters import CachedLLMSplitter
+
+
+def _sentences(text):
+    return [s + "。" for s in text.split("。") if s]
+
+
+def test_cached_llm_skips_partial_results(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_split(content, report=None, **_):
+        calls.append(content)
+        if "失败" in content:
+            return split_snippet._fallback(content, report)
+        return _sentences(content)
+
+    monkeypatch.setattr(split_snippet, "split_with_gpt", fake_split)
+    doc = "".join(f"第{i}句内容内容。" for i in range(30)) + "\n\n失败的一段。\n\n" + "".join(
+        f"后{i}句内容内容。" for i in range(30))
+    splitter = CachedLLMSplitter(cache_dir=str(tmp_path), max_chunk_tokens=40, workers=2)
+
+    slices = splitter.split(doc)
+    assert "".join(slices) == doc
+    assert len(slices) > 1
+    assert not list(tmp_path.rglob("*.json"))
+
+    splitter.split(doc)
+    assert splitter.hits == 0 and splitter.misses == 2
+
+
+def test_cached_llm_caches_complete_results(monkeypatch, tmp_path):
+    monkeypatch.setattr(split_snippet, "split_with_gpt", lambda content, **_: _sentences(content))
+    doc = "第一句。第二句。"
+    splitter = CachedLLMSplitter(cache_dir=str(tmp_path))
+    assert splitter.split(doc) == ["第一句。", "第二句。"]
+    assert splitter.split(doc) == ["第一句。", "第二句。"]
+    assert splitter.hits == 1 and splitter.misses == 1
+
+
+def test_cached_llm_key_covers_split_options(tmp_path):
+    base = CachedLLMSplitter(cache_dir=str(tmp_path))
+    keys = {
+        base._key("内容"),
+        CachedLLMSplitter(cache_dir=str(tmp_path), stream=True)._key("内容"),
+        CachedLLMSplitter(cache_dir=str(tmp_path), max_chunk_tokens=200)._key("内容"),
+        CachedLLMSplitter(cache_dir=str(tmp_path), model="gpt-4o-mini")._key("内容"),
+    }
+    assert len(keys) == 4
+    assert CachedLLMSplitter(cache_dir=str(tmp_path), max_chunk_tokens=split_snippet.MAX_CHUNK_TOKENS)._key(
+        "内容") == base._key("内容")
+
+
+def test_stream_remainder_is_reported(monkeypatch):
+    def failing_client():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(split_snippet, "_get_client", failing_client)
+    monkeypatch.setattr(split_snippet.time, "sleep", lambda _: None)
+    report = split_snippet.SplitReport()
+    slices = list(split_snippet.split_with_gpt_stream("原文。", max_retries=1, report=report))
+    assert slices == ["原文。"]
+    assert not report.complete
+
+
+def test_api_errors_without_openai(monkeypatch):
+    import builtins
+
+    real_import = builtins.__import__
+
+    def no_openai(name, *args, **kwargs):
+        if name == "openai":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_openai)
+    monkeypatch.setattr(split_snippet, "_api_error_types", None)
+    assert split_snippet._api_errors() == ()
+
+
+def test_splitter_requires_split():
+    import pytest
+
+    from splitters import Splitter
+
+    class Incomplete(Splitter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_split_sentence_goes_through_registry(tmp_path):
+    import shutil
+    from pathlib import Path
+
+    import json_io
+    import split_sentence
+    import storage
+    from splitters import SplitterPolicy
+
+    repo = Path(__file__).resolve().parent.parent
+    for name in ("case0", "case1"):
+        shutil.copytree(repo / name, tmp_path / name)
+    policies = {"clause": SplitterPolicy("clause", per_case={"case1": "local"})}
+    split_sentence.process_root(str(tmp_path), policies=policies)
+
+    # 默认规则后端与 split_markdown_to_lists 一致；case1 的逗号级输出改由 local 后端切分
+    for name in ("case0", "case1"):
+        text = storage.read_text(tmp_path / name / "full_content.md")
+        sent, clause = split_sentence.split_markdown_to_lists(text)
+        assert json_io.load_file(tmp_path / name / "split_sentence.json") == sent
+        if name == "case0":
+            assert json_io.load_file(tmp_path / name / "split_clause.json") == clause
+        else:
+            assert "".join(json_io.load_file(tmp_path / name / "split_clause.json")) == text
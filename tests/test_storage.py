@@ -0,0 +1,43 @@
+import gzip
+
+import pytest
+
+import json_io
+import storage
+
+
+def test_gz_round_trip_and_stale_variant_removed(tmp_path):
+    path = tmp_path / "out.json"
+    storage.write_bytes(path, b"plain")
+    storage.write_bytes(path, b"compressed", codec="gz")
+    assert not path.exists()
+    assert gzip.decompress((tmp_path / "out.json.gz").read_bytes()) == b"compressed"
+    assert storage.read_bytes(path) == b"compressed"
+
+
+def test_failed_write_keeps_existing_file(tmp_path):
+    path = tmp_path / "out.json"
+    storage.write_bytes(path, b"old")
+    with pytest.raises(RuntimeError):
+        with storage.open_write(path, codec="gz") as f:
+            f.write(b"partial")
+            raise RuntimeError("boom")
+    assert storage.read_bytes(path) == b"old"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.json"]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("obj", [[], [1, "a\nb"], [{"k": [1, {"x": []}]}, {}], {"a": [1, 2]}, "s"])
+def test_dump_file_matches_dumps(tmp_path, obj, compact):
+    path = tmp_path / "obj.json"
+    json_io.dump_file(obj, path, compact=compact, codec="gz")
+    assert storage.read_bytes(path) == json_io.dumps_bytes(obj, compact=compact)
+    assert json_io.load_file(path) == obj
+
+
+def test_dump_file_streams_large_lists(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_io, "_WRITE_BATCH", 16)
+    obj = [{"output": f"片段{i}。"} for i in range(50)]
+    path = tmp_path / "all_cases_io_demo.json"
+    json_io.dump_file(obj, path)
+    assert storage.read_bytes(path) == json_io.dumps_bytes(obj)
@@ -0,0 +1,70 @@
+import re
+from pathlib import Path
+
+import pytest
+
+import storage
+import tag_spans
+from tag_spans import TagSpanIndex, build_case_index, scan_tags
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def _squeeze(text):
+    return re.sub(r"\s+", "", text)
+
+
+def test_scan_tags_offsets_map_back_to_source():
+    text = "前文<tag>标注一</tag>中间 a<b <tag>标注\n二</tag>，<tag>未闭合到行末\n下一行</tag>尾部"
+    plain, spans = scan_tags(text)
+    assert plain == "前文标注一中间 a<b 标注\n二，未闭合到行末\n下一行尾部"
+    assert [text[s.inner_start:s.inner_end] for s in spans] == ["标注一", "标注\n二", "未闭合到行末\n下一行"]
+    assert [plain[s.plain_start:s.plain_end] for s in spans] == ["标注一", "标注\n二", "未闭合到行末\n下一行"]
+    assert all(s.closed for s in spans)
+    assert all(text.startswith("<tag>", s.open_pos) for s in spans)
+
+
+def test_unclosed_tag_is_truncated_at_line_end():
+    text = "<tag>第一处\n后续<tag>第二处</tag>"
+    plain, spans = scan_tags(text)
+    assert [(text[s.inner_start:s.inner_end], s.closed) for s in spans] == [("第一处", False), ("第二处", True)]
+    assert [plain[s.plain_start:s.plain_end] for s in spans] == ["第一处", "第二处"]
+
+
+def test_aligner_maps_spans_into_full_text():
+    marked = "# 标题\n\n第一句<tag>关键  内容</tag>。\n第二句改过<tag>另一处</tag>结束。"
+    full = "# 标题\n第一句关键内容。\n第二句<tag>无</tag>另一处结束。\n"
+    plain, spans = scan_tags(marked)
+    aligner = tag_spans._Aligner(plain, full)
+    got = []
+    for sp in spans:
+        fs = aligner.map(sp.plain_start, is_end=False)
+        fe = aligner.map(sp.plain_end, is_end=True)
+        got.append(full[fs:fe])
+    assert got == ["关键内容", "另一处"]
+
+
+@pytest.mark.parametrize("case", ["case0", "case1"])
+def test_case_index_matches_source_text(case):
+    case_dir = REPO / case
+    if not storage.exists(case_dir / "marked_content.md"):
+        pytest.skip("no marked_content.md")
+    table = build_case_index(case_dir)
+    marked = storage.read_text(case_dir / "marked_content.md")
+    full = storage.read_text(case_dir / "full_content.md")
+    cols = table["columns"]
+    assert table["count"] == len(cols["full_start"]) > 0
+    full_sq = _squeeze(full)
+    checked = 0
+    for ms, me, fs, fe in zip(cols["marked_start"], cols["marked_end"], cols["full_start"], cols["full_end"]):
+        assert 0 <= fs <= fe <= len(full)
+        # 标注内容在 full_content.md 中原样出现（忽略空白）时，对齐结果应恰好是这段文字
+        if _squeeze(marked[ms:me]) in full_sq:
+            assert _squeeze(full[fs:fe]) == _squeeze(marked[ms:me])
+            checked += 1
+    assert checked > 0
+
+    index = TagSpanIndex(table)
+    for i, (fs, fe) in enumerate(zip(cols["full_start"], cols["full_end"])):
+        if fe > fs:
+            assert i in index.overlapping(fs, fe)
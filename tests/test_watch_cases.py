@@ -0,0 +1,149 @@
+import re
+import shutil
+from pathlib import Path
+
+import pytest
+
+import build_io_data
+import build_io_data_snippet
+import incremental
+import json_io
+import split_snippet
+import storage
+import watch_cases
+from context_retrieval import RetrievalConfig
+from splitters import SNIPPET_OUTPUT_NAME
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def root(tmp_path):
+    for name in ("case0", "case1"):
+        shutil.copytree(REPO / name, tmp_path / name)
+    return tmp_path
+
+
+def _edit_full_content(case_dir: Path) -> None:
+    text = storage.read_text(case_dir / "full_content.md")
+    cut = len(text) * 2 // 3
+    storage.write_text(case_dir / "full_content.md", text[:cut] + "新增的一句话。" + text[cut:])
+
+
+@pytest.mark.parametrize("context_mode", ["full", "retrieval"])
+def test_incremental_rebuild_matches_full_build(root, context_mode):
+    kwargs = dict(ratios=[0.0, 0.3], filename="split_sentence.json", context_mode=context_mode,
+                  retrieval_cfg=RetrievalConfig(top_k=2, max_chars=500))
+    out = root / "all_cases_io_sentence.json"
+    build_io_data._build_for_filename(root_dir=root, output_file=str(out), **kwargs)
+    for case_dir in (root / "case0", root / "case1"):
+        incremental.init_snapshots(case_dir, with_llm=False)
+
+    _edit_full_content(root / "case0")
+    # watcher 自身的 ratios 与记录不同：应以汇总文件记录的配置为准
+    watch_cases.rebuild(root, {"case0": {"full_content.md"}}, ratios=[0.5])
+    incremental_rows = json_io.load_file(out)
+
+    expected = root / "expected.json"
+    build_io_data._build_for_filename(root_dir=root, output_file=str(expected), **kwargs)
+    assert incremental_rows == json_io.load_file(expected)
+
+
+def test_sampled_aggregate_is_rebuilt_in_full(root):
+    out = root / "all_cases_io_sentence.json"
+    kwargs = dict(ratios=[0.0], filename="split_sentence.json", budget=20, seed=3)
+    build_io_data._build_for_filename(root_dir=root, output_file=str(out), **kwargs)
+    _edit_full_content(root / "case1")
+    watch_cases.rebuild(root, {"case1": {"full_content.md"}}, ratios=[0.0])
+
+    expected = root / "expected.json"
+    build_io_data._build_for_filename(root_dir=root, output_file=str(expected), **kwargs)
+    assert json_io.load_file(out) == json_io.load_file(expected)
+    assert len(json_io.load_file(out)) == 20
+
+
+def test_missing_split_file_drops_case_rows(root):
+    out = root / "all_cases_io_snippet.json"
+    build_io_data_snippet._build_for_filename(root_dir=root, output_file=str(out), ratios=[0.0],
+                                              filename="split_snippet.json")
+    assert {r["file"] for r in json_io.load_file(out)} == {"case0", "case1"}
+
+    (root / "case1" / "split_snippet.json").unlink()
+    watch_cases.rebuild(root, {"case1": {"split_snippet.json"}}, ratios=[0.0])
+    assert {r["file"] for r in json_io.load_file(out)} == {"case0"}
+
+
+def test_removed_case_is_reported_and_dropped(root):
+    out = root / "all_cases_io_sentence.json"
+    build_io_data._build_for_filename(root_dir=root, output_file=str(out), ratios=[0.0],
+                                      filename="split_sentence.json")
+    watcher = watch_cases.CaseWatcher(root)
+    watcher.scan()
+
+    shutil.rmtree(root / "case1")
+    changes = watcher.scan()
+    assert changes == {"case1": {watch_cases.CASE_REMOVED}}
+    assert not any(case == "case1" for case, _ in watcher.prints)
+    assert watcher.scan() == {}
+
+    watch_cases.rebuild(root, changes, ratios=[0.0])
+    assert {r["file"] for r in json_io.load_file(out)} == {"case0"}
+    # 未生成过的汇总输出不会因删除而被新建
+    assert not (root / "all_cases_io_clause.json").exists()
+
+
+def test_partial_update_refreshes_columnar_export(root):
+    pytest.importorskip("numpy")
+    import columnar_io
+
+    out = root / "all_cases_io_sentence.json"
+    build_io_data._build_for_filename(root_dir=root, output_file=str(out), ratios=[0.0],
+                                      filename="split_sentence.json", columnar_format="npy")
+    assert json_io.load_settings(out)["columnar_format"] == "npy"
+    incremental.init_snapshots(root / "case0")
+    before = json_io.load_file(out)
+
+    text = storage.read_text(root / "case0" / "full_content.md")
+    storage.write_text(root / "case0" / "full_content.md", text.replace("。", "。新增的一句话。", 1))
+    watch_cases.rebuild(root, {"case0": {"full_content.md"}}, ratios=[0.0])
+    rows = json_io.load_file(out)
+    assert rows != before
+    cols = columnar_io.read_columns(root / "all_cases_io_sentence.cols", columns=["output"])
+    assert cols["output"] == [r["output"] for r in rows]
+
+
+def test_llm_stage_resplits_only_changed_sections(root, monkeypatch):
+    calls = []
+
+    def fake_split(content, **_):
+        calls.append(content)
+        return re.findall(r"[^。]*。|[^。]+$", content)
+
+    monkeypatch.setattr(split_snippet, "split_long_content", fake_split)
+    case_dir = root / "case0"
+
+    # 没有快照：全量切片，输出写到共用的文件名并登记快照
+    incremental.resplit_snippet_case(case_dir)
+    contents = split_snippet.extract_contents(json_io.load_file(case_dir / "section_content.json"))
+    assert calls == contents
+    assert json_io.load_file(case_dir / SNIPPET_OUTPUT_NAME) == [s for c in contents for s in fake_split(c)]
+    assert storage.exists(incremental.snapshot_path(case_dir / incremental.LLM_SOURCE))
+
+    out = root / "all_cases_io_snippet.json"
+    build_io_data_snippet._build_for_filename(root_dir=root, output_file=str(out), ratios=[0.0],
+                                              filename=SNIPPET_OUTPUT_NAME)
+    text = storage.read_text(case_dir / "full_content.md")
+    storage.write_text(case_dir / "full_content.md", text.replace("。", "。新增的一句话。", 1))
+    calls.clear()
+    watch_cases.rebuild(root, {"case0": {"full_content.md"}}, ratios=[0.0], with_llm=True)
+
+    # 只有改动所在的章节交给后端，结果与全量切片一致
+    contents = split_snippet.extract_contents(json_io.load_file(case_dir / "section_content.json"))
+    assert 0 < len(calls) < len(contents)
+    assert any("新增的一句话" in c for c in calls)
+    assert json_io.load_file(case_dir / SNIPPET_OUTPUT_NAME) == [s for c in contents for s in fake_split(c)]
+
+    expected = root / "expected.json"
+    build_io_data_snippet._build_for_filename(root_dir=root, output_file=str(expected), ratios=[0.0],
+                                              filename=SNIPPET_OUTPUT_NAME)
+    assert json_io.load_file(out) == json_io.load_file(expected)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+监听模式：轮询各 case 目录的输入文件，只重建被改动影响到的阶段与输出。
+- 变更检测：轮询 mtime/size，变化时再算内容哈希，内容未变（如仅 touch）不触发
+- 防抖：最后一次变更后静默 --debounce 秒才开始重建，连续编辑只重建一次
+- 依赖关系（按顺序执行，前一阶段的输出会继续触发后续阶段）：
+    outline.md / full_content.md   -> extract_section_content -> section_content.json
+    full_content.md                -> split_sentence          -> split_sentence.json / split_clause.json
+    section_content.json           -> split_snippet（需 --with-llm） -> split_snippet.json
+    split_* / user_intent.md / outline.md -> 对应 builder，只替换汇总文件中该 case 的样本
+- 切片阶段走 incremental.py：与上次快照做 diff，只重切改动区域（LLM 也只为改动区域发请求）
+- 句子/逗号级样本的 context 只依赖前面的片段，首个改动片段之前的旧样本直接复用
+- 汇总输出按其构建配置记录（builder 写出的 .all_cases_io_*.json.build）局部重建：
+  ratios / context_mode / 检索参数 / with_tags 与记录一致；无记录时按 --ratios 与完整前文处理且不复用旧样本；
+  抽样生成的汇总（budget / per_case_cap）无法按 case 局部替换，按记录的配置全量重建；
+  记录中带列式导出格式时，更新汇总后同步重新导出
+- 整个 case 目录（或 bundle）被删除时，从已存在的汇总输出中移除该 case 的样本
+- 纯轮询实现，不依赖 inotify 等平台接口
+
+用法示例：
+    python watch_cases.py --root ./ --interval 2 --debounce 5
+"""
+
+import argparse
+import hashlib
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import build_io_data
+import build_io_data_snippet
+import columnar_io
+import extract_section_content
+import incremental
+import json_io
+import storage
+from context_retrieval import RetrievalConfig
+from splitters import SNIPPET_OUTPUT_NAME
+
+CASE_DIR_RE = re.compile(r"^case\d+$")
+
+# 需要监听的文件（人工编辑的输入 + 可能被单独重跑的 LLM 切片）
+WATCHED_FILES = ("outline.md", "full_content.md", "user_intent.md", SNIPPET_OUTPUT_NAME)
+
+# scan 报告整个 case 被删除时使用的变更标记（不是真实文件名）
+CASE_REMOVED = "<removed>"
+
+
+class Stage(NamedTuple):
+    name: str
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+
+
+# 按拓扑顺序排列
+STAGES: Tuple[Stage, ...] = (
+    Stage("sections", ("outline.md", "full_content.md"), ("section_content.json",)),
+    Stage("split_rule", ("full_content.md",), ("split_sentence.json", "split_clause.json")),
+    Stage("split_llm", ("section_content.json",), (SNIPPET_OUTPUT_NAME,)),
+    Stage("io_sentence", ("split_sentence.json", "user_intent.md", "outline.md"), ()),
+    Stage("io_clause", ("split_clause.json", "user_intent.md", "outline.md"), ()),
+    Stage("io_snippet", (SNIPPET_OUTPUT_NAME, "user_intent.md", "outline.md", "full_content.md"), ()),
+)
+
+# builder 阶段 -> (汇总输出文件, case 内切片文件, builder 模块)
+AGGREGATES = {
+    "io_sentence": ("all_cases_io_sentence.json", "split_sentence.json", build_io_data),
+    "io_clause": ("all_cases_io_clause.json", "split_clause.json", build_io_data),
+    "io_snippet": ("all_cases_io_snippet.json", SNIPPET_OUTPUT_NAME, build_io_data_snippet),
+}
+
+# context 只依赖同一切片文件中前面片段的 builder 阶段，可复用首个改动片段之前的旧样本
+PREFIX_REUSE_STAGES = ("io_sentence", "io_clause")
+
+Fingerprint = Tuple[float, int, str]
+
+
+def plan_stages(changed: Set[str], with_llm: bool = False) -> List[Stage]:
+    """根据变更的文件名，按依赖关系推导需要重跑的阶段（有序）。"""
+    dirty = set(changed)
+    planned: List[Stage] = []
+    for stage in STAGES:
+        if stage.name == "split_llm" and not with_llm:
+            continue
+        if dirty & set(stage.inputs):
+            planned.append(stage)
+            dirty |= set(stage.outputs)
+    return planned
+
+
+class CaseWatcher:
+    """记录各 case 监听文件的指纹 (mtime, size, sha1)，返回内容确有变化的文件。"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.prints: Dict[Tuple[str, str], Optional[Fingerprint]] = {}
+
+    def case_dirs(self) -> List[Path]:
+        return [p for p in storage.iter_case_dirs(self.root) if CASE_DIR_RE.match(p.name)]
+
+    def _fingerprint(self, path: Path, old: Optional[Fingerprint]) -> Optional[Fingerprint]:
+        st = storage.stat(path)
+        if st is None:
+            return None
+        if old is not None and old[:2] == st:
+            return old
+        digest = hashlib.sha1(storage.read_bytes(path)).hexdigest()
+        return st[0], st[1], digest
+
+    def scan_case(self, case_dir: Path) -> Set[str]:
+        changed: Set[str] = set()
+        for name in WATCHED_FILES:
+            key = (case_dir.name, name)
+            old = self.prints.get(key)
+            new = self._fingerprint(case_dir / name, old)
+            if (old is None) != (new is None) or (old and new and old[2] != new[2]):
+                changed.add(name)
+            self.prints[key] = new
+        return changed
+
+    def scan(self) -> Dict[str, Set[str]]:
+        """返回 {case 名: 变更的文件名集合}；已消失的 case 报告为 {CASE_REMOVED} 并丢弃其指纹。"""
+        changes: Dict[str, Set[str]] = {}
+        current = self.case_dirs()
+        for case_dir in current:
+            changed = self.scan_case(case_dir)
+            if changed:
+                changes[case_dir.name] = changed
+        names = {p.name for p in current}
+        for key in [k for k in self.prints if k[0] not in names]:
+            if self.prints.pop(key) is not None:
+                changes[key[0]] = {CASE_REMOVED}
+        return changes
+
+
+def _run_case_stage(stage: Stage, case_dir: Path, model: str) -> None:
+    if stage.name == "sections":
+        extract_section_content.build_structure(str(case_dir / "outline.md"), str(case_dir / "full_content.md"),
+                                                str(case_dir / "section_content.json"))
+        print(f"[OK] 已生成：{case_dir / 'section_content.json'}")
+    elif stage.name == "split_rule":
+        incremental.resplit_rule_case(case_dir)
+    elif stage.name == "split_llm":
+        incremental.resplit_snippet_case(case_dir, model=model)
+
+
+def _load_json(path: Path) -> Optional[List]:
+    try:
+        return json_io.load_file(path) if storage.exists(path) else None
+    except json_io.JSONDecodeError:
+        return None
+
+
+def _default_settings(stage_name: str, ratios: List[float]) -> Dict:
+    """汇总输出没有构建配置记录时使用的配置（与 builder 的默认配置一致）。"""
+    settings = {"filename": AGGREGATES[stage_name][1], "ratios": list(ratios), "budget": None,
+                "per_case_cap": None, "seed": 0, "context_mode": "full", "retrieval": None,
+                "columnar_format": None}
+    if stage_name == "io_snippet":
+        settings["with_tags"] = False
+    return settings
+
+
+def _is_sampled(settings: Dict) -> bool:
+    return settings.get("budget") is not None or settings.get("per_case_cap") is not None
+
+
+def _row_kwargs(settings: Dict) -> Dict:
+    """process_one_file 的生成参数（ratios 之外）。"""
+    kwargs = {"context_mode": settings.get("context_mode", "full")}
+    if settings.get("retrieval"):
+        kwargs["retrieval_cfg"] = RetrievalConfig(*settings["retrieval"])
+    if "with_tags" in settings:
+        kwargs["with_tags"] = settings["with_tags"]
+    return kwargs
+
+
+def _build_kwargs(settings: Dict) -> Dict:
+    """_build_for_filename 的参数：按记录的配置全量重建。"""
+    kwargs = {k: settings[k] for k in ("ratios", "filename", "budget", "per_case_cap", "seed", "columnar_format")
+              if k in settings}
+    kwargs.update(_row_kwargs(settings))
+    return kwargs
+
+
+def _case_rows(stage_name: str, case_dir: Path, settings: Dict,
+               old_fragments: Optional[List] = None, old_rows: Optional[List[Dict]] = None) -> Optional[List[Dict]]:
+    """
+    按 settings 重新生成该 case 的样本；切片文件不存在时返回 None。给出重切前的片段与汇总中的旧样本时，
+    与新片段的公共前缀部分直接复用旧样本，只为其后的片段生成样本。
+    调用方只应在旧样本与 settings 出自同一构建配置时传入 old_rows。
+    """
+    _, split_name, builder = AGGREGATES[stage_name]
+    fp = case_dir / split_name
+    if not storage.exists(fp):
+        return None
+    ratios = settings["ratios"]
+    kwargs = _row_kwargs(settings)
+    new_fragments = _load_json(fp)
+    if old_fragments is None or old_rows is None or new_fragments is None:
+        return builder.process_one_file(fp, case_dir.name, ratios, **kwargs)
+
+    k = 0
+    while k < min(len(old_fragments), len(new_fragments)) and old_fragments[k] == new_fragments[k]:
+        k += 1
+    expected = [(f, r) for f in new_fragments[:k]
+                if isinstance(f, str) and builder._is_sample_fragment(f) for r in ratios]
+    case_old = [r for r in old_rows if r.get("file") == case_dir.name]
+    if [(r.get("output"), r.get("ratio")) for r in case_old[:len(expected)]] != expected:
+        # 旧样本与片段对不上（如汇总文件被手动改过），全量重建
+        return builder.process_one_file(fp, case_dir.name, ratios, **kwargs)
+
+    print(f"[INFO] {case_dir.name}/{split_name}：复用前 {k} 个片段的 {len(expected)} 条样本")
+    return case_old[:len(expected)] + builder.process_one_file(fp, case_dir.name, ratios, start_idx=k, **kwargs)
+
+
+def _replace_case_rows(rows: List[Dict], updates: Dict[str, List[Dict]]) -> List[Dict]:
+    """
+    用 updates 中各 case 的新样本替换 rows 中的旧样本。
+    汇总文件按 case 名排序分组（与 _gather_case_dirs 的顺序一致），新样本插入到对应位置。
+    """
+    kept = [r for r in rows if r.get("file") not in updates]
+    merged: List[Dict] = []
+    pending = sorted(updates.items())
+    for r in kept:
+        while pending and pending[0][0] < r.get("file", ""):
+            merged.extend(pending.pop(0)[1])
+        merged.append(r)
+    for _, new_rows in pending:
+        merged.extend(new_rows)
+    return merged
+
+
+def rebuild(root: Path, changes: Dict[str, Set[str]], ratios: List[float],
+            with_llm: bool = False, model: str = "gpt-4o") -> None:
+    """对有变更的 case 依次重跑受影响阶段，并局部更新汇总文件。"""
+    aggregate_updates: Dict[str, Dict[str, List[Dict]]] = {}
+    full_rebuild: Set[str] = set()
+    existing: Dict[str, Optional[List[Dict]]] = {}
+    recorded: Dict[str, Optional[Dict]] = {}
+
+    def existing_rows(stage_name: str) -> Optional[List[Dict]]:
+        # 汇总文件中的现有样本，每个汇总文件最多读取一次
+        if stage_name not in existing:
+            existing[stage_name] = _load_json(root / AGGREGATES[stage_name][0])
+        return existing[stage_name]
+
+    def stage_settings(stage_name: str) -> Tuple[Dict, bool]:
+        # (构建配置, 是否为汇总文件记录的配置)；只有记录的配置才能保证旧样本可复用
+        if stage_name not in recorded:
+            recorded[stage_name] = json_io.load_settings(root / AGGREGATES[stage_name][0])
+        settings = recorded[stage_name]
+        return (settings, True) if settings is not None else (_default_settings(stage_name, ratios), False)
+
+    for case_name, changed in sorted(changes.items()):
+        case_dir = root / case_name
+        if CASE_REMOVED in changed:
+            # 只清理已生成的汇总输出，不为删除操作新建汇总文件
+            print(f"[CHANGE] {case_name}: case 已删除 -> 从汇总输出中移除")
+            for stage_name, (output_name, _, _) in AGGREGATES.items():
+                if not storage.exists(root / output_name):
+                    continue
+                if _is_sampled(stage_settings(stage_name)[0]):
+                    full_rebuild.add(stage_name)
+                else:
+                    aggregate_updates.setdefault(stage_name, {})[case_name] = []
+            continue
+        stages = plan_stages(changed, with_llm=with_llm)
+        print(f"[CHANGE] {case_name}: {', '.join(sorted(changed))} -> {', '.join(s.name for s in stages) or '无'}")
+        # 重切前的片段（intent / outline 变化时所有样本都要重建，不做复用）
+        before: Dict[str, Optional[List]] = {}
+        if not changed & {"user_intent.md", "outline.md"}:
+            for name in PREFIX_REUSE_STAGES:
+                before[name] = _load_json(case_dir / AGGREGATES[name][1])
+        for stage in stages:
+            try:
+                if stage.name in AGGREGATES:
+                    settings, reusable = stage_settings(stage.name)
+                    if _is_sampled(settings):
+                        full_rebuild.add(stage.name)
+                        continue
+                    old_fragments = before.get(stage.name) if reusable else None
+                    old_rows = existing_rows(stage.name) if old_fragments is not None else None
+                    rows = _case_rows(stage.name, case_dir, settings, old_fragments, old_rows)
+                    # 切片文件已不存在时清空该 case 的旧样本
+                    aggregate_updates.setdefault(stage.name, {})[case_name] = rows or []
+                else:
+                    _run_case_stage(stage, case_dir, model)
+            except Exception as e:
+                print(f"[ERROR] {case_name} 阶段 {stage.name} 失败：{e}")
+                break
+
+    for stage_name in full_rebuild:
+        output_name, _, builder = AGGREGATES[stage_name]
+        print(f"[INFO] {output_name} 为抽样生成，按记录的配置全量重建")
+        builder._build_for_filename(root_dir=root, output_file=str(root / output_name),
+                                    **_build_kwargs(stage_settings(stage_name)[0]))
+
+    for stage_name, updates in aggregate_updates.items():
+        output_name, _, builder = AGGREGATES[stage_name]
+        output_path = root / output_name
+        if not storage.exists(output_path):
+            # 汇总文件尚不存在：无法局部替换，退回全量构建
+            builder._build_for_filename(root_dir=root, output_file=str(output_path),
+                                        **_build_kwargs(stage_settings(stage_name)[0]))
+            continue
+        rows = existing_rows(stage_name)
+        rows = _replace_case_rows(rows, updates)
+        json_io.dump_file(rows, output_path)
+        print(f"[OK] 已更新 {output_name}：{', '.join(sorted(updates))}（共 {len(rows)} 条）")
+        columnar_format = stage_settings(stage_name)[0].get("columnar_format")
+        if columnar_format:
+            col_path = columnar_io.export_columnar(rows, output_path, fmt=columnar_format)
+            print(f"[OK] 已重新导出 {col_path.name}")
+
+
+def watch(root: Path, interval: float, debounce: float, ratios: List[float],
+          with_llm: bool = False, model: str = "gpt-4o") -> None:
+    watcher = CaseWatcher(root)
+    watcher.scan()  # 建立基线，不触发重建
+    # 假定启动时现有切片与输入一致，为缺少快照的 case 登记快照，之后的改动走增量重切
+    for case_dir in watcher.case_dirs():
+        incremental.init_snapshots(case_dir, with_llm=with_llm)
+    print(f"[START] 监听 {root}（轮询 {interval}s，防抖 {debounce}s）")
+
+    pending: Dict[str, Set[str]] = {}
+    last_change = 0.0
+    while True:
+        for case_name, changed in watcher.scan().items():
+            pending.setdefault(case_name, set()).update(changed)
+            last_change = time.monotonic()
+
+        if pending and time.monotonic() - last_change >= debounce:
+            batch, pending = pending, {}
+            rebuild(root, batch, ratios, with_llm=with_llm, model=model)
+            # 吸收本轮重建自身写出的文件（如 split_snippet.json），避免重复触发
+            for case_name in batch:
+                if storage.is_case_dir(root / case_name):
+                    watcher.scan_case(root / case_name)
+
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监听 case 目录的改动，只重建受影响的阶段与汇总样本")
+    parser.add_argument("--root", default="./", help="数据集根目录")
+    parser.add_argument("--interval", type=float, default=2.0, help="轮询间隔秒数（默认：2）")
+    parser.add_argument("--debounce", type=float, default=5.0, help="最后一次改动后等待的秒数（默认：5）")
+    parser.add_argument("--ratios", default="0.0,0.3", help="样本 hint 比例，逗号分隔（默认：0.0,0.3）")
+    parser.add_argument("--with-llm", action="store_true", help="section_content.json 变化时重跑 split_snippet（调用 LLM）")
+    parser.add_argument("--model", default="gpt-4o", help="--with-llm 时使用的模型（默认：gpt-4o）")
+    args = parser.parse_args()
+
+    root = Path(args.root).expanduser().resolve()
+    ratios = [float(r) for r in args.ratios.split(",") if r.strip()]
+    try:
+        watch(root, args.interval, args.debounce, ratios, with_llm=args.with_llm, model=args.model)
+    except KeyboardInterrupt:
+        print("[DONE] 已停止监听。")
+
+
+if __name__ == "__main__":
+    main()